@@ -2,7 +2,9 @@
 Admin configuration for assignments app.
 """
 from django.contrib import admin
-from .models import Assignment, Course, Podcast, StudyNotes, Event, Reminder, ChatMessage
+from django.db.models import F, Sum
+from . import ai_budget
+from .models import AIUsage, Assignment, Course, Podcast, PodcastSegment, StudyNotes, Event, Reminder, ChatMessage, ChatThread, ReminderDispatch, SyncTombstone, Task, LLMCacheEntry, AudioBlob, ExtractedTextCache, QuestionBand, QuestionSignature, RetrievalChunk
 
 
 @admin.register(Course)
@@ -62,8 +64,8 @@ class AssignmentAdmin(admin.ModelAdmin):
 class PodcastAdmin(admin.ModelAdmin):
     """Admin interface for Podcast model."""
     
-    list_display = ['title', 'topic', 'tone', 'length', 'is_generated', 'is_audio_generated', 'user', 'created_at']
-    list_filter = ['tone', 'length', 'is_generated', 'is_audio_generated', 'user']
+    list_display = ['title', 'topic', 'tone', 'length', 'generation_status', 'is_generated', 'is_audio_generated', 'user', 'created_at']
+    list_filter = ['tone', 'length', 'generation_status', 'is_generated', 'is_audio_generated', 'user']
     search_fields = ['title', 'topic']
     readonly_fields = ['created_at', 'updated_at']
 
@@ -151,9 +153,158 @@ class ChatMessageAdmin(admin.ModelAdmin):
     list_display = ['user', 'question_preview', 'created_at']
     list_filter = ['created_at', 'user']
     search_fields = ['user__username', 'question', 'response']
-    readonly_fields = ['created_at', 'question', 'response']
+    readonly_fields = ['created_at', 'question', 'response', 'reused_from']
     date_hierarchy = 'created_at'
     
     def question_preview(self, obj):
         return obj.question[:75]
     question_preview.short_description = 'Question'
+
+
+@admin.register(ChatThread)
+class ChatThreadAdmin(admin.ModelAdmin):
+    """Admin interface for ChatThread model."""
+    
+    list_display = ['title', 'user', 'summarized_through', 'updated_at']
+    list_filter = ['user']
+    search_fields = ['user__username', 'title', 'summary']
+    readonly_fields = ['created_at', 'updated_at', 'summary', 'summarized_through']
+
+
+@admin.register(ReminderDispatch)
+class ReminderDispatchAdmin(admin.ModelAdmin):
+    """Admin interface for ReminderDispatch model."""
+    
+    list_display = ['user', 'window', 'send_date', 'sent_at', 'attempts', 'lease_owner', 'lease_expires_at']
+    list_filter = ['window', 'send_date']
+    search_fields = ['user__username', 'user__email', 'lease_owner']
+    readonly_fields = ['created_at']
+    date_hierarchy = 'send_date'
+
+
+@admin.register(SyncTombstone)
+class SyncTombstoneAdmin(admin.ModelAdmin):
+    """Admin interface for SyncTombstone model."""
+    
+    list_display = ['resource', 'object_id', 'user', 'deleted_at']
+    list_filter = ['resource', 'deleted_at']
+    search_fields = ['user__username']
+    readonly_fields = ['deleted_at']
+
+
+@admin.register(PodcastSegment)
+class PodcastSegmentAdmin(admin.ModelAdmin):
+    """Admin interface for PodcastSegment model."""
+    
+    list_display = ['podcast', 'position', 'script_offset', 'audio_file', 'created_at']
+    search_fields = ['podcast__title', 'text']
+    readonly_fields = ['created_at']
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    """Admin interface for Task model."""
+    
+    list_display = ['name', 'status', 'user', 'priority', 'attempts', 'run_after', 'lease_owner', 'created_at']
+    list_filter = ['status', 'name']
+    search_fields = ['name', 'user__username', 'last_error']
+    readonly_fields = ['created_at', 'updated_at', 'finished_at']
+
+
+@admin.register(LLMCacheEntry)
+class LLMCacheEntryAdmin(admin.ModelAdmin):
+    """Admin interface for LLMCacheEntry model."""
+    
+    list_display = ['key', 'model', 'hits', 'size', 'last_used_at', 'expires_at']
+    list_filter = ['model']
+    search_fields = ['key', 'response']
+    readonly_fields = ['created_at', 'last_used_at']
+
+
+@admin.register(RetrievalChunk)
+class RetrievalChunkAdmin(admin.ModelAdmin):
+    """Admin interface for RetrievalChunk model."""
+    
+    list_display = ['title', 'source_type', 'source_id', 'position', 'user', 'created_at']
+    list_filter = ['source_type']
+    search_fields = ['user__username', 'title', 'text']
+    exclude = ['vector']
+    readonly_fields = ['created_at', 'source_hash']
+
+
+@admin.register(QuestionSignature)
+class QuestionSignatureAdmin(admin.ModelAdmin):
+    """Admin interface for QuestionSignature model."""
+    
+    list_display = ['message', 'scope', 'created_at']
+    search_fields = ['message__question', 'scope']
+    exclude = ['signature']
+    readonly_fields = ['message', 'scope', 'created_at']
+
+
+@admin.register(QuestionBand)
+class QuestionBandAdmin(admin.ModelAdmin):
+    """Admin interface for QuestionBand model."""
+    
+    list_display = ['signature', 'scope', 'key']
+    search_fields = ['scope']
+    readonly_fields = ['signature', 'scope', 'key']
+
+
+@admin.register(ExtractedTextCache)
+class ExtractedTextCacheAdmin(admin.ModelAdmin):
+    """Admin interface for ExtractedTextCache model."""
+    
+    list_display = ['content_hash', 'extractor_version', 'hits', 'size', 'truncated', 'last_used_at']
+    list_filter = ['extractor_version', 'truncated']
+    search_fields = ['content_hash']
+    readonly_fields = ['created_at', 'last_used_at']
+
+
+@admin.register(AudioBlob)
+class AudioBlobAdmin(admin.ModelAdmin):
+    """Admin interface for AudioBlob model."""
+    
+    list_display = ['key', 'kind', 'refcount', 'size', 'duration', 'last_used_at', 'created_at']
+    list_filter = ['kind']
+    search_fields = ['key', 'path']
+    readonly_fields = ['created_at', 'last_used_at']
+
+
+@admin.register(AIUsage)
+class AIUsageAdmin(admin.ModelAdmin):
+    """Admin interface for AIUsage model, with a token report for the filtered rows."""
+    
+    list_display = ['day', 'user', 'feature', 'model', 'requests', 'prompt_tokens', 'completion_tokens', 'total_tokens']
+    list_filter = ['feature', 'model', 'day']
+    search_fields = ['user__username', 'feature']
+    readonly_fields = ['user', 'day', 'feature', 'model', 'requests', 'prompt_tokens', 'completion_tokens']
+    date_hierarchy = 'day'
+    
+    # Heaviest users listed in the report
+    REPORT_TOP_USERS = 10
+    
+    def changelist_view(self, request, extra_context=None):
+        # Include this process's usage that has not been written yet
+        ai_budget.flush_usage()
+        response = super().changelist_view(request, extra_context)
+        changelist = getattr(response, 'context_data', {}).get('cl')
+        if changelist is None:
+            return response
+        
+        usage = changelist.queryset.order_by()
+        response.context_data['usage_totals'] = usage.aggregate(
+            requests=Sum('requests'), prompt_tokens=Sum('prompt_tokens'), completion_tokens=Sum('completion_tokens')
+        )
+        response.context_data['usage_by_user'] = usage.values('user__username').annotate(
+            # First, so the F() expressions read the columns rather than the sums below
+            total=Sum(F('prompt_tokens') + F('completion_tokens')),
+            requests=Sum('requests'),
+            prompt_tokens=Sum('prompt_tokens'),
+            completion_tokens=Sum('completion_tokens'),
+        ).order_by('-total')[:self.REPORT_TOP_USERS]
+        return response
+    
+    def total_tokens(self, obj):
+        return obj.total_tokens
+    total_tokens.short_description = 'Total tokens'
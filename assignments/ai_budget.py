@@ -0,0 +1,402 @@
+"""
+Per-user and global token budgets for AI calls.
+
+Every call made through ``ai_gateway`` is charged its estimated prompt tokens
+plus its ``max_tokens`` against two token buckets: one for the user the work
+is for and one shared by everyone. Buckets refill continuously at
+``AI_USER_TOKENS_PER_MINUTE`` / ``AI_GLOBAL_TOKENS_PER_MINUTE`` up to a burst
+size, so a student can ask several questions in a row but cannot tie up the
+workers and the OpenAI quota. When the API reports the real usage, the unused
+part of the reservation goes back in the buckets; streamed answers keep
+their full reservation.
+
+The user being charged is set with :func:`charged_to` around a request or a
+background task (the task queue does this for every task). Calls made
+outside it only draw on the global bucket. An empty bucket raises
+:class:`BudgetExceeded`, which tells the caller how long to wait.
+
+Buckets live in this process unless ``AI_BUDGET_CACHE`` names a Django cache
+(e.g. Redis) to share them between processes.
+
+Usage is added up in memory and written to the ``AIUsage`` ledger in batches,
+one row per user, day, feature and model, at the end of a request or task once
+``AI_USAGE_FLUSH_EVERY`` calls or ``AI_USAGE_FLUSH_SECONDS`` have passed.
+"""
+import logging
+import math
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import AIUsage
+
+logger = logging.getLogger(__name__)
+
+BUDGET_ENABLED = getattr(settings, 'AI_BUDGET_ENABLED', True)
+USER_TOKENS_PER_MINUTE = getattr(settings, 'AI_USER_TOKENS_PER_MINUTE', 20000)
+USER_BURST_TOKENS = getattr(settings, 'AI_USER_BURST_TOKENS', 40000)
+GLOBAL_TOKENS_PER_MINUTE = getattr(settings, 'AI_GLOBAL_TOKENS_PER_MINUTE', 200000)
+GLOBAL_BURST_TOKENS = getattr(settings, 'AI_GLOBAL_BURST_TOKENS', 400000)
+
+# Name of a Django cache shared by all processes, or None for in-process buckets
+BUDGET_CACHE = getattr(settings, 'AI_BUDGET_CACHE', None)
+
+USAGE_FLUSH_EVERY = getattr(settings, 'AI_USAGE_FLUSH_EVERY', 50)
+USAGE_FLUSH_SECONDS = getattr(settings, 'AI_USAGE_FLUSH_SECONDS', 30)
+
+# Role and formatting tokens the API adds around each message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text):
+    """Rough token count for English text (about four characters per token)."""
+    return len(text) // 4 + 1
+
+
+class BudgetExceeded(Exception):
+    """Raised instead of calling the model when a token budget is used up."""
+
+    def __init__(self, retry_after):
+        self.retry_after = retry_after
+        super().__init__(f'AI usage limit reached; try again in {describe_wait(retry_after)}.')
+
+
+def describe_wait(seconds):
+    """Say how long a wait is in words, e.g. 'about 3 minutes'."""
+    if seconds < 60:
+        return f'{max(1, math.ceil(seconds))} seconds'
+    return f'about {math.ceil(seconds / 60)} minutes'
+
+
+def budget_error(error):
+    """
+    Find the BudgetExceeded behind ``error``.
+
+    Services re-raise API errors wrapped in a plain Exception, so the
+    exception's cause and context chain is searched.
+
+    Returns:
+        BudgetExceeded: The budget error, or None if ``error`` was something else
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        if isinstance(error, BudgetExceeded):
+            return error
+        seen.add(id(error))
+        error = error.__cause__ or error.__context__
+    return None
+
+
+class LocalStore:
+    """Bucket levels kept in this process."""
+
+    def __init__(self):
+        self.levels = {}
+        self.lock = threading.Lock()
+
+    def update(self, key, fn):
+        """Replace a bucket's level with ``fn(level)[0]`` atomically and return ``fn(level)[1]``."""
+        with self.lock:
+            level, result = fn(self.levels.get(key))
+            self.levels[key] = level
+            return result
+
+    def clear(self):
+        with self.lock:
+            self.levels.clear()
+
+
+class CacheStore:
+    """Bucket levels kept in a shared Django cache, updated under a short lock."""
+
+    LOCK_SECONDS = 2
+    LOCK_ATTEMPTS = 50
+
+    def __init__(self, alias):
+        self.cache = caches[alias]
+
+    def update(self, key, fn):
+        """Replace a bucket's level with ``fn(level)[0]`` under the lock and return ``fn(level)[1]``."""
+        lock_key = f'{key}:lock'
+        locked = False
+        for _ in range(self.LOCK_ATTEMPTS):
+            locked = self.cache.add(lock_key, 1, self.LOCK_SECONDS)
+            if locked:
+                break
+            time.sleep(0.01)
+        if not locked:
+            # The holder's lock expires by itself; an approximate update beats blocking the call
+            logger.warning('Could not lock AI budget %s, updating without the lock', key)
+        try:
+            level, result = fn(self.cache.get(key))
+            self.cache.set(key, level, timeout=3600)
+            return result
+        finally:
+            if locked:
+                self.cache.delete(lock_key)
+
+    def clear(self):
+        pass
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Return the store selected by ``AI_BUDGET_CACHE``."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = CacheStore(BUDGET_CACHE) if BUDGET_CACHE else LocalStore()
+    return _store
+
+
+class TokenBucket:
+    """
+    Token bucket holding up to ``capacity`` tokens, refilled at ``per_minute``.
+
+    Requests larger than the whole bucket are charged its capacity, so they
+    can still run once the bucket is full.
+    """
+
+    def __init__(self, key, capacity, per_minute, store=None, clock=time.time):
+        self.key = key
+        self.capacity = capacity
+        self.rate = per_minute / 60
+        self.store = store or get_store()
+        self.clock = clock
+
+    def level(self, stored, now):
+        """Tokens in the bucket at ``now``, given its last stored ``(tokens, stamp)``."""
+        if stored is None:
+            return self.capacity
+        tokens, stamp = stored
+        return min(self.capacity, tokens + max(0, now - stamp) * self.rate)
+
+    def take(self, amount, spend=True):
+        """
+        Take ``amount`` tokens if the bucket holds them.
+
+        Args:
+            amount: Tokens wanted
+            spend: Set False to only check, leaving the bucket as it is
+
+        Returns:
+            float: 0 if the tokens were available, else seconds until they will be
+        """
+        amount = min(amount, self.capacity)
+        now = self.clock()
+
+        def update(stored):
+            tokens = self.level(stored, now)
+            if tokens >= amount:
+                return (tokens - amount if spend else tokens, now), 0.0
+            return (tokens, now), (amount - tokens) / self.rate
+
+        return self.store.update(self.key, update)
+
+    def give(self, amount):
+        """Put back tokens that were reserved but not used."""
+        now = self.clock()
+        self.store.update(self.key, lambda stored: ((min(self.capacity, self.level(stored, now) + amount), now), None))
+
+
+def buckets(user_id):
+    """The buckets a call for ``user_id`` (None for no user) is charged to."""
+    result = []
+    if user_id is not None and USER_TOKENS_PER_MINUTE:
+        result.append(TokenBucket(f'ai-budget:user:{user_id}', USER_BURST_TOKENS, USER_TOKENS_PER_MINUTE))
+    if GLOBAL_TOKENS_PER_MINUTE:
+        result.append(TokenBucket('ai-budget:global', GLOBAL_BURST_TOKENS, GLOBAL_TOKENS_PER_MINUTE))
+    return result
+
+
+def retry_after(user_id, tokens):
+    """
+    Seconds until ``user_id`` could spend ``tokens`` (0 if now), without spending them.
+
+    Views use this to turn away or delay work before it starts.
+    """
+    if not BUDGET_ENABLED:
+        return 0.0
+    return max((bucket.take(tokens, spend=False) for bucket in buckets(user_id)), default=0.0)
+
+
+def reset():
+    """Refill every in-process bucket and drop unsaved usage, e.g. between tests."""
+    get_store().clear()
+    with _usage_lock:
+        _usage.clear()
+
+
+Payer = namedtuple('Payer', ['user_id', 'feature'])
+
+_payer = ContextVar('ai_budget_payer', default=None)
+
+
+@contextmanager
+def charged_to(user_id, feature):
+    """
+    Charge AI calls made inside the block to ``user_id`` under ``feature``.
+
+    Context variables follow ``sync_to_async`` and ``async_to_sync`` but not
+    plain thread pools; submit pool work with ``contextvars.copy_context().run``.
+    """
+    token = _payer.set(Payer(user_id, feature))
+    try:
+        yield
+    finally:
+        _payer.reset(token)
+
+
+def estimate_request(kwargs):
+    """
+    Tokens to reserve for an API call from its keyword arguments.
+
+    Returns:
+        tuple: ``(prompt tokens, completion tokens)``
+    """
+    prompt = sum(
+        estimate_tokens(message.get('content') or '') + MESSAGE_OVERHEAD_TOKENS
+        for message in kwargs.get('messages') or []
+    )
+    if isinstance(kwargs.get('input'), str):
+        prompt += estimate_tokens(kwargs['input'])
+    return prompt, kwargs.get('max_tokens') or 0
+
+
+class Charge:
+    """Tokens reserved for one AI call, settled once the call returns."""
+
+    def __init__(self, payer, model, prompt_tokens, completion_tokens, taken):
+        self.payer = payer
+        self.model = model
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.taken = taken
+
+    @property
+    def reserved(self):
+        return self.prompt_tokens + self.completion_tokens
+
+    def settle(self, response):
+        """Refund what the call did not use and add its usage to the ledger."""
+        usage = getattr(response, 'usage', None)
+        prompt_tokens = getattr(usage, 'prompt_tokens', None)
+        completion_tokens = getattr(usage, 'completion_tokens', None)
+        if isinstance(prompt_tokens, int) and isinstance(completion_tokens, int):
+            unused = self.reserved - prompt_tokens - completion_tokens
+            if unused > 0:
+                for bucket in self.taken:
+                    bucket.give(unused)
+        else:
+            prompt_tokens, completion_tokens = self.prompt_tokens, self.completion_tokens
+
+        record_usage(
+            self.payer.user_id if self.payer else None,
+            self.payer.feature if self.payer else 'other',
+            self.model, prompt_tokens, completion_tokens,
+        )
+
+    def cancel(self):
+        """Give back the whole reservation of a call that failed."""
+        for bucket in self.taken:
+            bucket.give(self.reserved)
+
+
+def reserve(kwargs):
+    """
+    Reserve the tokens for an API call from the current payer's and the global budget.
+
+    Raises:
+        BudgetExceeded: If either bucket is short; nothing is taken from either
+    """
+    payer = _payer.get()
+    prompt_tokens, completion_tokens = estimate_request(kwargs)
+    charge = Charge(payer, kwargs.get('model') or '', prompt_tokens, completion_tokens, [])
+    if not BUDGET_ENABLED:
+        return charge
+
+    for bucket in buckets(payer.user_id if payer else None):
+        wait = bucket.take(charge.reserved)
+        if wait:
+            charge.cancel()
+            raise BudgetExceeded(wait)
+        charge.taken.append(bucket)
+    return charge
+
+
+# Unsaved usage: (user id, day, feature, model) -> [requests, prompt tokens, completion tokens]
+_usage = {}
+_usage_lock = threading.Lock()
+_unsaved_calls = 0
+_last_flush = time.monotonic()
+
+
+def record_usage(user_id, feature, model, prompt_tokens, completion_tokens):
+    """Add one call's tokens to the in-memory totals."""
+    global _unsaved_calls
+    key = (user_id, timezone.localdate(), feature[:100], model[:100])
+    with _usage_lock:
+        totals = _usage.setdefault(key, [0, 0, 0])
+        totals[0] += 1
+        totals[1] += prompt_tokens
+        totals[2] += completion_tokens
+        _unsaved_calls += 1
+
+
+def flush_usage(due_only=False):
+    """
+    Write the in-memory usage totals to the AIUsage ledger.
+
+    Args:
+        due_only: Only write once ``AI_USAGE_FLUSH_EVERY`` calls or
+            ``AI_USAGE_FLUSH_SECONDS`` have built up
+
+    Returns:
+        int: Number of ledger rows written
+    """
+    global _unsaved_calls, _last_flush
+    with _usage_lock:
+        if not _usage:
+            return 0
+        if due_only and _unsaved_calls < USAGE_FLUSH_EVERY and time.monotonic() - _last_flush < USAGE_FLUSH_SECONDS:
+            return 0
+        pending = dict(_usage)
+        _usage.clear()
+        _unsaved_calls = 0
+        _last_flush = time.monotonic()
+
+    try:
+        for (user_id, day, feature, model), (requests, prompt_tokens, completion_tokens) in pending.items():
+            rows = AIUsage.objects.filter(user_id=user_id, day=day, feature=feature, model=model)
+            increments = {
+                'requests': F('requests') + requests,
+                'prompt_tokens': F('prompt_tokens') + prompt_tokens,
+                'completion_tokens': F('completion_tokens') + completion_tokens,
+            }
+            if rows.update(**increments):
+                continue
+            try:
+                with transaction.atomic():
+                    AIUsage.objects.create(
+                        user_id=user_id, day=day, feature=feature, model=model,
+                        requests=requests, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                    )
+            except IntegrityError:
+                # Another process created the row first
+                rows.update(**increments)
+    except Exception:
+        logger.exception('Could not save AI usage for %s ledger rows', len(pending))
+        return 0
+    return len(pending)
@@ -0,0 +1,280 @@
+"""
+Single gateway for calls to the OpenAI API.
+
+Every AI feature gets its client here, so each process keeps one pooled
+connection instead of opening a new one per request (async clients are
+pooled per event loop, since an httpx pool cannot move between loops and
+under WSGI every async view runs on a new one). Calls
+made through :func:`call` / :func:`acall`:
+
+- time out after ``AI_TIMEOUT_SECONDS`` (or a per-call ``timeout``) instead of
+  hanging a worker,
+- retry timeouts, connection errors, rate limits and 5xx responses with
+  jittered exponential backoff, and
+- go through a circuit breaker: after ``AI_BREAKER_THRESHOLD`` consecutive
+  failures, calls fail at once with :class:`CircuitOpenError` for
+  ``AI_BREAKER_RESET_SECONDS`` before a single trial call is let through, and
+- are charged to the current user's and the global token budget (see
+  ai_budget.py), failing with :class:`ai_budget.BudgetExceeded` when either
+  is used up.
+
+Set ``OPENAI_BASE_URL`` (e.g. to the ``run_ai_stub`` server) to point every
+client somewhere other than api.openai.com.
+"""
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+import weakref
+
+import httpx
+import openai
+from django.conf import settings
+
+from . import ai_budget
+
+logger = logging.getLogger(__name__)
+
+TIMEOUT_SECONDS = getattr(settings, 'AI_TIMEOUT_SECONDS', 30)
+CONNECT_TIMEOUT_SECONDS = getattr(settings, 'AI_CONNECT_TIMEOUT_SECONDS', 5)
+MAX_CONNECTIONS = getattr(settings, 'AI_MAX_CONNECTIONS', 20)
+
+RETRY_ATTEMPTS = getattr(settings, 'AI_RETRY_ATTEMPTS', 3)
+RETRY_BASE_SECONDS = getattr(settings, 'AI_RETRY_BASE_SECONDS', 0.5)
+RETRY_MAX_SECONDS = 8
+
+BREAKER_THRESHOLD = getattr(settings, 'AI_BREAKER_THRESHOLD', 5)
+BREAKER_RESET_SECONDS = getattr(settings, 'AI_BREAKER_RESET_SECONDS', 30)
+
+# Failures worth another try; anything else (bad request, auth) is final
+RETRYABLE_ERRORS = (
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the provider while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    Closed: calls go through. Open: calls fail immediately until the reset
+    timeout passes. Half-open: one trial call goes through; success closes
+    the breaker, failure opens it again.
+    """
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, reset_seconds=BREAKER_RESET_SECONDS, clock=time.monotonic):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        """'closed', 'open' or 'half-open'."""
+        with self.lock:
+            return self._state()
+
+    def _state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if self.clock() - self.opened_at >= self.reset_seconds:
+            return 'half-open'
+        return 'open'
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go through now."""
+        with self.lock:
+            state = self._state()
+            if state == 'open' or (state == 'half-open' and self.trial_running):
+                raise CircuitOpenError('AI provider is unavailable; try again shortly.')
+            if state == 'half-open':
+                self.trial_running = True
+
+    def record_success(self):
+        """Close the breaker after a call the provider answered."""
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        """Count a failed call, opening the breaker at the threshold or on a failed trial."""
+        with self.lock:
+            self.failures += 1
+            if self.trial_running or self.failures >= self.threshold:
+                if self._state() == 'closed':
+                    logger.warning('AI circuit breaker opened after %s failures', self.failures)
+                self.opened_at = self.clock()
+            self.trial_running = False
+
+    def record_abandoned(self):
+        """Forget a call that was cancelled before the provider answered, freeing the trial slot."""
+        with self.lock:
+            self.trial_running = False
+
+
+breaker = CircuitBreaker()
+
+_client = None
+# AsyncOpenAI client per event loop, dropped with the loop
+_async_clients = weakref.WeakKeyDictionary()
+_client_lock = threading.Lock()
+
+
+def client_options():
+    """Keyword arguments shared by the sync and async clients."""
+    return {
+        'api_key': os.getenv('OPENAI_API_KEY'),
+        'base_url': os.getenv('OPENAI_BASE_URL') or None,
+        'timeout': httpx.Timeout(TIMEOUT_SECONDS, connect=CONNECT_TIMEOUT_SECONDS),
+        # Retries are done here, with the circuit breaker in the loop
+        'max_retries': 0,
+    }
+
+
+def is_configured():
+    """Whether an API key is available."""
+    return bool(os.getenv('OPENAI_API_KEY'))
+
+
+def get_client():
+    """Return the process-wide OpenAI client, or None without an API key."""
+    global _client
+    if _client is None and is_configured():
+        with _client_lock:
+            if _client is None:
+                _client = openai.OpenAI(
+                    http_client=httpx.Client(limits=httpx.Limits(max_connections=MAX_CONNECTIONS)),
+                    **client_options(),
+                )
+    return _client
+
+
+def get_async_client():
+    """Return the running event loop's AsyncOpenAI client, or None without an API key."""
+    if not is_configured():
+        return None
+    loop = asyncio.get_running_loop()
+    with _client_lock:
+        client = _async_clients.get(loop)
+        if client is None:
+            client = openai.AsyncOpenAI(
+                http_client=httpx.AsyncClient(limits=httpx.Limits(max_connections=MAX_CONNECTIONS)),
+                **client_options(),
+            )
+            _async_clients[loop] = client
+    return client
+
+
+def reset_clients():
+    """Forget the shared clients, e.g. after the base URL or key changes."""
+    global _client
+    with _client_lock:
+        _client = None
+        _async_clients.clear()
+
+
+def backoff_seconds(attempt):
+    """Delay before retry number ``attempt`` (full jitter)."""
+    return random.uniform(0, min(RETRY_BASE_SECONDS * 2 ** (attempt - 1), RETRY_MAX_SECONDS))
+
+
+def call(fn, *args, timeout=None, attempts=None, **kwargs):
+    """
+    Call an OpenAI client method with retries, the circuit breaker and the token budgets.
+
+    Args:
+        fn: Client method, e.g. ``client.chat.completions.create``
+        timeout: Seconds for this call, overriding ``AI_TIMEOUT_SECONDS``
+        attempts: Tries before giving up, overriding ``AI_RETRY_ATTEMPTS``
+        *args, **kwargs: Passed to ``fn``
+
+    Returns:
+        The method's return value
+    """
+    charge = ai_budget.reserve(kwargs)
+    try:
+        result = call_with_retries(fn, args, timeout, attempts, kwargs)
+    except Exception:
+        charge.cancel()
+        raise
+    charge.settle(result)
+    return result
+
+
+def call_with_retries(fn, args, timeout, attempts, kwargs):
+    """Run ``fn`` with retries and the circuit breaker (see :func:`call`)."""
+    if timeout is not None:
+        kwargs['timeout'] = timeout
+    attempts = attempts or RETRY_ATTEMPTS
+    for attempt in range(1, attempts + 1):
+        breaker.before_call()
+        try:
+            result = fn(*args, **kwargs)
+        except RETRYABLE_ERRORS as e:
+            breaker.record_failure()
+            if attempt == attempts:
+                raise
+            logger.warning('AI call failed (attempt %s), retrying: %s', attempt, e)
+            time.sleep(backoff_seconds(attempt))
+            continue
+        except Exception:
+            # The provider answered; the request itself was rejected
+            breaker.record_success()
+            raise
+        except BaseException:
+            # Interrupted (e.g. KeyboardInterrupt): no verdict on the provider
+            breaker.record_abandoned()
+            raise
+        breaker.record_success()
+        return result
+
+
+async def acall(fn, *args, timeout=None, attempts=None, **kwargs):
+    """Async version of :func:`call` for AsyncOpenAI methods."""
+    charge = ai_budget.reserve(kwargs)
+    try:
+        result = await acall_with_retries(fn, args, timeout, attempts, kwargs)
+    except Exception:
+        charge.cancel()
+        raise
+    charge.settle(result)
+    return result
+
+
+async def acall_with_retries(fn, args, timeout, attempts, kwargs):
+    """Async version of :func:`call_with_retries`."""
+    if timeout is not None:
+        kwargs['timeout'] = timeout
+    attempts = attempts or RETRY_ATTEMPTS
+    for attempt in range(1, attempts + 1):
+        breaker.before_call()
+        try:
+            result = await fn(*args, **kwargs)
+        except RETRYABLE_ERRORS as e:
+            breaker.record_failure()
+            if attempt == attempts:
+                raise
+            logger.warning('AI call failed (attempt %s), retrying: %s', attempt, e)
+            await asyncio.sleep(backoff_seconds(attempt))
+            continue
+        except Exception:
+            breaker.record_success()
+            raise
+        except BaseException:
+            # Cancelled, e.g. a streaming client disconnected: no verdict on the provider
+            breaker.record_abandoned()
+            raise
+        breaker.record_success()
+        return result
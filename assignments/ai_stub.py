@@ -0,0 +1,155 @@
+"""
+Local OpenAI-compatible stub server for tests, development and load tests.
+
+Implements the endpoints the app uses (chat completions, streamed or not,
+and text-to-speech) with canned answers, plus optional added latency and
+error rate to exercise timeouts, retries and the circuit breaker. Point the
+app at it with::
+
+    OPENAI_API_KEY=stub OPENAI_BASE_URL=http://127.0.0.1:8001/v1
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def stub_answer(messages):
+    """Deterministic reply to a list of chat messages."""
+    question = messages[-1]['content'] if messages else ''
+    return f'Stub answer to: {" ".join(question.split()[:12])}'
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Request handler; behaviour comes from attributes on the server."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def __init__(self, *args, **kwargs):
+        # Set before the base class handles the request from inside __init__
+        self.close_connection = True
+        super().__init__(*args, **kwargs)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def do_GET(self):
+        if self.path.rstrip('/').endswith('/models'):
+            self.send_json(200, {'object': 'list', 'data': [{'id': 'gpt-3.5-turbo', 'object': 'model'}]})
+        else:
+            self.send_json(404, {'error': {'message': 'Not found'}})
+
+    def do_POST(self):
+        request = self.read_json()
+        with self.server.lock:
+            self.server.request_count += 1
+
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if random.random() < self.server.error_rate:
+            self.send_json(500, {'error': {'message': 'Stub server error', 'type': 'server_error'}})
+            return
+
+        if self.path.endswith('/chat/completions'):
+            self.chat_completion(request)
+        elif self.path.endswith('/audio/speech'):
+            self.speech(request)
+        else:
+            self.send_json(404, {'error': {'message': 'Not found'}})
+
+    def chat_completion(self, request):
+        answer = stub_answer(request.get('messages', []))
+        model = request.get('model', 'gpt-3.5-turbo')
+        created = int(time.time())
+
+        if not request.get('stream'):
+            words = len(answer.split())
+            self.send_json(200, {
+                'id': 'chatcmpl-stub',
+                'object': 'chat.completion',
+                'created': created,
+                'model': model,
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': answer},
+                    'finish_reason': 'stop',
+                }],
+                'usage': {'prompt_tokens': 0, 'completion_tokens': words, 'total_tokens': words},
+            })
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        for index, word in enumerate(answer.split(' ')):
+            chunk = {
+                'id': 'chatcmpl-stub',
+                'object': 'chat.completion.chunk',
+                'created': created,
+                'model': model,
+                'choices': [{
+                    'index': 0,
+                    'delta': {'content': word if index == 0 else f' {word}'},
+                    'finish_reason': None,
+                }],
+            }
+            self.wfile.write(f'data: {json.dumps(chunk)}\n\n'.encode())
+            self.wfile.flush()
+            if self.server.token_delay:
+                time.sleep(self.server.token_delay)
+        self.wfile.write(b'data: [DONE]\n\n')
+        self.close_connection = True
+
+    def speech(self, request):
+        # Not real mp3 data, but stable per input, which is what the app's caches key on
+        body = b'ID3STUB' + request.get('input', '').encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'audio/mpeg')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def make_server(host='127.0.0.1', port=8001, latency=0.0, error_rate=0.0, token_delay=0.0, verbose=False):
+    """
+    Build a stub server (call ``serve_forever`` to run it).
+
+    Args:
+        host: Interface to bind
+        port: Port to bind (0 picks a free one)
+        latency: Seconds to wait before answering each request
+        error_rate: Fraction of requests answered with HTTP 500
+        token_delay: Seconds between streamed chunks
+        verbose: Log each request
+    """
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.error_rate = error_rate
+    server.token_delay = token_delay
+    server.verbose = verbose
+    server.request_count = 0
+    server.lock = threading.Lock()
+    return server
+
+
+def start_in_thread(**options):
+    """Start a stub server on a free port in a daemon thread and return it."""
+    server = make_server(port=0, **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,199 @@
+"""
+Content-addressed store for generated podcast audio.
+
+Every synthesized segment is saved under a path derived from a hash of its
+text, voice and TTS model, and every joined podcast under a hash of its
+segments. Podcasts with the same text therefore share files, regenerating a
+podcast reuses the audio of segments that did not change, and a file is
+never rewritten in place while it may be served.
+
+Files are written to a temporary name and renamed into place. Each
+``AudioBlob`` row counts the segments and podcasts using it; blobs nobody
+has used for ``GARBAGE_GRACE`` are removed by :func:`collect_garbage`.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .models import AudioBlob
+from .podcast_service import TTS_MODEL, TTS_VOICE
+
+logger = logging.getLogger(__name__)
+
+BLOB_DIR = os.path.join('podcasts', 'blobs')
+
+# Unreferenced blobs are kept this long in case a regeneration wants them back
+GARBAGE_GRACE = getattr(settings, 'AUDIO_STORE_GARBAGE_GRACE', timedelta(days=1))
+
+# MPEG audio frame header tables, indexed by the header's version bits (3 = MPEG-1,
+# 2 = MPEG-2, 0 = MPEG-2.5) and its bitrate / sample rate index
+MP3_BITRATES = {
+    3: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+MP3_BITRATES[0] = MP3_BITRATES[2]
+MP3_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+
+def media_path(relative_path):
+    """Absolute path of a file under MEDIA_ROOT, creating its directory."""
+    full_path = os.path.join(settings.MEDIA_ROOT, relative_path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    return full_path
+
+
+def segment_key(text, voice=TTS_VOICE, model=TTS_MODEL):
+    """Hash the inputs that determine a segment's audio."""
+    return hashlib.sha256(json.dumps([model, voice, text]).encode()).hexdigest()
+
+
+def podcast_key(segment_keys):
+    """Hash the ordered segments that make up a joined podcast."""
+    return hashlib.sha256(json.dumps(['podcast', *segment_keys]).encode()).hexdigest()
+
+
+def blob_path(key):
+    """Path relative to MEDIA_ROOT where the audio for ``key`` is stored."""
+    return os.path.join(BLOB_DIR, key[:2], f'{key}.mp3')
+
+
+def write_blob(key, write):
+    """
+    Create the file for ``key`` atomically.
+
+    Args:
+        key: Blob key
+        write: Called with a temporary path to write the audio to
+
+    Returns:
+        str: The blob's path relative to MEDIA_ROOT
+    """
+    relative_path = blob_path(key)
+    full_path = media_path(relative_path)
+
+    # Write beside the target and rename, so a listener never gets a half-written file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(full_path), suffix='.mp3')
+    os.close(fd)
+    try:
+        write(tmp_path)
+        # mkstemp makes the file private; nginx (a different user) sends it in production
+        os.chmod(tmp_path, settings.FILE_UPLOAD_PERMISSIONS or 0o644)
+        os.replace(tmp_path, full_path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+    return relative_path
+
+
+def find(keys):
+    """
+    Look up stored blobs whose files still exist.
+
+    Returns:
+        dict: Blob by key, for the keys that are stored
+    """
+    found = {}
+    for blob in AudioBlob.objects.filter(key__in=list(keys)):
+        if os.path.exists(os.path.join(settings.MEDIA_ROOT, blob.path)):
+            found[blob.key] = blob
+    return found
+
+
+def mp3_duration(path):
+    """
+    Length of an mp3 file in seconds, found by walking its Layer III frame
+    headers (so constant and variable bitrate files are both exact) without
+    decoding any audio.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    position = 0
+    if data[:3] == b'ID3' and len(data) >= 10:
+        # ID3v2 tag size is a 28-bit "syncsafe" integer
+        size = (data[6] & 0x7f) << 21 | (data[7] & 0x7f) << 14 | (data[8] & 0x7f) << 7 | data[9] & 0x7f
+        position = 10 + size
+
+    seconds = 0.0
+    while position + 4 <= len(data):
+        header = int.from_bytes(data[position:position + 4], 'big')
+        version = header >> 19 & 3
+        bitrate_index = header >> 12 & 15
+        rate_index = header >> 10 & 3
+        if header >> 21 != 0x7ff or version == 1 or header >> 17 & 3 != 1 or bitrate_index in (0, 15) or rate_index == 3:
+            # Not a Layer III frame header: skip a byte and look again
+            position += 1
+            continue
+        sample_rate = MP3_SAMPLE_RATES[version][rate_index]
+        samples = 1152 if version == 3 else 576
+        position += samples // 8 * MP3_BITRATES[version][bitrate_index] * 1000 // sample_rate + (header >> 9 & 1)
+        seconds += samples / sample_rate
+    return seconds
+
+
+def blob_duration(blob):
+    """Length of a blob's audio in seconds, measured and saved the first time it is needed."""
+    if blob.duration is None:
+        blob.duration = mp3_duration(os.path.join(settings.MEDIA_ROOT, blob.path))
+        AudioBlob.objects.filter(pk=blob.pk).update(duration=blob.duration)
+    return blob.duration
+
+
+def register(key, relative_path, kind='segment'):
+    """Record a file written by :func:`write_blob` and return its blob."""
+    full_path = os.path.join(settings.MEDIA_ROOT, relative_path)
+    size = os.path.getsize(full_path)
+    duration = mp3_duration(full_path)
+    blob, created = AudioBlob.objects.get_or_create(
+        key=key,
+        defaults={'path': relative_path, 'kind': kind, 'size': size, 'duration': duration},
+    )
+    if not created and blob.path != relative_path:
+        AudioBlob.objects.filter(pk=blob.pk).update(path=relative_path, size=size, duration=duration)
+        blob.path, blob.size, blob.duration = relative_path, size, duration
+    return blob
+
+
+def acquire(blob):
+    """Count one more user of ``blob``."""
+    AudioBlob.objects.filter(pk=blob.pk).update(refcount=F('refcount') + 1, last_used_at=timezone.now())
+
+
+def release(blob_id):
+    """Count one fewer user of a blob; it is deleted by the next garbage collection once unused."""
+    if blob_id:
+        AudioBlob.objects.filter(pk=blob_id, refcount__gt=0).update(
+            refcount=F('refcount') - 1,
+            last_used_at=timezone.now(),
+        )
+
+
+def collect_garbage(grace=None):
+    """
+    Delete blobs no segment or podcast has used for ``grace``.
+
+    Returns:
+        tuple: (number of blobs deleted, bytes freed)
+    """
+    cutoff = timezone.now() - (GARBAGE_GRACE if grace is None else grace)
+    deleted = freed = 0
+    for blob in AudioBlob.objects.filter(refcount__lte=0, last_used_at__lt=cutoff):
+        # Re-check in the delete so a blob acquired meanwhile survives
+        removed, _ = AudioBlob.objects.filter(pk=blob.pk, refcount__lte=0, last_used_at__lt=cutoff).delete()
+        if not removed:
+            continue
+        full_path = os.path.join(settings.MEDIA_ROOT, blob.path)
+        if os.path.exists(full_path):
+            os.remove(full_path)
+        deleted += 1
+        freed += blob.size
+    if deleted:
+        logger.info('Removed %s unused audio blobs (%s bytes)', deleted, freed)
+    return deleted, freed
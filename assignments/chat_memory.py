@@ -0,0 +1,140 @@
+"""
+Conversation memory for the chatbot.
+
+Every question belongs to a ChatThread. A follow-up is sent with the
+thread's most recent turns verbatim (newest first, while they fit in
+``CHAT_HISTORY_TOKENS``) and everything older as a rolling summary stored on
+the thread. The summary is updated only with turns that have just left the
+verbatim window, so each turn is summarized once and the prompt stays
+bounded however long the thread grows.
+"""
+import logging
+
+from django.conf import settings
+
+from .ai_gateway import get_client
+from .llm_cache import cached_completion
+from .podcast_service import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+HISTORY_TOKENS = getattr(settings, 'CHAT_HISTORY_TOKENS', 1500)
+MAX_RECENT_TURNS = getattr(settings, 'CHAT_MAX_RECENT_TURNS', 10)
+SUMMARY_MAX_TOKENS = getattr(settings, 'CHAT_SUMMARY_MAX_TOKENS', 250)
+SUMMARY_MODEL = "gpt-3.5-turbo"
+
+# Largest batch of old turns folded into the summary in one request
+SUMMARY_BATCH_TOKENS = 2000
+
+# Role and formatting tokens the API adds around each message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def turn_tokens(turn):
+    """Estimated prompt tokens for one question and its answer."""
+    return estimate_tokens(turn.question) + estimate_tokens(turn.response) + 2 * MESSAGE_OVERHEAD_TOKENS
+
+
+def recent_turns(thread, budget):
+    """
+    The newest turns of a thread that fit in ``budget`` tokens, oldest first.
+
+    Stops at the first turn that does not fit, so the window is always a
+    contiguous run ending at the latest turn.
+    """
+    turns = []
+    used = 0
+    for turn in thread.messages.order_by('-pk')[:MAX_RECENT_TURNS]:
+        cost = turn_tokens(turn)
+        if used + cost > budget:
+            break
+        turns.append(turn)
+        used += cost
+    turns.reverse()
+    return turns
+
+
+def summarize_turns(summary, turns):
+    """
+    Fold ``turns`` into an existing conversation summary with the LLM.
+
+    Returns:
+        str: The updated summary
+    """
+    client = get_client()
+    if not client:
+        raise Exception("OpenAI API key not configured.")
+
+    transcript = "\n\n".join(f"Student: {turn.question}\nAssistant: {turn.response}" for turn in turns)
+    prompt = f"""Summary of the conversation so far:
+{summary or '(nothing yet)'}
+
+New exchanges:
+{transcript}
+
+Rewrite the summary to include the new exchanges. Keep the student's goals, courses, deadlines, decisions and any advice already given. Be brief."""
+
+    return cached_completion(
+        client,
+        model=SUMMARY_MODEL,
+        messages=[
+            {"role": "system", "content": "You keep short running summaries of tutoring conversations."},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0,
+        max_tokens=SUMMARY_MAX_TOKENS
+    )
+
+
+def update_summary(thread, before_pk=None):
+    """
+    Fold turns older than ``before_pk`` (or all turns) that are not in the
+    summary yet into it.
+
+    Turns go in batches of at most ``SUMMARY_BATCH_TOKENS``. If the model
+    fails, the summary stays as it was and the turns are retried next time.
+    """
+    pending = thread.messages.filter(pk__gt=thread.summarized_through).order_by('pk')
+    if before_pk is not None:
+        pending = pending.filter(pk__lt=before_pk)
+    batch = []
+    batch_tokens = 0
+
+    def flush():
+        thread.summary = summarize_turns(thread.summary, batch).strip()
+        thread.summarized_through = batch[-1].pk
+        thread.save(update_fields=['summary', 'summarized_through'])
+
+    try:
+        for turn in pending.iterator():
+            cost = turn_tokens(turn)
+            if batch and batch_tokens + cost > SUMMARY_BATCH_TOKENS:
+                flush()
+                batch, batch_tokens = [], 0
+            batch.append(turn)
+            batch_tokens += cost
+        if batch:
+            flush()
+    except Exception:
+        logger.warning('Could not update the summary of chat thread %s', thread.pk, exc_info=True)
+
+
+def build_history(thread, budget=HISTORY_TOKENS):
+    """
+    Work out the conversation context for the next question in a thread.
+
+    Args:
+        thread: ChatThread, or None for a new conversation
+        budget: Most estimated tokens for the summary and verbatim turns together
+
+    Returns:
+        tuple: ``(summary, turns)``, the rolling summary and the recent
+        ChatMessage turns to send verbatim, oldest first
+    """
+    if thread is None:
+        return '', []
+
+    # The summary is capped by its own max_tokens, so reserve that much
+    turns = recent_turns(thread, max(0, budget - SUMMARY_MAX_TOKENS))
+    update_summary(thread, before_pk=turns[0].pk if turns else None)
+    return thread.summary, turns
@@ -2,6 +2,7 @@
 Context processors for passing data to all templates.
 """
 import random
+from django.conf import settings
 from .quotes_tips import MOTIVATIONAL_QUOTES, STUDY_TIPS
 
 
@@ -17,3 +18,8 @@ def quotes_and_tips(request):
             'sidebar_tip': tip,
         }
     return {}
+
+
+def live_notifications(request):
+    """Tell templates whether to open the live notification stream."""
+    return {'live_notifications': getattr(settings, 'LIVE_NOTIFICATIONS', False)}
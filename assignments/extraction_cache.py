@@ -0,0 +1,200 @@
+"""
+Cache of text extracted from uploaded documents.
+
+Students upload the same lecture PDFs and syllabi again and again. Extracted
+text is stored in ``ExtractedTextCache`` keyed by the file's SHA-256 (worked
+out by the upload handlers while the file streams in) and the extractor
+version, so a repeat upload skips PDF/DOCX parsing entirely. The table is
+kept under ``EXTRACT_CACHE_MAX_BYTES`` of text by evicting the least recently
+used entries.
+
+``cached_extract_texts`` handles several uploads at once, extracting the
+files not in the cache concurrently.
+"""
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
+from .file_utils import ExtractionReport, extract_text_from_file, extractor_version
+from .models import ExtractedTextCache
+
+logger = logging.getLogger(__name__)
+
+CACHE_ENABLED = getattr(settings, 'EXTRACT_CACHE_ENABLED', True)
+MAX_BYTES = getattr(settings, 'EXTRACT_CACHE_MAX_BYTES', 100 * 1024 * 1024)
+
+# Files extracted at once when several are uploaded together
+FILE_CONCURRENCY = getattr(settings, 'EXTRACT_FILE_CONCURRENCY', 4)
+
+
+def content_hash(file_obj):
+    """
+    Return the SHA-256 of an uploaded file.
+
+    Uses the hash the upload handlers recorded; files from elsewhere (tests,
+    scripts) are hashed chunk by chunk here.
+    """
+    digest = getattr(file_obj, 'content_hash', None)
+    if digest:
+        return digest
+
+    hasher = hashlib.sha256()
+    for chunk in file_obj.chunks():
+        hasher.update(chunk)
+    file_obj.seek(0)
+    file_obj.content_hash = hasher.hexdigest()
+    return file_obj.content_hash
+
+
+def lookup(digest, version):
+    """Return the cache entry for a file hash and extractor version, or None."""
+    entry = ExtractedTextCache.objects.filter(content_hash=digest, extractor_version=version).first()
+    if entry is not None:
+        ExtractedTextCache.objects.filter(pk=entry.pk).update(hits=F('hits') + 1, last_used_at=timezone.now())
+    return entry
+
+
+def store(digest, version, text, truncated):
+    """
+    Save extracted text, then evict old entries if the cache is over its limit.
+
+    Uploads of the same file extracted at once race to insert the same row;
+    the loser keeps the winner's entry instead of failing the upload.
+    """
+    try:
+        with transaction.atomic():
+            ExtractedTextCache.objects.update_or_create(
+                content_hash=digest,
+                extractor_version=version,
+                defaults={
+                    'text': text,
+                    'size': len(text.encode()),
+                    'truncated': truncated,
+                    'last_used_at': timezone.now(),
+                },
+            )
+    except IntegrityError:
+        logger.info('Extracted text for %s was stored concurrently', digest)
+        return
+    evict()
+
+
+def evict(max_bytes=None):
+    """
+    Delete least recently used entries until the cache holds at most
+    ``max_bytes`` of text.
+
+    Returns:
+        int: Number of entries deleted
+    """
+    max_bytes = MAX_BYTES if max_bytes is None else max_bytes
+
+    cutoff = None
+    total = 0
+    rows = ExtractedTextCache.objects.order_by('-last_used_at', '-pk').values_list('pk', 'last_used_at', 'size')
+    for pk, last_used_at, size in rows.iterator():
+        if total + size > max_bytes:
+            cutoff = (pk, last_used_at)
+            break
+        total += size
+
+    if not cutoff:
+        return 0
+    pk, last_used_at = cutoff
+    deleted, _ = ExtractedTextCache.objects.filter(
+        Q(last_used_at__lt=last_used_at) | Q(last_used_at=last_used_at, pk__lte=pk)
+    ).delete()
+    logger.info('Evicted %s extracted text cache entries', deleted)
+    return deleted
+
+
+def cache_size():
+    """Return the number of cached documents and their total text bytes."""
+    stats = ExtractedTextCache.objects.aggregate(total=Sum('size'))
+    return ExtractedTextCache.objects.count(), stats['total'] or 0
+
+
+def cached_extract_text(file_obj, report=None):
+    """
+    Extract text from an upload, reusing the text from an identical earlier upload.
+
+    Args:
+        file_obj: Django UploadedFile object
+        report: ExtractionReport to fill in; ``cached`` is set on a hit
+
+    Returns:
+        str: Extracted text from the file
+
+    Raises:
+        ExtractionError: For unsupported, oversized or unreadable files
+    """
+    report = report or ExtractionReport(file_obj.name)
+    if not CACHE_ENABLED:
+        return extract_text_from_file(file_obj, report)
+
+    digest = content_hash(file_obj)
+    version = extractor_version()
+    entry = lookup(digest, version)
+    if entry is not None:
+        report.cached = True
+        report.truncated = entry.truncated
+        report.chars = len(entry.text)
+        logger.info('Reused extracted text for %s (%s)', file_obj.name, digest[:12])
+        return entry.text
+
+    text = extract_text_from_file(file_obj, report)
+    store(digest, version, text, report.truncated)
+    return text
+
+
+def cached_extract_texts(files, max_workers=FILE_CONCURRENCY):
+    """
+    Extract text from several uploads, reusing cached text and extracting
+    the rest concurrently.
+
+    Cache reads and writes stay on the calling thread; the pool threads only
+    parse files. A file that fails does not stop the others: its report
+    carries the error and its text is empty.
+
+    Args:
+        files: Django UploadedFile objects
+        max_workers: Most files extracted at once
+
+    Returns:
+        list: ``(report, text)`` pairs in the order of ``files``
+    """
+    reports = [ExtractionReport(file_obj.name) for file_obj in files]
+    texts = [None] * len(files)
+    version = extractor_version()
+
+    digests = [content_hash(file_obj) if CACHE_ENABLED else None for file_obj in files]
+    for index, digest in enumerate(digests):
+        entry = lookup(digest, version) if digest else None
+        if entry is not None:
+            reports[index].cached = True
+            reports[index].truncated = entry.truncated
+            reports[index].chars = len(entry.text)
+            texts[index] = entry.text
+
+    def extract(index):
+        return extract_text_from_file(files[index], reports[index])
+
+    misses = [index for index, text in enumerate(texts) if text is None]
+    if misses:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(misses)))) as executor:
+            futures = {index: executor.submit(extract, index) for index in misses}
+            for index, future in futures.items():
+                try:
+                    texts[index] = future.result()
+                except Exception as e:
+                    reports[index].error = str(e)
+                    texts[index] = ''
+                    continue
+                if digests[index]:
+                    store(digests[index], version, texts[index], reports[index].truncated)
+    return list(zip(reports, texts))
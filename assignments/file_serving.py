@@ -0,0 +1,183 @@
+"""
+Serving stored media files (podcast audio) to their owner.
+
+``serve_file`` is called by a view after it has checked the user may see the
+file. It answers conditional requests (``If-None-Match`` /
+``If-Modified-Since``) with a 304 and a single ``Range`` with a 206, so
+browsers can seek in the audio player and resume downloads.
+
+With ``AUDIO_ACCEL_REDIRECT`` on, the response carries no body, only an
+``X-Accel-Redirect`` header naming the file under ``AUDIO_ACCEL_PREFIX``; the
+nginx in front of the app (see ``nginx.conf``) then sends the bytes itself,
+ranges included, and the worker is free as soon as the view returns.
+"""
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe, quote_etag
+
+ACCEL_REDIRECT = getattr(settings, 'AUDIO_ACCEL_REDIRECT', False)
+ACCEL_PREFIX = getattr(settings, 'AUDIO_ACCEL_PREFIX', '/protected-media/')
+
+CHUNK_SIZE = 64 * 1024
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeNotSatisfiable(Exception):
+    """The requested range lies outside the file."""
+
+
+def file_validators(path):
+    """
+    ETag and last-modified time for a file on disk.
+
+    The ETag has the same form as nginx's (hex mtime and size), so validators
+    handed out by either server are recognised by the other.
+
+    Returns:
+        tuple: (etag string, last-modified unix timestamp, size in bytes)
+    """
+    stat = os.stat(path)
+    last_modified = int(stat.st_mtime)
+    return quote_etag(f'{last_modified:x}-{stat.st_size:x}'), last_modified, stat.st_size
+
+
+def parse_range(header, size):
+    """
+    Parse a ``Range`` header for a file of ``size`` bytes.
+
+    Only a single byte range is supported; anything else is ignored and the
+    whole file is sent, which is always allowed.
+
+    Returns:
+        tuple: (first byte, last byte) inclusive, or None to send the whole file
+
+    Raises:
+        RangeNotSatisfiable: If the range starts past the end of the file
+    """
+    match = RANGE_RE.match(header.replace(' ', ''))
+    if not match or match.groups() == ('', ''):
+        return None
+
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable
+        return max(size - length, 0), size - 1
+
+    first = int(first)
+    if first >= size:
+        raise RangeNotSatisfiable
+    last = min(int(last), size - 1) if last else size - 1
+    if last < first:
+        return None
+    return first, last
+
+
+def range_applies(request, etag, last_modified):
+    """Whether a ``Range`` header should be honoured, given any ``If-Range``."""
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def read_range(path, first, length):
+    """Yield ``length`` bytes of ``path`` starting at ``first``."""
+    with open(path, 'rb') as f:
+        f.seek(first)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def accel_response(file):
+    """Empty response telling nginx to send ``file`` from its internal location."""
+    response = HttpResponse()
+    response['X-Accel-Redirect'] = ACCEL_PREFIX + quote(file.name.replace(os.sep, '/'))
+    return response
+
+
+def ranged_response(request, path, size, etag, last_modified):
+    """The whole file, or the part of it named by a ``Range`` header."""
+    byte_range = None
+    if 'Range' in request.headers and range_applies(request, etag, last_modified):
+        try:
+            byte_range = parse_range(request.headers['Range'], size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    if byte_range is None:
+        return FileResponse(open(path, 'rb'))
+
+    first, last = byte_range
+    length = last - first + 1
+    response = StreamingHttpResponse(read_range(path, first, length), status=206)
+    response['Content-Range'] = f'bytes {first}-{last}/{size}'
+    response['Content-Length'] = str(length)
+    return response
+
+
+# How long browsers may keep a file whose URL changes whenever its content does
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def serve_file(request, file, content_type, filename=None, as_attachment=False, immutable=False):
+    """
+    Respond with a stored file, honouring conditional and range requests.
+
+    Args:
+        request: The request, already authorized to see ``file``
+        file: FieldFile to send
+        content_type: MIME type of the file
+        filename: Name to suggest to the browser
+        as_attachment: Whether the browser should download rather than play it
+        immutable: Whether the URL is versioned, so the file behind it never changes
+
+    Returns:
+        HttpResponse: 200, 206, 304, 412 or 416
+    """
+    try:
+        etag, last_modified, size = file_validators(file.path)
+    except (OSError, ValueError) as exc:
+        raise Http404('File not found') from exc
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        if ACCEL_REDIRECT:
+            # nginx handles Range itself and adds its own (matching) validators
+            response = accel_response(file)
+        else:
+            response = ranged_response(request, file.path, size, etag, last_modified)
+        response['Content-Type'] = content_type
+        disposition = content_disposition_header(as_attachment, filename)
+        if disposition:
+            response['Content-Disposition'] = disposition
+        elif 'Content-Disposition' in response:
+            # FileResponse names the file after the one on disk
+            del response['Content-Disposition']
+        response['Accept-Ranges'] = 'bytes'
+        if response.status_code in (200, 206):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+
+    if immutable:
+        patch_cache_control(response, private=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        # Private files: browsers may keep them but must revalidate every time
+        patch_cache_control(response, private=True, max_age=0, must_revalidate=True)
+    return response
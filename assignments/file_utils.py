@@ -1,64 +1,296 @@
 """
 Utility functions for handling file uploads and text extraction.
+
+Text is extracted as a stream: page by page for PDFs, paragraph by paragraph
+(tables included) for DOCX and chunk by chunk for TXT, so a large upload is
+never held as one string. Extraction stops at configurable caps:
+
+- ``EXTRACT_MAX_BYTES``: larger uploads are rejected before parsing
+- ``EXTRACT_MAX_PAGES``: PDF pages past this are skipped
+- ``EXTRACT_MAX_CHARS``: extraction stops once this much text is produced
+
+PDFs with at least ``EXTRACT_PARALLEL_MIN_PAGES`` pages are split into page
+ranges that are extracted across a pool of ``EXTRACT_WORKERS`` processes.
 """
+import codecs
+import logging
 import os
 import tempfile
-from pathlib import Path
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+MAX_BYTES = getattr(settings, 'EXTRACT_MAX_BYTES', 50 * 1024 * 1024)
+MAX_PAGES = getattr(settings, 'EXTRACT_MAX_PAGES', 500)
+MAX_CHARS = getattr(settings, 'EXTRACT_MAX_CHARS', 200_000)
+
+WORKERS = getattr(settings, 'EXTRACT_WORKERS', min(4, os.cpu_count() or 1))
+PARALLEL_MIN_PAGES = getattr(settings, 'EXTRACT_PARALLEL_MIN_PAGES', 40)
+PAGES_PER_TASK = getattr(settings, 'EXTRACT_PAGES_PER_TASK', 20)
+
+SUPPORTED_EXTENSIONS = ('.txt', '.pdf', '.docx')
+
+# Bump when extraction output changes, so cached text is extracted again
+EXTRACTOR_VERSION = 2
+
+
+class ExtractionError(Exception):
+    """Raised when text cannot be extracted from an upload."""
 
 
-def extract_text_from_file(file_obj):
+class ExtractionReport:
     """
-    Extract text from various file formats.
-    
-    Args:
-        file_obj: Django UploadedFile object
-    
+    What one extraction produced.
+
+    ``pages`` holds ``(page number, characters, seconds)`` for every PDF page
+    extracted, so slow pages (scans, huge vector drawings) show up in logs.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.pages = []
+        self.chars = 0
+        self.seconds = 0.0
+        self.truncated = False
+        self.cached = False
+        self.error = ''
+
+    def add_page(self, number, chars, seconds):
+        self.pages.append((number, chars, seconds))
+
+    def slowest_page(self):
+        """The ``(page number, characters, seconds)`` entry that took longest, or None."""
+        return max(self.pages, key=lambda page: page[2], default=None)
+
+    def log(self):
+        slowest = self.slowest_page()
+        logger.info(
+            'Extracted %s chars from %s in %.2fs (%s pages%s%s)',
+            self.chars, self.filename, self.seconds, len(self.pages),
+            f', slowest page {slowest[0] + 1} took {slowest[2]:.2f}s' if slowest else '',
+            ', truncated' if self.truncated else '',
+        )
+
+
+def extractor_version():
+    """Identify the extractor and the caps that shape its output, for cache keys."""
+    return f'{EXTRACTOR_VERSION}:{MAX_PAGES}p:{MAX_CHARS}c'
+
+
+def file_extension(filename):
+    return os.path.splitext(filename.lower())[1]
+
+
+@contextmanager
+def spooled_path(file_obj, max_bytes=MAX_BYTES):
+    """
+    Yield a path on disk holding the upload's bytes.
+
+    Uploads Django already streamed to a temp file are used in place; others
+    are copied chunk by chunk, so the copy never needs the whole file in memory.
+    """
+    if hasattr(file_obj, 'temporary_file_path'):
+        yield file_obj.temporary_file_path()
+        return
+
+    fd, path = tempfile.mkstemp(suffix=file_extension(file_obj.name))
+    try:
+        written = 0
+        with os.fdopen(fd, 'wb') as spool:
+            for chunk in file_obj.chunks():
+                written += len(chunk)
+                if written > max_bytes:
+                    raise ExtractionError(f'{file_obj.name} is larger than {max_bytes // (1024 * 1024)} MB.')
+                spool.write(chunk)
+        yield path
+    finally:
+        os.remove(path)
+
+
+def iter_txt(file_obj, max_bytes=MAX_BYTES):
+    """Yield decoded text from a plain text upload one chunk at a time."""
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    read = 0
+    for chunk in file_obj.chunks():
+        read += len(chunk)
+        if read > max_bytes:
+            raise ExtractionError(f'{file_obj.name} is larger than {max_bytes // (1024 * 1024)} MB.')
+        yield decoder.decode(chunk)
+    yield decoder.decode(b'', final=True)
+
+
+def iter_pdf_pages(reader, start, stop):
+    """Yield ``(page number, text, seconds)`` for pages ``start`` to ``stop - 1``."""
+    for number in range(start, stop):
+        began = time.perf_counter()
+        text = reader.pages[number].extract_text() or ''
+        yield number, text, time.perf_counter() - began
+
+
+def extract_pdf_range(path, start, stop):
+    """
+    Extract a range of PDF pages in a pool process, which opens the file itself.
+
     Returns:
-        str: Extracted text from the file
+        list: ``(page number, text, seconds)`` for each page
     """
-    filename = file_obj.name.lower()
-    
+    import PyPDF2
+    return list(iter_pdf_pages(PyPDF2.PdfReader(path), start, stop))
+
+
+def iter_pdf_ranges(path, pages):
+    """
+    Yield ``(page number, text, seconds)`` for the first ``pages`` pages, in
+    order, extracting ranges in a process pool.
+
+    Only a few ranges are in flight at a time, and ranges not started yet are
+    cancelled if the caller stops early (e.g. at the character cap).
+    """
+    ranges = [(start, min(start + PAGES_PER_TASK, pages)) for start in range(0, pages, PAGES_PER_TASK)]
+    workers = max(1, min(WORKERS, len(ranges)))
+    executor = ProcessPoolExecutor(max_workers=workers)
+    pending = deque()
+    try:
+        for start, stop in ranges:
+            pending.append(executor.submit(extract_pdf_range, path, start, stop))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def iter_pdf(file_obj, report, max_pages=MAX_PAGES, max_bytes=MAX_BYTES):
+    """Yield the text of each PDF page, recording per-page timings on ``report``."""
+    try:
+        import PyPDF2
+    except ImportError:
+        raise ExtractionError('PDF support requires PyPDF2 library. Install with: pip install PyPDF2')
+
+    with spooled_path(file_obj, max_bytes) as path:
+        reader = PyPDF2.PdfReader(path)
+        pages = min(len(reader.pages), max_pages)
+        if len(reader.pages) > pages:
+            report.truncated = True
+
+        if pages >= PARALLEL_MIN_PAGES and WORKERS > 1:
+            results = iter_pdf_ranges(path, pages)
+        else:
+            results = iter_pdf_pages(reader, 0, pages)
+
+        for number, text, seconds in results:
+            report.add_page(number, len(text), seconds)
+            yield text + '\n'
+
+
+def iter_docx_blocks(document):
+    """Yield the paragraphs and tables of a DOCX body in document order."""
+    from docx.oxml.ns import qn
+    from docx.table import Table
+    from docx.text.paragraph import Paragraph
+
+    for child in document.element.body.iterchildren():
+        if child.tag == qn('w:p'):
+            yield Paragraph(child, document)
+        elif child.tag == qn('w:tbl'):
+            yield Table(child, document)
+
+
+def iter_docx(file_obj):
+    """Yield each DOCX paragraph, and each table row as ``cell | cell``, as a line."""
     try:
-        # Handle plain text files
-        if filename.endswith('.txt'):
-            return file_obj.read().decode('utf-8')
-        
-        # Handle PDF files
-        elif filename.endswith('.pdf'):
-            try:
-                import PyPDF2
-                pdf_reader = PyPDF2.PdfReader(file_obj)
-                text = ""
-                for page in pdf_reader.pages:
-                    text += page.extract_text() + "\n"
-                return text
-            except ImportError:
-                return "Note: PDF support requires PyPDF2 library. Install with: pip install PyPDF2"
-        
-        # Handle DOCX files
-        elif filename.endswith('.docx'):
-            try:
-                from docx import Document
-                doc = Document(file_obj)
-                text = ""
-                for paragraph in doc.paragraphs:
-                    text += paragraph.text + "\n"
-                return text
-            except ImportError:
-                return "Note: DOCX support requires python-docx library. Install with: pip install python-docx"
-        
-        # Handle DOC files (older Word format)
-        elif filename.endswith('.doc'):
-            try:
-                import python_docx
-                # Note: python-docx doesn't support .doc format well
-                # For .doc files, recommend converting to .docx first
-                return "Note: .doc files are not supported. Please convert to .docx format."
-            except ImportError:
-                return "Note: Document support requires python-docx library. Install with: pip install python-docx"
-        
+        from docx import Document
+        from docx.table import Table
+    except ImportError:
+        raise ExtractionError('DOCX support requires python-docx library. Install with: pip install python-docx')
+
+    document = Document(file_obj)
+    for block in iter_docx_blocks(document):
+        if isinstance(block, Table):
+            for row in block.rows:
+                cells = []
+                for cell in row.cells:
+                    # Merged cells repeat across the row
+                    if not cells or cell.text != cells[-1]:
+                        cells.append(cell.text)
+                yield ' | '.join(cells) + '\n'
         else:
-            return f"Unsupported file format: {filename}. Supported formats: .txt, .pdf, .docx"
-    
+            yield block.text + '\n'
+
+
+def iter_text(file_obj, report=None, max_chars=MAX_CHARS, max_pages=MAX_PAGES, max_bytes=MAX_BYTES):
+    """
+    Yield the text of an upload piece by piece, stopping at the caps.
+
+    Args:
+        file_obj: Django UploadedFile object
+        report: ExtractionReport to fill in (optional)
+        max_chars: Stop after this many characters
+        max_pages: Read at most this many PDF pages
+        max_bytes: Reject uploads larger than this
+
+    Raises:
+        ExtractionError: For unsupported, oversized or unreadable files
+    """
+    report = report or ExtractionReport(file_obj.name)
+    extension = file_extension(file_obj.name)
+
+    if (getattr(file_obj, 'size', None) or 0) > max_bytes:
+        raise ExtractionError(f'{file_obj.name} is larger than {max_bytes // (1024 * 1024)} MB.')
+
+    if extension == '.txt':
+        pieces = iter_txt(file_obj, max_bytes)
+    elif extension == '.pdf':
+        pieces = iter_pdf(file_obj, report, max_pages, max_bytes)
+    elif extension == '.docx':
+        pieces = iter_docx(file_obj)
+    elif extension == '.doc':
+        # python-docx does not read the older Word format
+        raise ExtractionError('.doc files are not supported. Please convert to .docx format.')
+    else:
+        raise ExtractionError(
+            f'Unsupported file format: {file_obj.name}. Supported formats: {", ".join(SUPPORTED_EXTENSIONS)}'
+        )
+
+    began = time.perf_counter()
+    try:
+        for piece in pieces:
+            remaining = max_chars - report.chars
+            if len(piece) > remaining:
+                report.chars += remaining
+                report.truncated = True
+                yield piece[:remaining]
+                break
+            report.chars += len(piece)
+            yield piece
+    except ExtractionError:
+        raise
     except Exception as e:
-        return f"Error extracting text from file: {str(e)}"
+        raise ExtractionError(f'Error extracting text from file: {str(e)}') from e
+    finally:
+        pieces.close()
+        report.seconds = time.perf_counter() - began
+        report.log()
+
+
+def extract_text_from_file(file_obj, report=None):
+    """
+    Extract text from various file formats.
+
+    Args:
+        file_obj: Django UploadedFile object
+        report: ExtractionReport to fill in with timings and truncation (optional)
+
+    Returns:
+        str: Extracted text from the file, cut off at ``EXTRACT_MAX_CHARS``
+
+    Raises:
+        ExtractionError: For unsupported, oversized or unreadable files
+    """
+    return ''.join(iter_text(file_obj, report))
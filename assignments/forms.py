@@ -4,8 +4,12 @@ Forms for the assignments app.
 from django import forms
 from django.utils import timezone
 from datetime import datetime, time, timedelta
+from .file_utils import SUPPORTED_EXTENSIONS, file_extension
 from .models import Assignment, Course, Podcast, StudyNotes, Event, Reminder, ChatMessage
 
+# Most note files accepted in one podcast or study-notes request
+MAX_NOTES_FILES = 10
+
 
 class CourseForm(forms.ModelForm):
     """Form for creating and updating courses."""
@@ -101,12 +105,55 @@ class AssignmentFilterForm(forms.Form):
             self.fields['course'].queryset = Course.objects.filter(user=user)
 
 
+class MultipleFileInput(forms.ClearableFileInput):
+    """File input that lets the user pick several files at once."""
+    
+    allow_multiple_selected = True
+
+
+class MultipleFileField(forms.FileField):
+    """File field that cleans to a list of uploaded files, in upload order."""
+    
+    def __init__(self, *args, max_files=MAX_NOTES_FILES, **kwargs):
+        kwargs.setdefault('widget', MultipleFileInput())
+        self.max_files = max_files
+        super().__init__(*args, **kwargs)
+    
+    def clean(self, data, initial=None):
+        if not isinstance(data, (list, tuple)):
+            data = [data] if data else []
+        if len(data) > self.max_files:
+            raise forms.ValidationError(f'Upload at most {self.max_files} files at once.')
+        files = [super(MultipleFileField, self).clean(item, initial) for item in data]
+        if not files and self.required:
+            raise forms.ValidationError(self.error_messages['required'], code='required')
+        for file_obj in files:
+            if file_extension(file_obj.name) not in SUPPORTED_EXTENSIONS:
+                raise forms.ValidationError(
+                    f'{file_obj.name} is not a supported format. Upload {", ".join(SUPPORTED_EXTENSIONS)} files.'
+                )
+        return files
+
+
+def notes_files_field():
+    """Optional multi-file upload for PDF, DOCX and TXT notes."""
+    return MultipleFileField(
+        required=False,
+        widget=MultipleFileInput(attrs={
+            'class': 'form-control',
+            'accept': ','.join(SUPPORTED_EXTENSIONS),
+        }),
+    )
+
+
 class PodcastForm(forms.ModelForm):
     """Form for creating podcasts from notes."""
     
+    notes_files = notes_files_field()
+    
     class Meta:
         model = Podcast
-        fields = ['title', 'topic', 'notes_text', 'notes_file', 'tone', 'length', 'course', 'description']
+        fields = ['title', 'topic', 'notes_text', 'tone', 'length', 'course', 'description']
         widgets = {
             'title': forms.TextInput(attrs={
                 'class': 'form-control',
@@ -121,11 +168,6 @@ class PodcastForm(forms.ModelForm):
                 'rows': 8,
                 'placeholder': 'Paste your notes, study guide, or any text you want turned into a podcast...'
             }),
-            'notes_file': forms.FileInput(attrs={
-                'class': 'form-control',
-                'accept': '.txt,.pdf,.docx,.doc',
-                'help_text': 'Upload a document (TXT, PDF, DOCX)'
-            }),
             'description': forms.Textarea(attrs={
                 'class': 'form-control',
                 'rows': 3,
@@ -141,11 +183,38 @@ class PodcastForm(forms.ModelForm):
         if user:
             self.fields['course'].queryset = Course.objects.filter(user=user)
         self.fields['course'].required = False
+        self.fields['notes_text'].required = False
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('notes_text') and not cleaned_data.get('notes_files'):
+            raise forms.ValidationError('Paste some notes or upload at least one document.')
+        return cleaned_data
+
+
+class PodcastScriptForm(forms.ModelForm):
+    """Form for editing a generated podcast script before re-recording it."""
+    
+    class Meta:
+        model = Podcast
+        fields = ['script']
+        widgets = {
+            'script': forms.Textarea(attrs={
+                'class': 'form-control',
+                'rows': 20,
+            }),
+        }
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['script'].required = True
 
 
 class StudyNotesForm(forms.ModelForm):
     """Form for generating AI study notes."""
     
+    notes_files = notes_files_field()
+    
     class Meta:
         model = StudyNotes
         fields = ['topic', 'detail_level', 'course']
@@ -291,3 +360,10 @@ class ChatForm(forms.Form):
             'autofocus': True
         })
     )
+    thread = forms.IntegerField(required=False, widget=forms.HiddenInput())
+    fresh = forms.BooleanField(
+        required=False,
+        label='Get a fresh answer',
+        help_text='Ask the assistant again instead of reusing an answer to a similar question.',
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'})
+    )
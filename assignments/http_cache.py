@@ -0,0 +1,78 @@
+"""
+HTTP caching helpers for the read-only JSON APIs.
+
+``conditional_user_resource`` answers ``If-None-Match`` / ``If-Modified-Since``
+with a 304 before the view's own query runs. The validator is computed from
+the newest ``updated_at`` and the row count of each model the view reads
+(both served by the ``(user, updated_at)`` indexes), plus the request's query
+parameters and a time bucket, because "upcoming" windows move with the clock
+even when no row changes.
+"""
+import hashlib
+from functools import wraps
+
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+
+def bounded_int(request, name, default, maximum, minimum=1):
+    """Read an integer query parameter, falling back to ``default`` and clamping to a range."""
+    try:
+        value = int(request.GET.get(name, default))
+    except (TypeError, ValueError):
+        value = default
+    return max(minimum, min(value, maximum))
+
+
+def resource_validator(request, models, bucket_seconds):
+    """
+    Compute an ETag and last-modified time for the user's rows of ``models``.
+
+    Returns:
+        tuple: (etag string, last-modified unix timestamp)
+    """
+    now = timezone.now().timestamp()
+    bucket = int(now // bucket_seconds) * bucket_seconds
+    parts = [request.path, request.GET.urlencode(), str(request.user.pk), str(bucket)]
+    last_modified = bucket
+
+    for model in models:
+        stats = model.objects.filter(user=request.user).aggregate(
+            latest=Max('updated_at'),
+            count=Count('pk'),
+        )
+        latest = stats['latest'].timestamp() if stats['latest'] else 0
+        last_modified = max(last_modified, latest)
+        parts.append(f"{model._meta.label}:{latest}:{stats['count']}")
+
+    etag = hashlib.md5('|'.join(parts).encode(), usedforsecurity=False).hexdigest()
+    return quote_etag(etag), int(last_modified)
+
+
+def conditional_user_resource(*models, bucket_seconds=60):
+    """
+    Decorator for per-user JSON views whose output depends only on the user's
+    rows of ``models``, the query string and the current time bucket.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view_func(request, *args, **kwargs)
+
+            etag, last_modified = resource_validator(request, models, bucket_seconds)
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = view_func(request, *args, **kwargs)
+                if response.status_code == 200:
+                    response['ETag'] = etag
+                    response['Last-Modified'] = http_date(last_modified)
+
+            # Per-user data: browsers may keep it but must revalidate every time
+            patch_cache_control(response, private=True, max_age=0, must_revalidate=True)
+            patch_vary_headers(response, ['Cookie'])
+            return response
+        return _wrapped_view
+    return decorator
@@ -0,0 +1,153 @@
+"""
+Lease-based row claiming shared by background workers.
+
+A lease is a pair of ``lease_owner`` / ``lease_expires_at`` columns on a model.
+Workers claim rows by writing their owner id and an expiry; a row whose lease
+has expired (because its worker crashed) can be claimed again by anyone.
+
+:func:`single_flight` uses the same columns to let only one run at a time
+work on a row, e.g. one generation per podcast however many times it is
+requested.
+"""
+import os
+import socket
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+
+class LeaseLost(Exception):
+    """Raised by work that finds another owner has taken over its row."""
+
+
+def make_owner_id():
+    """Return a lease owner id unique to this process and run."""
+    return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+
+def supports_skip_locked(using='default'):
+    """Whether the database can hand out rows with SELECT ... FOR UPDATE SKIP LOCKED."""
+    return connections[using].features.has_select_for_update_skip_locked
+
+
+def available(queryset, now=None):
+    """Filter a queryset down to rows with no live lease."""
+    now = now or timezone.now()
+    return queryset.filter(Q(lease_expires_at__isnull=True) | Q(lease_expires_at__lt=now))
+
+
+def claim(queryset, owner, lease_seconds, limit=None, order_by=('pk',)):
+    """
+    Claim up to ``limit`` unleased rows of ``queryset`` for ``owner``.
+
+    On databases with SKIP LOCKED support the candidate rows are locked while
+    the lease is written, so concurrent workers never see the same row. On
+    SQLite the claim is a conditional UPDATE, which is safe for the single
+    writer SQLite allows.
+
+    Returns:
+        list: The claimed model instances
+    """
+    now = timezone.now()
+    expires_at = now + timedelta(seconds=lease_seconds)
+    using = queryset.db
+    model = queryset.model
+
+    with transaction.atomic(using=using):
+        candidates = available(queryset, now).order_by(*order_by)
+        if supports_skip_locked(using):
+            candidates = candidates.select_for_update(skip_locked=True)
+        if limit:
+            candidates = candidates[:limit]
+        pks = list(candidates.values_list('pk', flat=True))
+        if not pks:
+            return []
+        # Re-check availability so a racing claimer on SQLite cannot steal a row
+        available(model._default_manager.using(using).filter(pk__in=pks), now).update(
+            lease_owner=owner,
+            lease_expires_at=expires_at,
+        )
+
+    return list(
+        model._default_manager.using(using)
+        .filter(pk__in=pks, lease_owner=owner, lease_expires_at=expires_at)
+        .order_by(*order_by)
+    )
+
+
+def release(instance, **fields):
+    """
+    Drop the lease held on ``instance`` and save any extra ``fields`` with it.
+
+    Nothing is written if the lease expired and another owner has claimed
+    the row since.
+
+    Returns:
+        bool: False if the lease was lost
+    """
+    queryset = type(instance)._default_manager.filter(pk=instance.pk)
+    if instance.lease_owner:
+        queryset = queryset.filter(lease_owner=instance.lease_owner)
+    fields.update(lease_owner='', lease_expires_at=None)
+    if not queryset.update(**fields):
+        return False
+    for name, value in fields.items():
+        setattr(instance, name, value)
+    return True
+
+
+def renew(instance, lease_seconds):
+    """
+    Push back the expiry of the lease ``instance`` holds.
+
+    Returns:
+        bool: False if the lease was lost (or ``instance`` holds none)
+    """
+    if not instance.lease_owner:
+        return False
+    expires_at = timezone.now() + timedelta(seconds=lease_seconds)
+    renewed = type(instance)._default_manager.filter(pk=instance.pk, lease_owner=instance.lease_owner).update(
+        lease_expires_at=expires_at
+    )
+    if renewed:
+        instance.lease_expires_at = expires_at
+    return bool(renewed)
+
+
+@contextmanager
+def single_flight(instance, lease_seconds, owner=None):
+    """
+    Hold the lease on ``instance`` for the duration of the block.
+
+    Yields False, without waiting, if another live owner holds it: that run
+    is already doing the work. The lease is released when the block exits;
+    if the process dies instead, it expires after ``lease_seconds`` and the
+    row can be claimed again. Long runs should :func:`renew` it.
+
+    Usage::
+
+        with single_flight(podcast, 600) as acquired:
+            if acquired:
+                ...
+    """
+    owner = owner or make_owner_id()
+    claimed = claim(type(instance)._default_manager.filter(pk=instance.pk), owner, lease_seconds)
+    if not claimed:
+        yield False
+        return
+
+    # Keep the lease on the caller's copy, so a full save() does not clear it
+    instance.lease_owner = owner
+    instance.lease_expires_at = claimed[0].lease_expires_at
+    try:
+        yield True
+    finally:
+        type(instance)._default_manager.filter(pk=instance.pk, lease_owner=owner).update(
+            lease_owner='', lease_expires_at=None
+        )
+        instance.lease_owner = ''
+        instance.lease_expires_at = None
@@ -0,0 +1,288 @@
+"""
+Content-addressed cache for LLM completions.
+
+Identical requests (same model, prompts, temperature and token limit) are
+answered from the ``LLMCacheEntry`` table instead of calling OpenAI again.
+Entries expire after ``LLM_CACHE_TTL`` and the table is kept under
+``LLM_CACHE_MAX_ENTRIES`` rows and ``LLM_CACHE_MAX_BYTES`` of responses by
+evicting the least recently used entries.
+
+Callers can skip the cache for one call with ``use_cache=False``; the fresh
+answer still replaces the stored one. ``cached_completions`` runs a batch of
+requests, sending only the misses to the model, in parallel.
+"""
+import contextvars
+import hashlib
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
+from . import ai_gateway
+from .models import LLMCacheEntry
+
+logger = logging.getLogger(__name__)
+
+CACHE_ENABLED = getattr(settings, 'LLM_CACHE_ENABLED', True)
+CACHE_TTL = getattr(settings, 'LLM_CACHE_TTL', timedelta(days=30))
+MAX_ENTRIES = getattr(settings, 'LLM_CACHE_MAX_ENTRIES', 10000)
+MAX_BYTES = getattr(settings, 'LLM_CACHE_MAX_BYTES', 50 * 1024 * 1024)
+
+# Evict after every this many stores rather than on every write
+EVICT_EVERY = 50
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'bypassed': 0, 'stores': 0, 'evictions': 0}
+
+
+def record(metric, count=1):
+    """Increment one of this process's cache counters."""
+    with _stats_lock:
+        _stats[metric] += count
+
+
+def get_stats():
+    """
+    Return this process's cache counters.
+
+    Returns:
+        dict: Counts of hits, misses, bypassed calls, stores and evictions,
+        plus the hit rate over hits and misses
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+    return stats
+
+
+def reset_stats():
+    """Zero this process's cache counters."""
+    with _stats_lock:
+        for metric in _stats:
+            _stats[metric] = 0
+
+
+def make_key(model, messages, temperature, max_tokens):
+    """Hash a chat completion request into a cache key."""
+    request = {
+        'model': model,
+        'messages': messages,
+        'temperature': temperature,
+        'max_tokens': max_tokens,
+    }
+    encoded = json.dumps(request, sort_keys=True, ensure_ascii=False).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def lookup(key):
+    """Return the cached response for ``key``, or None if missing or expired."""
+    now = timezone.now()
+    entry = LLMCacheEntry.objects.filter(key=key).filter(
+        Q(expires_at__isnull=True) | Q(expires_at__gt=now)
+    ).only('pk', 'response').first()
+    if entry is None:
+        return None
+    LLMCacheEntry.objects.filter(pk=entry.pk).update(hits=F('hits') + 1, last_used_at=now)
+    return entry.response
+
+
+def store(key, model, response):
+    """
+    Save a response under ``key``, replacing any older one.
+
+    Best effort: if another worker stores the same key at the same moment,
+    its entry is kept and this call returns without raising.
+    """
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            LLMCacheEntry.objects.update_or_create(
+                key=key,
+                defaults={
+                    'model': model,
+                    'response': response,
+                    'size': len(response.encode()),
+                    'last_used_at': now,
+                    'expires_at': now + CACHE_TTL if CACHE_TTL else None,
+                },
+            )
+    except IntegrityError:
+        logger.info('LLM cache entry %s was stored concurrently', key)
+        return
+    record('stores')
+    if get_stats()['stores'] % EVICT_EVERY == 0:
+        evict()
+
+
+def evict(max_entries=None, max_bytes=None):
+    """
+    Delete expired entries, then least recently used ones until the cache
+    fits in ``max_entries`` rows and ``max_bytes`` of responses.
+
+    Returns:
+        int: Number of entries deleted
+    """
+    max_entries = MAX_ENTRIES if max_entries is None else max_entries
+    max_bytes = MAX_BYTES if max_bytes is None else max_bytes
+
+    deleted, _ = LLMCacheEntry.objects.filter(expires_at__lte=timezone.now()).delete()
+
+    # Walk from newest to oldest; the first row past either limit and
+    # everything older than it is evicted
+    cutoff = None
+    kept = total = 0
+    rows = LLMCacheEntry.objects.order_by('-last_used_at', '-pk').values_list('pk', 'last_used_at', 'size')
+    for pk, last_used_at, size in rows.iterator():
+        if kept >= max_entries or total + size > max_bytes:
+            cutoff = (pk, last_used_at)
+            break
+        kept += 1
+        total += size
+
+    stale = 0
+    if cutoff:
+        pk, last_used_at = cutoff
+        stale, _ = LLMCacheEntry.objects.filter(
+            Q(last_used_at__lt=last_used_at) | Q(last_used_at=last_used_at, pk__lte=pk)
+        ).delete()
+
+    deleted += stale
+    if deleted:
+        record('evictions', deleted)
+        logger.info('Evicted %s LLM cache entries', deleted)
+    return deleted
+
+
+def cache_size():
+    """Return the number of cached entries and their total response bytes."""
+    stats = LLMCacheEntry.objects.aggregate(total=Sum('size'))
+    return LLMCacheEntry.objects.count(), stats['total'] or 0
+
+
+def cached_completion(client, model, messages, temperature, max_tokens, use_cache=True):
+    """
+    Run a chat completion through the cache.
+
+    Args:
+        client: OpenAI client used on a miss
+        model: Chat model name
+        messages: Chat messages sent to the model
+        temperature: Sampling temperature
+        max_tokens: Response token limit
+        use_cache: Set False to always call the model (the answer is still stored)
+
+    Returns:
+        str: The completion text
+    """
+    if not CACHE_ENABLED:
+        use_cache = False
+    key = make_key(model, messages, temperature, max_tokens)
+
+    if use_cache:
+        cached = lookup(key)
+        if cached is not None:
+            record('hits')
+            return cached
+        record('misses')
+    else:
+        record('bypassed')
+
+    response = ai_gateway.call(
+        client.chat.completions.create,
+        model=model,
+        messages=messages,
+        temperature=temperature,
+        max_tokens=max_tokens,
+    )
+    content = response.choices[0].message.content
+
+    if CACHE_ENABLED and content:
+        store(key, model, content)
+    return content
+
+
+async def acached_completion(client, model, messages, temperature, max_tokens, use_cache=True):
+    """Async version of :func:`cached_completion` for an AsyncOpenAI client."""
+    if not CACHE_ENABLED:
+        use_cache = False
+    key = make_key(model, messages, temperature, max_tokens)
+
+    if use_cache:
+        cached = await sync_to_async(lookup)(key)
+        if cached is not None:
+            record('hits')
+            return cached
+        record('misses')
+    else:
+        record('bypassed')
+
+    response = await ai_gateway.acall(
+        client.chat.completions.create,
+        model=model,
+        messages=messages,
+        temperature=temperature,
+        max_tokens=max_tokens,
+    )
+    content = response.choices[0].message.content
+
+    if CACHE_ENABLED and content:
+        await sync_to_async(store)(key, model, content)
+    return content
+
+
+def cached_completions(client, model, message_lists, temperature, max_tokens, max_workers=4):
+    """
+    Run several chat completions through the cache, calling the model for
+    the misses in parallel.
+
+    Cache reads and writes stay on the calling thread; the pool threads only
+    make API requests, charged to the caller's AI budget.
+
+    Args:
+        client: OpenAI client used on misses
+        model: Chat model name
+        message_lists: One list of chat messages per request
+        temperature: Sampling temperature
+        max_tokens: Response token limit per request
+        max_workers: Most requests in flight at once
+
+    Returns:
+        list: Completion texts in the order of ``message_lists``
+    """
+    keys = [make_key(model, messages, temperature, max_tokens) for messages in message_lists]
+    results = [lookup(key) if CACHE_ENABLED else None for key in keys]
+    misses = [index for index, result in enumerate(results) if result is None]
+    record('hits', len(results) - len(misses))
+    record('misses', len(misses))
+
+    def complete(messages):
+        response = ai_gateway.call(
+            client.chat.completions.create,
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+        )
+        return response.choices[0].message.content
+
+    if misses:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(misses)))) as executor:
+            # Each request runs in a copy of this thread's context, which carries the AI budget payer
+            answers = executor.map(
+                lambda context, messages: context.run(complete, messages),
+                [contextvars.copy_context() for _ in misses],
+                [message_lists[index] for index in misses],
+            )
+            for index, content in zip(misses, answers):
+                results[index] = content
+                if CACHE_ENABLED and content:
+                    store(keys[index], model, content)
+    return results
@@ -0,0 +1,31 @@
+"""
+Management command to delete podcast audio that nothing uses any more.
+
+Stored audio is shared between podcasts and kept for a grace period after
+its last user goes, so a regeneration can pick it back up. Run this from
+cron to reclaim the disk space afterwards.
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from assignments.audio_store import collect_garbage
+
+
+class Command(BaseCommand):
+    help = 'Delete stored podcast audio with no remaining users'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-hours', type=float, default=None,
+            help='Keep unused audio this long (default: AUDIO_STORE_GARBAGE_GRACE)',
+        )
+
+    def handle(self, *args, **options):
+        grace = None
+        if options['grace_hours'] is not None:
+            grace = timedelta(hours=options['grace_hours'])
+
+        deleted, freed = collect_garbage(grace)
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {deleted} audio file(s), freed {freed / (1024 * 1024):.1f} MB.'
+        ))
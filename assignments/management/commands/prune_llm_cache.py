@@ -0,0 +1,30 @@
+"""
+Management command to evict stale LLM cache entries.
+
+Eviction also runs periodically as responses are stored; run this from cron
+to keep the table within its limits when few new responses are written.
+"""
+from django.core.management.base import BaseCommand
+from assignments.llm_cache import cache_size, evict
+from assignments.models import LLMCacheEntry
+
+
+class Command(BaseCommand):
+    help = 'Evict expired and least recently used LLM cache entries'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Delete every cached response',
+        )
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            deleted, _ = LLMCacheEntry.objects.all().delete()
+        else:
+            deleted = evict()
+
+        entries, size = cache_size()
+        self.stdout.write(self.style.SUCCESS(
+            f'Evicted {deleted} entries; {entries} remain ({size / 1024:.1f} KB).'
+        ))
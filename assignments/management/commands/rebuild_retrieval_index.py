@@ -0,0 +1,29 @@
+"""
+Management command to rebuild the chatbot's retrieval index.
+
+Chunks are kept up to date as material is saved; run this once after
+deploying the index, or after changing ``RETRIEVAL_DIMENSIONS`` or
+``RETRIEVAL_CHUNK_CHARS``.
+"""
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from assignments.models import RetrievalChunk
+from assignments.retrieval import rebuild
+
+
+class Command(BaseCommand):
+    help = "Re-chunk and re-vectorize users' notes, scripts and assignments for chatbot retrieval"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only rebuild this username')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            user = get_user_model().objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f"No user named {options['user']}")
+
+        rebuilt = rebuild(user)
+        chunks = RetrievalChunk.objects.all() if user is None else RetrievalChunk.objects.filter(user=user)
+        self.stdout.write(self.style.SUCCESS(f'Indexed {rebuilt} sources into {chunks.count()} chunks.'))
@@ -0,0 +1,58 @@
+"""
+Management command to resume podcast generation runs that were interrupted.
+
+A run is interrupted when the process running it stops (a deploy, a crash or
+a worker restart) and leaves the podcast in an in-progress stage. Resumed runs
+are queued for the task workers and pick up from the podcast's last completed
+stage.
+"""
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from datetime import timedelta
+from assignments import leases
+from assignments.models import Podcast, Task
+from assignments.podcast_pipeline import queue_generation
+from assignments.tasks import generate_podcast_task
+
+
+class Command(BaseCommand):
+    help = 'Resume interrupted (and optionally failed) podcast generation runs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--stale-minutes', type=int, default=15,
+            help='Treat runs with no progress for this long as interrupted',
+        )
+        parser.add_argument(
+            '--failed', action='store_true',
+            help='Also retry failed runs from the stage that failed',
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(minutes=options['stale_minutes'])
+        # A live generation lease means the run is still going, however slowly
+        stalled = leases.available(Podcast.objects.filter(
+            generation_status__in=Podcast.ACTIVE_STATUSES,
+            updated_at__lt=cutoff,
+        ))
+        # A queued podcast with a task still waiting (e.g. for its AI budget) is not stalled either
+        waiting = Task.objects.filter(
+            name=generate_podcast_task.name, status__in=['pending', 'running'],
+        ).values_list('payload__podcast_id', flat=True)
+        stalled = stalled.exclude(generation_status='queued', pk__in=list(waiting))
+        # Release stalled runs so they can be queued again from their checkpoint
+        stalled_ids = list(stalled.values_list('pk', flat=True))
+        Podcast.objects.filter(pk__in=stalled_ids).update(generation_status='failed')
+
+        statuses = ['failed'] if options['failed'] else []
+        podcasts = Podcast.objects.filter(pk__in=stalled_ids) | Podcast.objects.filter(generation_status__in=statuses)
+
+        resumed = 0
+        for podcast in podcasts.distinct():
+            if not queue_generation(podcast):
+                continue
+            generate_podcast_task.enqueue(user=podcast.user, podcast_id=podcast.pk)
+            resumed += 1
+            self.stdout.write(self.style.SUCCESS(f'✓ Queued podcast {podcast.pk}: {podcast.title}'))
+
+        self.stdout.write(self.style.SUCCESS(f'Resumed {resumed} podcast(s).'))
@@ -0,0 +1,49 @@
+"""
+Management command to run the local OpenAI-compatible stub server.
+
+Use it to develop and load-test the AI features without an API key or
+spend:
+
+    python manage.py run_ai_stub --latency 2 --error-rate 0.1
+    OPENAI_API_KEY=stub OPENAI_BASE_URL=http://127.0.0.1:8001/v1 python manage.py runserver
+"""
+from django.core.management.base import BaseCommand
+from assignments.ai_stub import make_server
+
+
+class Command(BaseCommand):
+    help = 'Run a local OpenAI-compatible stub server'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8001)
+        parser.add_argument(
+            '--latency', type=float, default=0.0,
+            help='Seconds to wait before answering each request',
+        )
+        parser.add_argument(
+            '--error-rate', type=float, default=0.0,
+            help='Fraction of requests answered with HTTP 500',
+        )
+        parser.add_argument(
+            '--token-delay', type=float, default=0.05,
+            help='Seconds between streamed chunks',
+        )
+
+    def handle(self, *args, **options):
+        server = make_server(
+            host=options['host'],
+            port=options['port'],
+            latency=options['latency'],
+            error_rate=options['error_rate'],
+            token_delay=options['token_delay'],
+            verbose=True,
+        )
+        host, port = server.server_address[:2]
+        self.stdout.write(self.style.SUCCESS(f'AI stub listening on http://{host}:{port}/v1'))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
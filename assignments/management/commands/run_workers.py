@@ -0,0 +1,87 @@
+"""
+Management command to run background task workers.
+
+Workers claim tasks from the database-backed queue (see task_queue.py). Run
+as many copies as you like, on as many machines as you like: each task is
+claimed by exactly one worker, and tasks held by a crashed worker are picked
+up again when its lease expires.
+"""
+import multiprocessing
+import signal
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from assignments.task_queue import DEFAULT_LEASE_SECONDS, run_worker_process, run_worker_threads
+
+
+class Command(BaseCommand):
+    help = 'Run background task workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int, default=4,
+            help='Number of worker threads or processes',
+        )
+        parser.add_argument(
+            '--pool', choices=['thread', 'process'], default='thread',
+            help='Run workers as threads in this process or as separate processes',
+        )
+        parser.add_argument(
+            '--lease-seconds', type=int, default=DEFAULT_LEASE_SECONDS,
+            help='How long a claimed task stays reserved without a heartbeat',
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help='Seconds to wait between checks of an empty queue',
+        )
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Exit once the queue is empty instead of waiting for more work',
+        )
+
+    def handle(self, *args, **options):
+        concurrency = options['concurrency']
+        if concurrency < 1:
+            raise CommandError('--concurrency must be at least 1')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Starting {concurrency} {options['pool']} worker(s)"
+        ))
+
+        if options['pool'] == 'thread':
+            stop_event = threading.Event()
+            signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+            try:
+                run_worker_threads(
+                    concurrency,
+                    lease_seconds=options['lease_seconds'],
+                    poll_interval=options['poll_interval'],
+                    burst=options['burst'],
+                    stop_event=stop_event,
+                )
+            except KeyboardInterrupt:
+                stop_event.set()
+        else:
+            # Child processes must not share the parent's database connections
+            connections.close_all()
+            processes = [
+                multiprocessing.Process(
+                    target=run_worker_process,
+                    args=(1, options['lease_seconds'], options['poll_interval'], options['burst']),
+                    name=f'task-worker-{index}',
+                )
+                for index in range(concurrency)
+            ]
+            for process in processes:
+                process.start()
+            try:
+                for process in processes:
+                    process.join()
+            except KeyboardInterrupt:
+                for process in processes:
+                    process.terminate()
+                for process in processes:
+                    process.join()
+
+        self.stdout.write(self.style.SUCCESS('Workers stopped.'))
@@ -1,99 +1,361 @@
 """
 Management command to send email reminders for upcoming assignments.
 Checks for assignments due in the next 24 hours and 1 week.
+
+Several copies of this command can run at once (on one machine or many).
+Users are split into shards by id, and each user's reminder is claimed with a
+lease before it is sent, so no reminder goes out twice and reminders held by a
+crashed worker are picked up again once their lease expires. The lease is
+renewed just before each send, so a reminder late in a slow batch whose lease
+ran out, and which another worker has claimed since, is left to that worker.
+
+Assignments are streamed from the database in user order and grouped on the
+fly, and emails are rendered in a process pool with a bounded number of
+pending renders, so memory stays flat however many assignments are due.
 """
-from django.core.management.base import BaseCommand
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+from operator import itemgetter
+
+import django
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
 from django.core.mail import send_mail
+from django.db.models.functions import Mod
 from django.template.loader import render_to_string
 from django.utils import timezone
 from datetime import timedelta
-from assignments.models import Assignment
+from assignments import leases
+from assignments.models import Assignment, ReminderDispatch
+
+
+# Reminder windows in the order they are sent
+WINDOWS = {
+    '24_hours': {
+        'days': (0, 1),
+        'reminder_type': '24 hours',
+        'subject': '⏰ Reminder: {count} assignment(s) due tomorrow!',
+        'message': 'You have {count} assignment(s) due tomorrow!',
+        'label': '24-hour',
+    },
+    '7_days': {
+        'days': (1, 7),
+        'reminder_type': '7 days',
+        'subject': '📅 Reminder: {count} assignment(s) coming up this week',
+        'message': 'You have {count} assignment(s) coming up this week!',
+        'label': '7-day',
+    },
+}
+
+# Columns the email template needs; rows are fetched as dicts, not model instances
+ROW_FIELDS = (
+    'user_id', 'user__username', 'user__first_name', 'user__email',
+    'title', 'due_date', 'priority', 'course__course_name',
+)
+
+PRIORITY_LABELS = dict(Assignment.PRIORITY_CHOICES)
+
+
+def init_render_worker():
+    """Make sure Django is configured in render worker processes."""
+    if not apps.ready:
+        django.setup()
+
+
+def render_reminder(reminder_type, rows):
+    """Render one user's reminder email from plain row dicts."""
+    first = rows[0]
+    context = {
+        'user': {
+            'username': first['user__username'],
+            'first_name': first['user__first_name'],
+        },
+        'assignments': [
+            {
+                'title': row['title'],
+                'due_date': row['due_date'],
+                'priority': row['priority'],
+                'get_priority_display': PRIORITY_LABELS.get(row['priority'], row['priority']),
+                'course': {'course_name': row['course__course_name']},
+            }
+            for row in rows
+        ],
+        'reminder_type': reminder_type,
+    }
+    return render_to_string('emails/reminder_email.html', context)
+
+
+class InlineExecutor:
+    """Stand-in for a process pool that renders in the calling process."""
+
+    class Result:
+        """Already-finished stand-in for a Future."""
+
+        def __init__(self, value):
+            self.value = value
+
+        def result(self):
+            """Return the value computed at submission."""
+            return self.value
+
+    def submit(self, fn, *args):
+        """Call ``fn(*args)`` now and wrap its return value."""
+        return self.Result(fn(*args))
+
+    def shutdown(self, wait=True):
+        """Nothing to shut down; matches the Executor interface."""
 
 
 class Command(BaseCommand):
     help = 'Send email reminders for upcoming assignments'
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Run settings and counters, filled in from the options by handle()
+        self.owner = ''
+        self.lease_seconds = 300
+        self.batch_size = 500
+        self.chunk_size = 2000
+        self.shard_index = 0
+        self.shard_count = 1
+        self.dry_run = False
+        self.max_pending = 4
+        self.rows_streamed = 0
+        self.emails_rendered = 0
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--shard-index', type=int, default=0,
+            help='Which user shard this worker handles (0-based)',
+        )
+        parser.add_argument(
+            '--shard-count', type=int, default=1,
+            help='Total number of user shards across all workers',
+        )
+        parser.add_argument(
+            '--lease-seconds', type=int, default=300,
+            help='How long a claimed reminder stays reserved for this worker',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Number of reminders claimed per round trip',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Number of assignment rows fetched per database round trip',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Render processes to use (0 renders in this process)',
+        )
+        parser.add_argument(
+            '--max-pending', type=int, default=0,
+            help='Maximum emails rendering at once (default: 4 per worker)',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Render reminders without sending them or recording anything',
+        )
+        parser.add_argument(
+            '--benchmark', action='store_true',
+            help='Report rows streamed and emails rendered per second',
+        )
+
     def handle(self, *args, **options):
-        today = timezone.now()
-        tomorrow = today + timedelta(days=1)
-        next_week = today + timedelta(days=7)
-
-        # Check for assignments due in 24 hours
-        due_tomorrow = Assignment.objects.filter(
-            due_date__gte=today,
-            due_date__lte=tomorrow,
-            status__in=['not_started', 'in_progress']
-        ).select_related('user', 'course')
+        shard_index = options['shard_index']
+        shard_count = options['shard_count']
+        if shard_count < 1 or not 0 <= shard_index < shard_count:
+            raise CommandError('--shard-index must be between 0 and --shard-count - 1')
 
-        # Check for assignments due in 7 days
-        due_next_week = Assignment.objects.filter(
-            due_date__gte=today,
-            due_date__lte=next_week,
-            status__in=['not_started', 'in_progress']
-        ).exclude(
-            id__in=due_tomorrow.values_list('id', flat=True)
-        ).select_related('user', 'course')
-
-        # Group by user for due tomorrow
-        users_due_tomorrow = {}
-        for assignment in due_tomorrow:
-            if assignment.user not in users_due_tomorrow:
-                users_due_tomorrow[assignment.user] = []
-            users_due_tomorrow[assignment.user].append(assignment)
-
-        # Send reminders for due tomorrow
-        for user, assignments in users_due_tomorrow.items():
-            subject = f'⏰ Reminder: {len(assignments)} assignment(s) due tomorrow!'
-            context = {
-                'user': user,
-                'assignments': assignments,
-                'reminder_type': '24 hours',
-            }
-            html_message = render_to_string('emails/reminder_email.html', context)
-            send_mail(
-                subject,
-                f'You have {len(assignments)} assignment(s) due tomorrow!',
-                'noreply@trax.local',
-                [user.email],
-                html_message=html_message,
-                fail_silently=True,
+        if shard_count > 1 and not leases.supports_skip_locked():
+            # SQLite has no row locks to share work with; handle every user here
+            self.stdout.write(self.style.WARNING(
+                'Database does not support SKIP LOCKED; running in single-process mode.'
+            ))
+            shard_index, shard_count = 0, 1
+
+        self.owner = leases.make_owner_id()
+        self.lease_seconds = options['lease_seconds']
+        self.batch_size = options['batch_size']
+        self.chunk_size = options['chunk_size']
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+        self.dry_run = options['dry_run']
+        self.max_pending = options['max_pending'] or 4 * max(options['workers'], 1)
+        self.rows_streamed = 0
+        self.emails_rendered = 0
+
+        if options['workers'] > 0:
+            executor = ProcessPoolExecutor(max_workers=options['workers'], initializer=init_render_worker)
+        else:
+            executor = InlineExecutor()
+
+        now = timezone.now()
+        send_date = timezone.localdate()
+        started = time.perf_counter()
+
+        sent = 0
+        try:
+            for window in WINDOWS:
+                assignments = self.due_assignments(now, window)
+                if self.dry_run:
+                    sent += self.render_window(executor, window, assignments)
+                else:
+                    self.plan_dispatches(window, send_date, assignments)
+                    sent += self.send_dispatches(executor, window, send_date, assignments)
+        finally:
+            executor.shutdown(wait=True)
+
+        elapsed = max(time.perf_counter() - started, 1e-6)
+        if options['benchmark']:
+            self.stdout.write(
+                f'Streamed {self.rows_streamed} assignment(s) and rendered {self.emails_rendered} '
+                f'email(s) in {elapsed:.2f}s '
+                f'({self.rows_streamed / elapsed:.0f} rows/s, {self.emails_rendered / elapsed:.0f} emails/s)'
             )
+
+        if self.dry_run:
             self.stdout.write(
-                self.style.SUCCESS(
-                    f'✓ Sent 24-hour reminder to {user.email}'
-                )
+                self.style.SUCCESS(f'Dry run complete: {sent} reminder(s) rendered, none sent.')
+            )
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(f'Email reminders sent successfully! ({sent} sent)')
             )
 
-        # Group by user for due next week
-        users_due_next_week = {}
-        for assignment in due_next_week:
-            if assignment.user not in users_due_next_week:
-                users_due_next_week[assignment.user] = []
-            users_due_next_week[assignment.user].append(assignment)
-
-        # Send reminders for due next week
-        for user, assignments in users_due_next_week.items():
-            subject = f'📅 Reminder: {len(assignments)} assignment(s) coming up this week'
-            context = {
-                'user': user,
-                'assignments': assignments,
-                'reminder_type': '7 days',
-            }
-            html_message = render_to_string('emails/reminder_email.html', context)
+    def due_assignments(self, now, window):
+        """Return open assignments in this worker's shard due within ``window``."""
+        start_days, end_days = WINDOWS[window]['days']
+        queryset = Assignment.objects.filter(
+            due_date__lte=now + timedelta(days=end_days),
+            status__in=['not_started', 'in_progress']
+        )
+        if start_days:
+            queryset = queryset.filter(due_date__gt=now + timedelta(days=start_days))
+        else:
+            queryset = queryset.filter(due_date__gte=now)
+        return self.in_shard(queryset)
+
+    def in_shard(self, queryset):
+        """Limit a queryset with a ``user_id`` column to this worker's shard."""
+        if self.shard_count > 1:
+            queryset = queryset.annotate(
+                user_shard=Mod('user_id', self.shard_count)
+            ).filter(user_shard=self.shard_index)
+        return queryset
+
+    def stream_users(self, assignments):
+        """Yield ``(user_id, rows)`` for each user, streaming rows in user order."""
+        rows = (
+            assignments.order_by('user_id', 'due_date')
+            .values(*ROW_FIELDS)
+            .iterator(chunk_size=self.chunk_size)
+        )
+        for user_id, group in groupby(rows, key=itemgetter('user_id')):
+            group = list(group)
+            self.rows_streamed += len(group)
+            yield user_id, group
+
+    def render_pipeline(self, executor, window, groups, on_rendered):
+        """
+        Render each ``(key, rows)`` group in the executor and hand the result to
+        ``on_rendered(key, rows, html)`` in submission order, keeping at most
+        ``max_pending`` renders in flight.
+        """
+        reminder_type = WINDOWS[window]['reminder_type']
+        pending = deque()
+        handled = 0
+
+        def finish_oldest():
+            key, rows, future = pending.popleft()
+            html = future.result()
+            self.emails_rendered += 1
+            return on_rendered(key, rows, html)
+
+        for key, rows in groups:
+            pending.append((key, rows, executor.submit(render_reminder, reminder_type, rows)))
+            if len(pending) >= self.max_pending:
+                handled += bool(finish_oldest())
+        while pending:
+            handled += bool(finish_oldest())
+        return handled
+
+    def render_window(self, executor, window, assignments):
+        """Render every reminder in ``window`` without sending or claiming."""
+        return self.render_pipeline(
+            executor, window, self.stream_users(assignments), lambda key, rows, html: True
+        )
+
+    def plan_dispatches(self, window, send_date, assignments):
+        """Create today's dispatch row for every user with due assignments."""
+        user_ids = assignments.order_by().values_list('user_id', flat=True).distinct()
+        ReminderDispatch.objects.bulk_create(
+            [ReminderDispatch(user_id=user_id, window=window, send_date=send_date) for user_id in user_ids],
+            ignore_conflicts=True,
+        )
+
+    def send_dispatches(self, executor, window, send_date, assignments):
+        """Claim and send pending dispatches in batches until none are left."""
+        pending = self.in_shard(ReminderDispatch.objects.filter(
+            window=window,
+            send_date=send_date,
+            sent_at__isnull=True,
+        ))
+
+        sent = 0
+        while True:
+            claimed = leases.claim(
+                pending, self.owner, self.lease_seconds,
+                limit=self.batch_size, order_by=('user_id',),
+            )
+            if not claimed:
+                return sent
+            dispatches = {dispatch.user_id: dispatch for dispatch in claimed}
+
+            def on_rendered(user_id, rows, html):
+                return self.send_dispatch(dispatches.pop(user_id), rows, html)
+
+            sent += self.render_pipeline(
+                executor, window,
+                self.stream_users(assignments.filter(user_id__in=list(dispatches))),
+                on_rendered,
+            )
+
+            # Everything was completed since these dispatches were planned
+            for dispatch in dispatches.values():
+                leases.release(dispatch, sent_at=timezone.now())
+
+    def send_dispatch(self, dispatch, rows, html_message):
+        """Send one user's rendered reminder and record the result on its dispatch row."""
+        config = WINDOWS[dispatch.window]
+        email = rows[0]['user__email']
+        count = len(rows)
+        if not leases.renew(dispatch, self.lease_seconds):
+            self.stderr.write(f'Skipped {config["label"]} reminder to {email}: claimed by another worker')
+            return False
+        try:
             send_mail(
-                subject,
-                f'You have {len(assignments)} assignment(s) coming up this week!',
+                config['subject'].format(count=count),
+                config['message'].format(count=count),
                 'noreply@trax.local',
-                [user.email],
+                [email],
                 html_message=html_message,
-                fail_silently=True,
-            )
-            self.stdout.write(
-                self.style.SUCCESS(
-                    f'✓ Sent 7-day reminder to {user.email}'
-                )
+                fail_silently=False,
             )
+        except Exception as e:
+            # Keep the lease so this run skips it; it is retried once the lease expires
+            ReminderDispatch.objects.filter(pk=dispatch.pk).update(attempts=dispatch.attempts + 1)
+            self.stderr.write(f'✗ Failed to send {config["label"]} reminder to {email}: {str(e)}')
+            return False
 
+        if not leases.release(dispatch, attempts=dispatch.attempts + 1, sent_at=timezone.now()):
+            self.stderr.write(f'Lease on {config["label"]} reminder to {email} was lost while sending')
         self.stdout.write(
-            self.style.SUCCESS('Email reminders sent successfully!')
+            self.style.SUCCESS(
+                f'✓ Sent {config["label"]} reminder to {email}'
+            )
         )
+        return True
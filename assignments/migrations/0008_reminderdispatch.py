@@ -0,0 +1,35 @@
+# Generated by Django 5.1.2 on 2026-10-19 06:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assignments', '0007_chatmessage'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReminderDispatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window', models.CharField(choices=[('24_hours', 'Due Tomorrow'), ('7_days', 'Due This Week')], max_length=20)),
+                ('send_date', models.DateField(help_text='Day this reminder batch belongs to')),
+                ('lease_owner', models.CharField(blank=True, max_length=100)),
+                ('lease_expires_at', models.DateTimeField(blank=True, null=True)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reminder_dispatches', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['send_date', 'user_id'],
+                'indexes': [models.Index(fields=['send_date', 'window', 'sent_at'], name='assignments_send_da_c76ede_idx')],
+                'unique_together': {('user', 'window', 'send_date')},
+            },
+        ),
+    ]
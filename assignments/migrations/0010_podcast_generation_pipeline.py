@@ -0,0 +1,51 @@
+# Generated by Django 5.1.2 on 2026-10-19 06:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def mark_finished_podcasts_done(apps, schema_editor):
+    """Podcasts generated before the pipeline existed are already complete."""
+    Podcast = apps.get_model('assignments', 'Podcast')
+    Podcast.objects.filter(is_audio_generated=True).update(generation_status='done')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assignments', '0009_sync_indexes_synctombstone'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='podcast',
+            name='generation_error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='podcast',
+            name='generation_status',
+            field=models.CharField(choices=[('idle', 'Not Started'), ('queued', 'Queued'), ('script', 'Writing Script'), ('segmenting', 'Splitting Script'), ('synthesizing', 'Synthesizing Audio'), ('muxing', 'Assembling Audio'), ('done', 'Done'), ('failed', 'Failed')], default='idle', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='podcast',
+            name='resume_stage',
+            field=models.CharField(blank=True, help_text='Stage the next generation run starts from', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='PodcastSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField()),
+                ('text', models.TextField()),
+                ('audio_file', models.FileField(blank=True, upload_to='podcasts/segments/')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('podcast', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='segments', to='assignments.podcast')),
+            ],
+            options={
+                'ordering': ['podcast', 'position'],
+                'unique_together': {('podcast', 'position')},
+            },
+        ),
+        migrations.RunPython(mark_finished_podcasts_done, migrations.RunPython.noop),
+    ]
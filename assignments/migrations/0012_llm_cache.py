@@ -0,0 +1,33 @@
+# Generated by Django 5.1.2 on 2026-10-19 06:44
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assignments', '0011_task_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(help_text='SHA-256 of model, prompts and sampling options', max_length=64, unique=True)),
+                ('model', models.CharField(max_length=100)),
+                ('response', models.TextField()),
+                ('size', models.PositiveIntegerField(default=0, help_text='Response size in bytes')),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('last_used_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('expires_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name_plural': 'LLM cache entries',
+                'ordering': ['-last_used_at'],
+                'indexes': [models.Index(fields=['last_used_at'], name='assignments_last_us_0d54c9_idx'), models.Index(fields=['expires_at'], name='assignments_expires_d8fbf0_idx')],
+            },
+        ),
+    ]
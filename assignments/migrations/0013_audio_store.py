@@ -0,0 +1,42 @@
+# Generated by Django 5.1.2 on 2026-10-19 06:46
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assignments', '0012_llm_cache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AudioBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(help_text='SHA-256 of the text, voice and model (or of the joined segments)', max_length=64, unique=True)),
+                ('kind', models.CharField(choices=[('segment', 'Segment'), ('podcast', 'Full Podcast')], default='segment', max_length=20)),
+                ('path', models.CharField(help_text='File path relative to MEDIA_ROOT', max_length=255)),
+                ('size', models.PositiveIntegerField(default=0)),
+                ('refcount', models.IntegerField(default=0)),
+                ('last_used_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['refcount', 'last_used_at'], name='assignments_refcoun_6e19a1_idx')],
+            },
+        ),
+        migrations.AddField(
+            model_name='podcast',
+            name='audio_blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='assignments.audioblob'),
+        ),
+        migrations.AddField(
+            model_name='podcastsegment',
+            name='blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='assignments.audioblob'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-19 06:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assignments', '0013_audio_store'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='podcastsegment',
+            name='text_hash',
+            field=models.CharField(blank=True, help_text='Audio store key of the text, voice and TTS model', max_length=64),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.2 on 2026-10-19 07:04
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assignments', '0014_podcastsegment_text_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExtractedTextCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(help_text='SHA-256 of the uploaded file', max_length=64)),
+                ('extractor_version', models.CharField(help_text='Extractor version and caps the text was produced with', max_length=50)),
+                ('text', models.TextField(blank=True)),
+                ('size', models.PositiveIntegerField(default=0, help_text='Text size in bytes')),
+                ('truncated', models.BooleanField(default=False)),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('last_used_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Extracted text cache',
+                'ordering': ['-last_used_at'],
+                'indexes': [models.Index(fields=['last_used_at'], name='assignments_last_us_a87a7f_idx')],
+                'constraints': [models.UniqueConstraint(fields=('content_hash', 'extractor_version'), name='unique_extracted_text')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-19 07:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assignments', '0015_extractedtextcache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studynotes',
+            name='source_text',
+            field=models.TextField(blank=True, help_text='Text extracted from uploaded documents to base the notes on'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.2 on 2026-10-19 07:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assignments', '0017_chatthread'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RetrievalChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_type', models.CharField(choices=[('study_notes', 'Study Notes'), ('podcast_notes', 'Podcast Notes'), ('podcast_script', 'Podcast Script'), ('assignment', 'Assignment')], max_length=20)),
+                ('source_id', models.PositiveBigIntegerField()),
+                ('position', models.PositiveIntegerField(default=0)),
+                ('title', models.CharField(blank=True, max_length=300)),
+                ('text', models.TextField()),
+                ('source_hash', models.CharField(help_text="SHA-256 of the source's title and text when indexed", max_length=64)),
+                ('vector', models.BinaryField(help_text='L2-normalized float32 hashed-feature vector')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='retrieval_chunks', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['source_type', 'source_id', 'position'],
+                'indexes': [models.Index(fields=['source_type', 'source_id'], name='assignments_source__09a2a0_idx')],
+            },
+        ),
+    ]
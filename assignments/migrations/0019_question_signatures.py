@@ -0,0 +1,46 @@
+# Generated by Django 5.1.2 on 2026-10-19 07:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assignments', '0018_retrievalchunk'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatmessage',
+            name='reused_from',
+            field=models.ForeignKey(blank=True, help_text='Earlier near-duplicate question whose answer was reused', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reuses', to='assignments.chatmessage'),
+        ),
+        migrations.CreateModel(
+            name='QuestionSignature',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(help_text='Hash of the context the answer was written for', max_length=64)),
+                ('signature', models.BinaryField(help_text='uint32 MinHash values')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('message', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='signature', to='assignments.chatmessage')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='QuestionBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(max_length=64)),
+                ('key', models.BigIntegerField()),
+                ('signature', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bands', to='assignments.questionsignature')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='questionsignature',
+            index=models.Index(fields=['created_at'], name='assignments_created_088df0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='questionband',
+            index=models.Index(fields=['scope', 'key'], name='assignments_scope_cfa626_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.2 on 2026-10-19 07:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assignments', '0019_question_signatures'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AIUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('feature', models.CharField(help_text='What the tokens were spent on, e.g. chat or a task name', max_length=100)),
+                ('model', models.CharField(max_length=100)),
+                ('requests', models.PositiveIntegerField(default=0)),
+                ('prompt_tokens', models.PositiveBigIntegerField(default=0)),
+                ('completion_tokens', models.PositiveBigIntegerField(default=0)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='ai_usage', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'AI usage',
+                'ordering': ['-day', 'user_id'],
+                'indexes': [models.Index(fields=['day'], name='assignments_day_b81009_idx')],
+                'unique_together': {('user', 'day', 'feature', 'model')},
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.1.2 on 2026-10-19 07:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assignments', '0020_ai_usage'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='podcast',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='podcast',
+            name='lease_owner',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='studynotes',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='studynotes',
+            name='lease_owner',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='studynotes',
+            name='request_hash',
+            field=models.CharField(blank=True, help_text='Hash of the request, to join duplicate submissions', max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='studynotes',
+            constraint=models.UniqueConstraint(condition=models.Q(('generation_error', ''), ('is_generated', False)), fields=('user', 'request_hash'), name='unique_pending_study_notes_request'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.2 on 2026-10-19 07:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assignments', '0021_generation_leases'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='audioblob',
+            name='duration',
+            field=models.FloatField(blank=True, help_text='Length of the audio in seconds', null=True),
+        ),
+        migrations.AddField(
+            model_name='podcastsegment',
+            name='script_offset',
+            field=models.PositiveIntegerField(default=0, help_text="Character offset in the script where this segment's text starts"),
+        ),
+    ]
@@ -1,3 +1,5 @@
+import hashlib
+
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
@@ -31,6 +33,9 @@ class Course(models.Model):
     class Meta:
         ordering = ['course_code']
         unique_together = ['course_code', 'user']
+        indexes = [
+            models.Index(fields=['user', 'updated_at']),
+        ]
     
     def __str__(self):
         return f"{self.course_code} - {self.course_name}"
@@ -71,6 +76,9 @@ class Assignment(models.Model):
     
     class Meta:
         ordering = ['due_date']
+        indexes = [
+            models.Index(fields=['user', 'updated_at']),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.course.course_code}"
@@ -80,6 +88,35 @@ class Assignment(models.Model):
         return timezone.now() > self.due_date and self.status != 'completed'
 
 
+class AudioBlob(models.Model):
+    """Content-addressed audio file shared by every podcast that needs the same audio."""
+    
+    KIND_CHOICES = [
+        ('segment', 'Segment'),
+        ('podcast', 'Full Podcast'),
+    ]
+    
+    key = models.CharField(max_length=64, unique=True, help_text="SHA-256 of the text, voice and model (or of the joined segments)")
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default='segment')
+    path = models.CharField(max_length=255, help_text="File path relative to MEDIA_ROOT")
+    size = models.PositiveIntegerField(default=0)
+    duration = models.FloatField(blank=True, null=True, help_text="Length of the audio in seconds")
+    
+    # Segments and podcasts using this file; unreferenced blobs are collected later
+    refcount = models.IntegerField(default=0)
+    last_used_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['refcount', 'last_used_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.kind} {self.key[:12]} ({self.refcount} refs)"
+
+
 class Podcast(models.Model):
     """Model for AI-generated podcasts from notes."""
     
@@ -96,6 +133,19 @@ class Podcast(models.Model):
         ('long', 'Long (20+ min)'),
     ]
     
+    STATUS_CHOICES = [
+        ('idle', 'Not Started'),
+        ('queued', 'Queued'),
+        ('script', 'Writing Script'),
+        ('segmenting', 'Splitting Script'),
+        ('synthesizing', 'Synthesizing Audio'),
+        ('muxing', 'Assembling Audio'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    ACTIVE_STATUSES = ('queued', 'script', 'segmenting', 'synthesizing', 'muxing')
+    
     title = models.CharField(max_length=200)
     description = models.TextField(blank=True)
     topic = models.CharField(max_length=300, help_text="Topic or subject of the podcast")
@@ -103,6 +153,7 @@ class Podcast(models.Model):
     notes_file = models.FileField(upload_to='podcasts/notes/', blank=True, null=True, help_text="Upload a document (PDF, TXT, DOCX) as notes")
     script = models.TextField(blank=True, help_text="AI-generated podcast script")
     audio_file = models.FileField(upload_to='podcasts/audio/', blank=True, null=True)
+    audio_blob = models.ForeignKey(AudioBlob, on_delete=models.SET_NULL, related_name='+', blank=True, null=True)
     
     tone = models.CharField(max_length=20, choices=TONE_CHOICES, default='educational')
     length = models.CharField(max_length=20, choices=LENGTH_CHOICES, default='medium')
@@ -113,6 +164,15 @@ class Podcast(models.Model):
     is_generated = models.BooleanField(default=False, help_text="Whether the podcast has been generated")
     is_audio_generated = models.BooleanField(default=False, help_text="Whether audio has been generated")
     
+    # Background generation pipeline
+    generation_status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='idle')
+    resume_stage = models.CharField(max_length=20, blank=True, help_text="Stage the next generation run starts from")
+    generation_error = models.TextField(blank=True)
+    
+    # Lease held by the worker currently generating this podcast
+    lease_owner = models.CharField(max_length=100, blank=True)
+    lease_expires_at = models.DateTimeField(blank=True, null=True)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -121,6 +181,31 @@ class Podcast(models.Model):
     
     def __str__(self):
         return f"{self.title} - {self.user.username}"
+    
+    def is_generating(self):
+        """Whether a generation run is queued or in progress."""
+        return self.generation_status in self.ACTIVE_STATUSES
+
+
+class PodcastSegment(models.Model):
+    """One piece of a podcast script, synthesized to audio on its own."""
+    
+    podcast = models.ForeignKey(Podcast, on_delete=models.CASCADE, related_name='segments')
+    position = models.PositiveIntegerField()
+    text = models.TextField()
+    script_offset = models.PositiveIntegerField(default=0, help_text="Character offset in the script where this segment's text starts")
+    text_hash = models.CharField(max_length=64, blank=True, help_text="Audio store key of the text, voice and TTS model")
+    audio_file = models.FileField(upload_to='podcasts/segments/', blank=True)
+    blob = models.ForeignKey(AudioBlob, on_delete=models.SET_NULL, related_name='+', blank=True, null=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['podcast', 'position']
+        unique_together = ['podcast', 'position']
+    
+    def __str__(self):
+        return f"{self.podcast.title} - segment {self.position + 1}"
 
 
 class StudyNotes(models.Model):
@@ -135,20 +220,40 @@ class StudyNotes(models.Model):
     topic = models.CharField(max_length=300, help_text="Topic to generate notes about")
     content = models.TextField(blank=True, help_text="AI-generated study notes")
     detail_level = models.CharField(max_length=20, choices=DETAIL_LEVEL_CHOICES, default='intermediate')
+    source_text = models.TextField(blank=True, help_text="Text extracted from uploaded documents to base the notes on")
     
     course = models.ForeignKey(Course, on_delete=models.SET_NULL, related_name='study_notes', blank=True, null=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='study_notes')
     
     is_generated = models.BooleanField(default=False, help_text="Whether the notes have been generated")
+    generation_error = models.TextField(blank=True)
+    request_hash = models.CharField(max_length=64, blank=True, null=True, help_text="Hash of the request, to join duplicate submissions")
+    
+    # Lease held by the worker currently generating these notes
+    lease_owner = models.CharField(max_length=100, blank=True)
+    lease_expires_at = models.DateTimeField(blank=True, null=True)
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-created_at']
+        constraints = [
+            # One pending generation per identical request
+            models.UniqueConstraint(
+                fields=['user', 'request_hash'],
+                condition=models.Q(is_generated=False, generation_error=''),
+                name='unique_pending_study_notes_request',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.topic} - {self.user.username}"
+    
+    def make_request_hash(self):
+        """Hash of everything the generated notes depend on."""
+        request = '\n'.join([self.topic, self.detail_level, str(self.course_id or ''), self.source_text])
+        return hashlib.sha256(request.encode()).hexdigest()
 
 
 class Event(models.Model):
@@ -183,6 +288,9 @@ class Event(models.Model):
     
     class Meta:
         ordering = ['start_date']
+        indexes = [
+            models.Index(fields=['user', 'updated_at']),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.user.username}"
@@ -226,17 +334,42 @@ class Reminder(models.Model):
     
     class Meta:
         ordering = ['reminder_date']
+        indexes = [
+            models.Index(fields=['user', 'updated_at']),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.user.username}"
 
 
+class ChatThread(models.Model):
+    """A conversation with the chatbot; follow-up questions see its earlier turns."""
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chat_threads')
+    title = models.CharField(max_length=200)
+    
+    # Rolling summary of the turns too old to send verbatim
+    summary = models.TextField(blank=True)
+    summarized_through = models.PositiveBigIntegerField(default=0, help_text="ID of the last message folded into the summary")
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-updated_at']
+    
+    def __str__(self):
+        return f"{self.user.username}: {self.title}"
+
+
 class ChatMessage(models.Model):
     """Store AI chatbot conversation history."""
     
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chat_messages')
+    thread = models.ForeignKey(ChatThread, on_delete=models.CASCADE, related_name='messages', blank=True, null=True)
     question = models.TextField()
     response = models.TextField()
+    reused_from = models.ForeignKey('self', on_delete=models.SET_NULL, related_name='reuses', blank=True, null=True, help_text="Earlier near-duplicate question whose answer was reused")
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
@@ -244,3 +377,241 @@ class ChatMessage(models.Model):
     
     def __str__(self):
         return f"{self.user.username}: {self.question[:50]}"
+
+
+class QuestionSignature(models.Model):
+    """MinHash signature of an answered chatbot question, so near-duplicates can reuse its answer."""
+    
+    message = models.OneToOneField(ChatMessage, on_delete=models.CASCADE, related_name='signature')
+    scope = models.CharField(max_length=64, help_text="Hash of the context the answer was written for")
+    signature = models.BinaryField(help_text="uint32 MinHash values")
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at']),
+        ]
+    
+    def __str__(self):
+        return f"Signature of {self.message}"
+
+
+class QuestionBand(models.Model):
+    """One LSH band of a question signature; questions sharing a band are compared."""
+    
+    signature = models.ForeignKey(QuestionSignature, on_delete=models.CASCADE, related_name='bands')
+    scope = models.CharField(max_length=64)
+    key = models.BigIntegerField()
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['scope', 'key']),
+        ]
+    
+    def __str__(self):
+        return f"{self.scope[:12]}:{self.key}"
+
+
+class ReminderDispatch(models.Model):
+    """Claim record for one reminder email sent to a user for one due-date window."""
+    
+    WINDOW_CHOICES = [
+        ('24_hours', 'Due Tomorrow'),
+        ('7_days', 'Due This Week'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reminder_dispatches')
+    window = models.CharField(max_length=20, choices=WINDOW_CHOICES)
+    send_date = models.DateField(help_text="Day this reminder batch belongs to")
+    
+    # Lease held by the worker currently sending this reminder
+    lease_owner = models.CharField(max_length=100, blank=True)
+    lease_expires_at = models.DateTimeField(blank=True, null=True)
+    
+    attempts = models.PositiveIntegerField(default=0)
+    sent_at = models.DateTimeField(blank=True, null=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['send_date', 'user_id']
+        unique_together = ['user', 'window', 'send_date']
+        indexes = [
+            models.Index(fields=['send_date', 'window', 'sent_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_window_display()} reminder for {self.user.username} on {self.send_date}"
+
+
+class SyncTombstone(models.Model):
+    """Record of a deleted row so offline clients can drop it on their next sync."""
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sync_tombstones')
+    resource = models.CharField(max_length=20, help_text="Sync resource name, e.g. assignments")
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['deleted_at']
+        indexes = [
+            models.Index(fields=['user', 'deleted_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.resource} #{self.object_id} deleted by {self.user.username}"
+
+
+class Task(models.Model):
+    """Unit of background work in the database-backed task queue."""
+    
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+    
+    name = models.CharField(max_length=100, help_text="Registered task name, e.g. podcast.generate")
+    payload = models.JSONField(default=dict, blank=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='tasks', blank=True, null=True)
+    
+    # Scheduling: higher priority first, then fair-queuing order across users
+    priority = models.IntegerField(default=0)
+    virtual_time = models.FloatField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    last_error = models.TextField(blank=True)
+    
+    # Lease held by the worker running this task
+    lease_owner = models.CharField(max_length=100, blank=True)
+    lease_expires_at = models.DateTimeField(blank=True, null=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        ordering = ['-priority', 'virtual_time', 'id']
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+            models.Index(fields=['user', 'status']),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+
+class RetrievalChunk(models.Model):
+    """Piece of a user's own material, with its feature vector, for grounding chatbot answers."""
+    
+    SOURCE_CHOICES = [
+        ('study_notes', 'Study Notes'),
+        ('podcast_notes', 'Podcast Notes'),
+        ('podcast_script', 'Podcast Script'),
+        ('assignment', 'Assignment'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='retrieval_chunks')
+    source_type = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    source_id = models.PositiveBigIntegerField()
+    position = models.PositiveIntegerField(default=0)
+    
+    title = models.CharField(max_length=300, blank=True)
+    text = models.TextField()
+    source_hash = models.CharField(max_length=64, help_text="SHA-256 of the source's title and text when indexed")
+    vector = models.BinaryField(help_text="L2-normalized float32 hashed-feature vector")
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['source_type', 'source_id', 'position']
+        indexes = [
+            models.Index(fields=['source_type', 'source_id']),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_source_type_display()} #{self.source_id} part {self.position}"
+
+
+class ExtractedTextCache(models.Model):
+    """Text extracted from an uploaded document, keyed by the file's content hash."""
+    
+    content_hash = models.CharField(max_length=64, help_text="SHA-256 of the uploaded file")
+    extractor_version = models.CharField(max_length=50, help_text="Extractor version and caps the text was produced with")
+    text = models.TextField(blank=True)
+    size = models.PositiveIntegerField(default=0, help_text="Text size in bytes")
+    truncated = models.BooleanField(default=False)
+    
+    hits = models.PositiveIntegerField(default=0)
+    last_used_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-last_used_at']
+        verbose_name_plural = 'Extracted text cache'
+        constraints = [
+            models.UniqueConstraint(fields=['content_hash', 'extractor_version'], name='unique_extracted_text'),
+        ]
+        indexes = [
+            models.Index(fields=['last_used_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.content_hash[:12]} v{self.extractor_version} ({self.hits} hits)"
+
+
+class LLMCacheEntry(models.Model):
+    """Stored LLM completion, keyed by a hash of everything that shapes the output."""
+    
+    key = models.CharField(max_length=64, unique=True, help_text="SHA-256 of model, prompts and sampling options")
+    model = models.CharField(max_length=100)
+    response = models.TextField()
+    size = models.PositiveIntegerField(default=0, help_text="Response size in bytes")
+    
+    hits = models.PositiveIntegerField(default=0)
+    last_used_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-last_used_at']
+        verbose_name_plural = 'LLM cache entries'
+        indexes = [
+            models.Index(fields=['last_used_at']),
+            models.Index(fields=['expires_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.model} {self.key[:12]} ({self.hits} hits)"
+
+
+class AIUsage(models.Model):
+    """Tokens used on AI calls, totalled per user, day, feature and model."""
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ai_usage', blank=True, null=True)
+    day = models.DateField()
+    feature = models.CharField(max_length=100, help_text="What the tokens were spent on, e.g. chat or a task name")
+    model = models.CharField(max_length=100)
+    
+    requests = models.PositiveIntegerField(default=0)
+    prompt_tokens = models.PositiveBigIntegerField(default=0)
+    completion_tokens = models.PositiveBigIntegerField(default=0)
+    
+    class Meta:
+        ordering = ['-day', 'user_id']
+        verbose_name_plural = 'AI usage'
+        unique_together = ['user', 'day', 'feature', 'model']
+        indexes = [
+            models.Index(fields=['day']),
+        ]
+    
+    @property
+    def total_tokens(self):
+        return self.prompt_tokens + self.completion_tokens
+    
+    def __str__(self):
+        return f"{self.user or 'system'} {self.day} {self.feature}: {self.total_tokens} tokens"
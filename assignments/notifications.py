@@ -0,0 +1,208 @@
+"""
+In-app notifications pushed to open browser tabs over Server-Sent Events.
+
+Changes made in this process are delivered instantly through an in-process
+pub/sub broker. Changes made elsewhere (other web processes, management
+commands, background workers) and reminders that simply become due are picked
+up by a cheap periodic database poll, so every tab sees every change even
+without a shared message bus. An idle tab is one parked coroutine: it costs
+no thread and no queries between polls.
+"""
+import asyncio
+import json
+import threading
+from datetime import datetime, timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+# How often each stream checks the database for changes made in other processes
+POLL_SECONDS = getattr(settings, 'NOTIFICATION_POLL_SECONDS', 30)
+
+# How often an idle stream sends a comment line to keep proxies from closing it
+HEARTBEAT_SECONDS = getattr(settings, 'NOTIFICATION_HEARTBEAT_SECONDS', 15)
+
+# Furthest back a reconnecting tab may ask to catch up from
+MAX_CATCH_UP = timedelta(hours=1)
+
+# Cap on rows returned per model by a single poll
+POLL_LIMIT = 50
+
+
+class Broker:
+    """Fan out notifications to the stream subscribers of each user in this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def subscribe(self, user_id, max_queued=100):
+        """Register a stream for ``user_id`` and return its queue."""
+        queue = asyncio.Queue(maxsize=max_queued)
+        subscriber = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, user_id, subscriber):
+        """Remove a stream registered with :meth:`subscribe`."""
+        with self._lock:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[user_id]
+
+    def subscriber_count(self, user_id=None):
+        """Number of open streams, for one user or overall."""
+        with self._lock:
+            if user_id is not None:
+                return len(self._subscribers.get(user_id, ()))
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def publish(self, user_id, event, data):
+        """Deliver ``event`` to every open stream of ``user_id``; safe from any thread."""
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        message = {
+            'event': event,
+            'id': timezone.now().isoformat(),
+            'data': data,
+        }
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, message)
+            except RuntimeError:
+                # The stream's event loop has already shut down
+                pass
+
+    @staticmethod
+    def _offer(queue, message):
+        try:
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # A stalled tab drops live events; it catches up from the next poll
+            pass
+
+
+broker = Broker()
+
+
+def publish(user_id, event, **data):
+    """Send a notification to all of a user's open tabs in this process."""
+    broker.publish(user_id, event, data)
+
+
+def format_event(message):
+    """Encode a broker message as a Server-Sent Events frame."""
+    payload = json.dumps(message['data'], cls=DjangoJSONEncoder)
+    return f"id: {message['id']}\nevent: {message['event']}\ndata: {payload}\n\n"
+
+
+def message_key(message):
+    """Identity of a message, used to avoid repeating live events in the next poll."""
+    data = message['data']
+    return (message['event'], data.get('id'), str(data.get('updated_at')))
+
+
+def parse_last_event_id(value, now=None):
+    """Turn a browser's ``Last-Event-ID`` header into a catch-up start time."""
+    now = now or timezone.now()
+    try:
+        since = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return now
+    if timezone.is_naive(since):
+        return now
+    return min(max(since, now - MAX_CATCH_UP), now)
+
+
+def poll_changes(user_id, since, now):
+    """Return notifications for changes to a user's data between ``since`` and ``now``."""
+    # Imported here so this module can be loaded before the app registry is ready
+    from .models import Assignment, Reminder
+
+    messages = []
+    stamp = now.isoformat()
+
+    reminders = Reminder.objects.filter(
+        user_id=user_id,
+        updated_at__gt=since,
+        updated_at__lte=now,
+    ).order_by('updated_at').values(
+        'id', 'title', 'reminder_type', 'reminder_date', 'is_completed', 'created_at', 'updated_at'
+    )[:POLL_LIMIT]
+    for reminder in reminders:
+        event = 'reminder.created' if reminder.pop('created_at') > since else 'reminder.updated'
+        messages.append({'event': event, 'id': stamp, 'data': reminder})
+
+    due = Reminder.objects.filter(
+        user_id=user_id,
+        is_completed=False,
+        reminder_date__gt=since,
+        reminder_date__lte=now,
+    ).order_by('reminder_date').values('id', 'title', 'reminder_type', 'reminder_date')[:POLL_LIMIT]
+    for reminder in due:
+        messages.append({'event': 'reminder.due', 'id': stamp, 'data': reminder})
+
+    assignments = Assignment.objects.filter(
+        user_id=user_id,
+        updated_at__gt=since,
+        updated_at__lte=now,
+    ).order_by('updated_at').values(
+        'id', 'title', 'due_date', 'status', 'created_at', 'updated_at'
+    )[:POLL_LIMIT]
+    for assignment in assignments:
+        event = 'assignment.created' if assignment.pop('created_at') > since else 'assignment.updated'
+        messages.append({'event': event, 'id': stamp, 'data': assignment})
+
+    return messages
+
+
+async def event_stream(user_id, since=None, poll_seconds=None, heartbeat_seconds=None):
+    """
+    Yield Server-Sent Events frames for ``user_id`` until the client disconnects.
+
+    Args:
+        user_id: Whose notifications to stream
+        since: Catch up on database changes after this time before going live
+        poll_seconds: Interval between database polls
+        heartbeat_seconds: Longest silence before a keep-alive comment is sent
+    """
+    poll_seconds = poll_seconds or POLL_SECONDS
+    heartbeat_seconds = heartbeat_seconds or HEARTBEAT_SECONDS
+    subscriber = broker.subscribe(user_id)
+    queue = subscriber[1]
+    last_poll = since or timezone.now()
+    next_poll = 0 if since else poll_seconds
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + next_poll
+    delivered = set()
+
+    try:
+        yield 'retry: 5000\n\n'
+        while True:
+            timeout = min(heartbeat_seconds, max(deadline - loop.time(), 0))
+            try:
+                message = await asyncio.wait_for(queue.get(), timeout=timeout)
+            except asyncio.TimeoutError:
+                message = None
+
+            if message is not None:
+                delivered.add(message_key(message))
+                yield format_event(message)
+            elif loop.time() < deadline:
+                yield ': keepalive\n\n'
+
+            if loop.time() >= deadline:
+                now = timezone.now()
+                for polled in await sync_to_async(poll_changes)(user_id, last_poll, now):
+                    if message_key(polled) not in delivered:
+                        yield format_event(polled)
+                delivered.clear()
+                last_poll = now
+                deadline = loop.time() + poll_seconds
+    finally:
+        broker.unsubscribe(user_id, subscriber)
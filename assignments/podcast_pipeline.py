@@ -0,0 +1,365 @@
+"""
+Background pipeline for generating podcasts.
+
+Generation runs as a sequence of stages::
+
+    queued -> script -> segmenting -> synthesizing -> muxing -> done
+
+Every stage saves its output on the Podcast (or its PodcastSegment rows)
+before the next one starts, and ``Podcast.resume_stage`` always names the
+next stage to run. A failed or interrupted run therefore resumes where it
+stopped: a TTS failure keeps the script already paid for, and segments
+synthesized before a crash are not synthesized again. A stage stopped by
+the owner's AI budget puts the podcast back in the queue at that stage.
+
+Only one run works on a podcast at a time: the task holds a lease on the row
+(see leases.single_flight), renewed as the run makes progress, so a duplicate
+task or a resumed run cannot race the live one to write the same files. A run
+that finds its lease taken over (it stalled past the expiry and another run
+claimed the podcast) stops at once and leaves the podcast to the new owner.
+
+Segments are synthesized concurrently (``PODCAST_TTS_CONCURRENCY`` at a
+time, each retried on failure), so a long podcast takes about as long as its
+slowest segment, and are then joined into one mp3 with pydub. Audio lives in
+the content-addressed store (see audio_store.py), so segments whose text was
+already synthesized, for this podcast or any other, are not sent to TTS again.
+Each finished segment can be played at once, before the rest are done (see
+podcast_playback.py).
+"""
+import contextvars
+import logging
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import ai_budget, audio_store, leases
+from .models import Podcast, PodcastSegment
+from .notifications import publish
+from .podcast_service import generate_podcast_audio, generate_podcast_script, script_offsets, split_script
+
+logger = logging.getLogger(__name__)
+
+# Parallel TTS requests per podcast, and tries per segment before giving up
+TTS_CONCURRENCY = getattr(settings, 'PODCAST_TTS_CONCURRENCY', 4)
+TTS_ATTEMPTS = getattr(settings, 'PODCAST_TTS_ATTEMPTS', 3)
+TTS_RETRY_SECONDS = getattr(settings, 'PODCAST_TTS_RETRY_SECONDS', 2)
+
+# Lease on a podcast or study notes row being generated; renewed as stages progress
+GENERATION_LEASE_SECONDS = getattr(settings, 'GENERATION_LEASE_SECONDS', 600)
+
+
+def delete_segments(podcast):
+    """
+    Remove a podcast's segment rows.
+
+    Stored audio is shared, so it is only released here (by the post_delete
+    signal); files from before the audio store are removed directly.
+    """
+    for segment in podcast.segments.filter(blob__isnull=True).exclude(audio_file=''):
+        if os.path.exists(segment.audio_file.path):
+            os.remove(segment.audio_file.path)
+    podcast.segments.all().delete()
+
+
+def release_audio(podcast):
+    """Drop a podcast's claim on its joined audio, removing a pre-store file directly."""
+    if podcast.audio_blob_id:
+        audio_store.release(podcast.audio_blob_id)
+    elif podcast.audio_file and os.path.exists(podcast.audio_file.path):
+        os.remove(podcast.audio_file.path)
+
+
+def stage_script(podcast):
+    """
+    Write the podcast script with the LLM.
+
+    Raises:
+        leases.LeaseLost: If another run claimed the podcast while the script was written
+    """
+    script = generate_podcast_script(
+        topic=podcast.topic,
+        notes_text=podcast.notes_text,
+        tone=podcast.tone,
+        length=podcast.length,
+        description=podcast.description,
+        # Regenerating a podcast should give a new script, not the cached one
+        use_cache=not podcast.script
+    )
+    # Saved only while this run still holds the podcast, so a stalled run cannot overwrite its successor
+    owned = Podcast.objects.filter(pk=podcast.pk)
+    if podcast.lease_owner:
+        owned = owned.filter(lease_owner=podcast.lease_owner)
+    if not owned.update(script=script, is_generated=True, updated_at=timezone.now()):
+        raise leases.LeaseLost(f'Podcast {podcast.pk} was taken over by another run')
+    podcast.script = script
+    podcast.is_generated = True
+
+
+def stage_segmenting(podcast):
+    """
+    Split the script into segments that can be synthesized separately.
+    
+    Segments whose text (and so hash) is unchanged from the previous run
+    keep their audio, so after a small script edit only the edited segments
+    go to TTS.
+    """
+    previous = {}
+    for segment in podcast.segments.exclude(blob__isnull=True).select_related('blob'):
+        previous[segment.blob.key] = segment.blob
+
+    texts = split_script(podcast.script)
+    segments = []
+    for position, (text, offset) in enumerate(zip(texts, script_offsets(podcast.script, texts))):
+        text_hash = audio_store.segment_key(text)
+        blob = previous.get(text_hash)
+        segments.append(PodcastSegment(
+            podcast=podcast,
+            position=position,
+            text=text,
+            script_offset=offset,
+            text_hash=text_hash,
+            blob=blob,
+            audio_file=blob.path if blob else '',
+        ))
+
+    with transaction.atomic():
+        delete_segments(podcast)
+        PodcastSegment.objects.bulk_create(segments)
+        # bulk_create skips signals, so count the carried-over blobs here
+        for segment in segments:
+            if segment.blob:
+                audio_store.acquire(segment.blob)
+
+    reused = sum(1 for segment in segments if segment.blob)
+    logger.info('Podcast %s: %s of %s segments reuse earlier audio', podcast.pk, reused, len(segments))
+
+
+def synthesize_segment(text, full_path):
+    """Synthesize one segment, retrying with jittered exponential backoff."""
+    for attempt in range(1, TTS_ATTEMPTS + 1):
+        try:
+            return generate_podcast_audio(text, full_path)
+        except Exception as e:
+            if attempt == TTS_ATTEMPTS or ai_budget.budget_error(e):
+                raise
+            logger.warning('TTS attempt %s for %s failed, retrying', attempt, full_path)
+            time.sleep(TTS_RETRY_SECONDS * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+
+
+def keep_lease(podcast):
+    """
+    Renew the run's lease on ``podcast``.
+
+    Raises:
+        leases.LeaseLost: If another run has claimed the podcast since
+    """
+    # A run started outside a task (e.g. from the shell) holds no lease to keep
+    if podcast.lease_owner and not leases.renew(podcast, GENERATION_LEASE_SECONDS):
+        raise leases.LeaseLost(f'Podcast {podcast.pk} was taken over by another run')
+
+
+def attach_blob(podcast, segments, blob):
+    """Point segments at a stored blob and count them as its users."""
+    keep_lease(podcast)
+    for segment in segments:
+        audio_store.acquire(blob)
+        segment.blob = blob
+        segment.audio_file = blob.path
+        segment.save(update_fields=['blob', 'audio_file'])
+    # Show progress so resume_podcasts does not mistake a long run for a stalled one
+    Podcast.objects.filter(pk=podcast.pk).update(updated_at=timezone.now())
+    # Open players pick the new segment up straight away (see podcast_playback.py)
+    publish(podcast.user_id, 'podcast.progress', id=podcast.pk, stage='synthesizing')
+
+
+def stage_synthesizing(podcast):
+    """
+    Give every segment without audio a stored blob, synthesizing only text
+    that is not in the audio store yet.
+    
+    Requests run in a thread pool that only touches files; each finished
+    blob is recorded from this thread as soon as it completes, so a failure
+    elsewhere does not lose it.
+    """
+    pending = podcast.segments.filter(Q(audio_file='') | Q(audio_file__isnull=True))
+    by_key = {}
+    for segment in pending:
+        by_key.setdefault(segment.text_hash or audio_store.segment_key(segment.text), []).append(segment)
+    if not by_key:
+        return
+
+    for key, blob in audio_store.find(by_key).items():
+        attach_blob(podcast, by_key.pop(key), blob)
+    if not by_key:
+        return
+
+    errors = []
+    with ThreadPoolExecutor(max_workers=max(1, min(TTS_CONCURRENCY, len(by_key)))) as executor:
+        futures = {
+            executor.submit(
+                contextvars.copy_context().run, audio_store.write_blob, key,
+                lambda tmp_path, text=segments[0].text: synthesize_segment(text, tmp_path),
+            ): key
+            for key, segments in by_key.items()
+        }
+
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                relative_path = future.result()
+            except Exception as e:
+                errors.append(e)
+                continue
+            attach_blob(podcast, by_key[key], audio_store.register(key, relative_path))
+
+    if errors:
+        raise errors[0]
+
+
+def ffmpeg_available():
+    """Whether pydub can find the ffmpeg binary it needs to decode and encode mp3."""
+    from pydub.utils import which
+    return bool(which('ffmpeg') or which('avconv'))
+
+
+def join_audio(paths, output_path):
+    """
+    Join mp3 files into ``output_path``.
+    
+    pydub decodes and re-encodes the audio so the result has one consistent
+    header and duration. Without ffmpeg the files are concatenated as bytes,
+    which players handle for mp3 from the same TTS voice and model.
+    """
+    if ffmpeg_available():
+        from pydub import AudioSegment
+        combined = AudioSegment.empty()
+        for path in paths:
+            combined += AudioSegment.from_file(path, format='mp3')
+        combined.export(output_path, format='mp3')
+        return
+
+    logger.warning('ffmpeg not found; joining podcast audio without re-encoding')
+    with open(output_path, 'wb') as output:
+        for path in paths:
+            with open(path, 'rb') as part:
+                output.write(part.read())
+
+
+def stage_muxing(podcast):
+    """Join the segment audio into the final podcast mp3, reusing an identical earlier join."""
+    segments = list(podcast.segments.select_related('blob'))
+    key = audio_store.podcast_key([
+        segment.blob.key if segment.blob else segment.audio_file.name for segment in segments
+    ])
+
+    blob = audio_store.find([key]).get(key)
+    if blob is None:
+        paths = [segment.audio_file.path for segment in segments]
+        relative_path = audio_store.write_blob(key, lambda tmp_path: join_audio(paths, tmp_path))
+        blob = audio_store.register(key, relative_path, kind='podcast')
+
+    if podcast.audio_blob_id != blob.pk:
+        audio_store.acquire(blob)
+        release_audio(podcast)
+
+    podcast.audio_blob = blob
+    podcast.audio_file = blob.path
+    podcast.is_audio_generated = True
+    podcast.save(update_fields=['audio_blob', 'audio_file', 'is_audio_generated', 'updated_at'])
+
+
+STAGES = [
+    ('script', stage_script),
+    ('segmenting', stage_segmenting),
+    ('synthesizing', stage_synthesizing),
+    ('muxing', stage_muxing),
+]
+
+STAGE_NAMES = [name for name, stage in STAGES]
+
+
+def set_status(podcast, status, **fields):
+    """Save a status change and tell the owner's open tabs about it."""
+    podcast.generation_status = status
+    for name, value in fields.items():
+        setattr(podcast, name, value)
+    podcast.save(update_fields=['generation_status', 'updated_at', *fields])
+    publish(podcast.user_id, 'podcast.progress', id=podcast.pk, stage=status)
+
+
+def queue_generation(podcast, restart=False, from_stage=None):
+    """
+    Mark a podcast as queued for generation.
+
+    A failed run resumes from the stage that failed unless ``restart`` is set;
+    anything else starts again from the script, or from ``from_stage`` when
+    given (e.g. ``'segmenting'`` after the user edits the script).
+
+    Returns:
+        bool: False if a run for this podcast is already queued or in progress
+    """
+    if from_stage:
+        resume_stage = from_stage
+    elif podcast.generation_status == 'failed' and podcast.resume_stage and not restart:
+        resume_stage = podcast.resume_stage
+    else:
+        resume_stage = STAGE_NAMES[0]
+
+    queued = Podcast.objects.filter(pk=podcast.pk).exclude(
+        generation_status__in=Podcast.ACTIVE_STATUSES
+    ).update(
+        generation_status='queued', resume_stage=resume_stage, generation_error='',
+        # update() skips auto_now, and resume_podcasts reads an old updated_at as a stalled run
+        updated_at=timezone.now(),
+    )
+    if not queued:
+        return False
+
+    podcast.refresh_from_db()
+    publish(podcast.user_id, 'podcast.progress', id=podcast.pk, stage='queued')
+    return True
+
+
+def run_pipeline(podcast_id):
+    """
+    Run a queued podcast through its remaining stages.
+
+    Returns:
+        bool: True if the podcast finished, False if a stage failed
+
+    Raises:
+        leases.LeaseLost: If another run took the podcast over; that run owns its status now
+    """
+    podcast = Podcast.objects.get(pk=podcast_id)
+    start = STAGE_NAMES.index(podcast.resume_stage or STAGE_NAMES[0])
+
+    for index, (name, stage) in enumerate(STAGES[start:], start=start):
+        try:
+            keep_lease(podcast)
+            set_status(podcast, name)
+            stage(podcast)
+            # Only record progress (and at the end, success) while still the owner
+            keep_lease(podcast)
+        except leases.LeaseLost:
+            logger.warning('Podcast %s: lease lost during %s, stopping', podcast.pk, name)
+            raise
+        except Exception as e:
+            if ai_budget.budget_error(e):
+                # Not a failure: the task queue runs this stage again once the budget refills
+                set_status(podcast, 'queued')
+                raise
+            logger.exception('Podcast %s failed during %s', podcast.pk, name)
+            set_status(podcast, 'failed', generation_error=f'Error during {name}: {str(e)}')
+            return False
+        next_stage = STAGE_NAMES[index + 1] if index + 1 < len(STAGES) else ''
+        Podcast.objects.filter(pk=podcast.pk).update(resume_stage=next_stage)
+        podcast.resume_stage = next_stage
+
+    set_status(podcast, 'done')
+    return True
@@ -0,0 +1,137 @@
+"""
+Progressive playback of podcasts while their segments are still being synthesized.
+
+Segments are synthesized concurrently and finish out of order, but they play
+in order, so what can be played at any moment is the longest run of finished
+segments from the start. That run is served two ways:
+
+* an HLS playlist (``#EXT-X-PLAYLIST-TYPE:EVENT``) that only ever grows,
+  ending with ``#EXT-X-ENDLIST`` once every segment is done, for players
+  with native HLS support;
+* a JSON index of every segment (its position, whether it is ready, its
+  start time and duration, and where its text starts in the script) that
+  the podcast page uses both to play segments back to back in other
+  browsers and to jump from a section of the script straight to its audio.
+
+Segment audio URLs carry a version (from the blob key), so a URL always
+names the same audio even after the script is edited and the segments are
+rebuilt. The segment view checks the version and, when it matches, lets
+browsers cache the audio for good.
+"""
+import math
+import os
+
+from . import audio_store
+
+# Stages that rebuild the segment rows; until they finish the segments belong to the old script
+REBUILD_STAGES = ('script', 'segmenting')
+
+
+def segments_current(podcast):
+    """Whether a podcast's segment rows match its script (and so may be played)."""
+    return not (podcast.is_generating() and podcast.resume_stage in REBUILD_STAGES)
+
+
+def segment_duration(segment):
+    """Length of a segment's audio in seconds, or None if it has none yet."""
+    if segment.blob:
+        return audio_store.blob_duration(segment.blob)
+    if segment.audio_file:
+        # Audio from before the audio store
+        return audio_store.mp3_duration(segment.audio_file.path)
+    return None
+
+
+def segment_version(segment):
+    """Version of a segment's audio for its URL: part of the blob key, or the file name."""
+    if segment.blob:
+        return segment.blob.key[:16]
+    return os.path.basename(segment.audio_file.name or '')
+
+
+def segment_index(podcast):
+    """
+    Describe every segment of a podcast for playback and seeking.
+
+    Start times are known for the playable run of segments from the start;
+    later segments have a start of None even when they are ready.
+
+    Returns:
+        list: One dict per segment with ``position``, ``script_offset``,
+        ``script_end``, ``ready``, ``start``, ``duration`` and ``version``
+    """
+    if not segments_current(podcast):
+        return []
+
+    segments = list(podcast.segments.select_related('blob'))
+    index = []
+    start = 0.0
+    for number, segment in enumerate(segments):
+        duration = segment_duration(segment)
+        ready = duration is not None
+        in_order = ready and start is not None
+        index.append({
+            'position': segment.position,
+            'script_offset': segment.script_offset,
+            'script_end': segments[number + 1].script_offset if number + 1 < len(segments) else len(podcast.script),
+            'ready': ready,
+            'start': round(start, 3) if in_order else None,
+            'duration': round(duration, 3) if ready else None,
+            'version': segment_version(segment),
+        })
+        start = start + duration if in_order else None
+    return index
+
+
+def playable(index):
+    """The segments that can be played in order from the start."""
+    return [entry for entry in index if entry['start'] is not None]
+
+
+def is_complete(index):
+    """Whether every segment has audio, so the playlist will not grow again."""
+    return bool(index) and all(entry['ready'] for entry in index)
+
+
+def render_playlist(index, segment_url):
+    """
+    Write the HLS media playlist for the playable segments.
+
+    Args:
+        index: Segment index from :func:`segment_index`
+        segment_url: Called with an index entry, returns the URL of its audio
+
+    Returns:
+        str: The playlist (``application/vnd.apple.mpegurl``)
+    """
+    entries = playable(index)
+    target = max([math.ceil(entry['duration']) for entry in entries] or [1])
+    lines = [
+        '#EXTM3U',
+        '#EXT-X-VERSION:3',
+        f'#EXT-X-TARGETDURATION:{target}',
+        '#EXT-X-MEDIA-SEQUENCE:0',
+        '#EXT-X-PLAYLIST-TYPE:EVENT',
+    ]
+    for entry in entries:
+        lines.append(f"#EXTINF:{entry['duration']:.3f},")
+        lines.append(segment_url(entry))
+    if is_complete(index):
+        lines.append('#EXT-X-ENDLIST')
+    return '\n'.join(lines) + '\n'
+
+
+def script_sections(script, index):
+    """
+    Split a script into the parts read in each segment.
+
+    Text before the first segment (a title line, say) goes with the first.
+
+    Returns:
+        list: ``(index entry, text)`` pairs in script order
+    """
+    sections = []
+    for number, entry in enumerate(index):
+        start = 0 if number == 0 else entry['script_offset']
+        sections.append((entry, script[start:entry['script_end']]))
+    return sections
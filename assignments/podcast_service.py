@@ -1,15 +1,98 @@
 """
 Service for generating AI podcasts using OpenAI.
 """
-import os
-from openai import OpenAI
+import re
+from . import ai_gateway
+from .ai_budget import estimate_tokens
+from .ai_gateway import get_client
+from .llm_cache import cached_completion, cached_completions
 
-# Initialize client with API key from environment
-api_key = os.getenv('OPENAI_API_KEY')
-client = OpenAI(api_key=api_key) if api_key else None
 
+# Notes up to this many estimated tokens go into the script prompt as they are
+NOTES_TOKEN_BUDGET = 2000
+# Size of each piece summarized in the map step
+CHUNK_TOKENS = 1500
+SUMMARY_MAX_TOKENS = 300
+SUMMARY_CONCURRENCY = 4
 
-def generate_podcast_script(topic, notes_text, tone='educational', length='medium', description=''):
+
+def chunk_text(text, max_tokens=CHUNK_TOKENS):
+    """
+    Split text into chunks of at most ``max_tokens`` estimated tokens.
+    
+    Paragraphs are packed together where they fit; longer paragraphs are
+    split at sentence boundaries.
+    """
+    return pack_paragraphs(text, max_chars=max_tokens * 4)
+
+
+def summarize_chunks(chunks, topic, instruction, max_tokens=SUMMARY_MAX_TOKENS):
+    """
+    Summarize each chunk with the LLM, in parallel, in up to ``max_tokens`` each.
+    
+    Summaries are cached by the chunk text, so re-running on the same or
+    overlapping notes only pays for chunks not seen before.
+    """
+    return cached_completions(
+        get_client(),
+        model="gpt-3.5-turbo",
+        message_lists=[
+            [
+                {"role": "system", "content": "You condense study material into accurate, dense notes."},
+                {"role": "user", "content": f"Topic: {topic}\n\n{instruction}\n\n{chunk}"}
+            ]
+            for chunk in chunks
+        ],
+        temperature=0,
+        max_tokens=max_tokens,
+        max_workers=SUMMARY_CONCURRENCY
+    )
+
+
+def condense_notes(notes_text, topic, budget=NOTES_TOKEN_BUDGET):
+    """
+    Fit notes of any length into ``budget`` tokens with map-reduce summarization.
+    
+    The notes are split into chunks that are summarized independently (map);
+    the summaries are then grouped and summarized again until they fit
+    (reduce), and the result is turned into an outline for the script prompt.
+    Short notes are returned unchanged.
+    
+    Args:
+        notes_text: The notes to condense
+        topic: Topic of the notes, given to the model as context
+        budget: Largest acceptable result in estimated tokens
+    
+    Returns:
+        str: The notes, or an outline of them
+    """
+    if estimate_tokens(notes_text) <= budget:
+        return notes_text
+    
+    summaries = summarize_chunks(
+        chunk_text(notes_text),
+        topic,
+        "Summarize this excerpt of a student's notes. Keep every key fact, definition and example:"
+    )
+    # Each round shrinks the text several times over, so this ends quickly
+    while estimate_tokens('\n\n'.join(summaries)) > budget and len(summaries) > 1:
+        summaries = summarize_chunks(
+            chunk_text('\n\n'.join(summaries)),
+            topic,
+            "Merge these summaries of consecutive parts of a student's notes into one summary:"
+        )
+    
+    outline = summarize_chunks(
+        ['\n\n'.join(summaries)],
+        topic,
+        "Turn these summaries of a student's notes into a structured outline, in order, for a podcast episode:",
+        # The outline may use the whole budget, not just one summary's worth
+        max_tokens=budget
+    )[0]
+    return outline
+
+
+def generate_podcast_script(topic, notes_text, tone='educational', length='medium', description='', use_cache=True):
     """
     Generate a podcast script from notes using OpenAI's GPT.
     
@@ -19,11 +102,13 @@ def generate_podcast_script(topic, notes_text, tone='educational', length='mediu
         tone: Tone of the podcast ('casual', 'professional', 'educational', 'motivational')
         length: Target length ('short', 'medium', 'long')
         description: Additional context
+        use_cache: Set False to skip the LLM cache and write a fresh script
     
     Returns:
         str: Generated podcast script
     """
     
+    client = get_client()
     if not client:
         raise Exception("OpenAI API key not configured. Please set OPENAI_API_KEY in .env file.")
     
@@ -36,11 +121,11 @@ def generate_podcast_script(topic, notes_text, tone='educational', length='mediu
     
     length_guidance = length_map.get(length, '10-20 minutes')
     
-    # Truncate notes_text if it's too long (to avoid context length issues)
-    # Estimate: ~4 tokens per word, aim for ~8000 tokens max for input
-    max_notes_length = 2000  # roughly 8000 tokens
-    if len(notes_text) > max_notes_length:
-        notes_text = notes_text[:max_notes_length] + "\n\n[Note: Content truncated due to length]"
+    # Long notes are condensed into an outline rather than cut off
+    try:
+        notes_text = condense_notes(notes_text, topic)
+    except Exception as e:
+        raise Exception(f"Error summarizing notes: {str(e)}")
     
     # Create the prompt
     prompt = f"""You are an expert podcast script writer. Create an engaging and informative podcast script based on the following information.
@@ -72,25 +157,127 @@ Format the script as:
 Generate the podcast script now:"""
     
     try:
-        response = client.chat.completions.create(
+        return cached_completion(
+            client,
             model="gpt-3.5-turbo",
             messages=[
                 {"role": "system", "content": "You are a professional podcast script writer."},
                 {"role": "user", "content": prompt}
             ],
             temperature=0.7,
-            max_tokens=1500  # Reduced from 2000 to be safer
+            max_tokens=1500,  # Reduced from 2000 to be safer
+            use_cache=use_cache
         )
-        
-        return response.choices[0].message.content
     except Exception as e:
         raise Exception(f"Error generating podcast script: {str(e)}")
 
 
+# OpenAI's text-to-speech endpoint rejects inputs longer than 4096 characters
+TTS_MAX_CHARS = 4000
+
+TTS_MODEL = "tts-1-hd"
+TTS_VOICE = "nova"
+# A full-length segment can take well over the default API timeout to synthesize
+TTS_TIMEOUT_SECONDS = 120
+
+# Stage directions the script prompt asks for, e.g. [PAUSE] or [INTRO MUSIC]
+MARKER_RE = re.compile(r'\[[A-Z][A-Z0-9 _/-]*\]')
+SENTENCE_RE = re.compile(r'(?<=[.!?])\s+')
+
+
+def split_sentences(text, max_chars):
+    """Split text into sentences, cutting any sentence longer than ``max_chars`` at a space."""
+    pieces = []
+    for sentence in SENTENCE_RE.split(text):
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(' ', 0, max_chars)
+            if cut <= 0:
+                cut = max_chars
+            pieces.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+        if sentence:
+            pieces.append(sentence)
+    return pieces
+
+
+def pack_paragraphs(text, max_chars):
+    """
+    Pack paragraphs into pieces of at most ``max_chars`` characters.
+    
+    Paragraphs are kept whole where possible; a paragraph longer than
+    ``max_chars`` is split at sentence boundaries.
+    """
+    pieces = []
+    current = ''
+    for paragraph in re.split(r'\n\s*\n', text.strip()):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        sentences = split_sentences(paragraph, max_chars) if len(paragraph) > max_chars else [paragraph]
+        for index, sentence in enumerate(sentences):
+            # Sentences of one paragraph join with a space, paragraphs with a blank line
+            separator = ' ' if index else '\n\n'
+            if current and len(current) + len(separator) + len(sentence) > max_chars:
+                pieces.append(current)
+                current = ''
+            current = f'{current}{separator}{sentence}' if current else sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_script(script, max_chars=TTS_MAX_CHARS):
+    """
+    Split a podcast script into segments short enough for one TTS call.
+    
+    Stage markers such as ``[PAUSE]`` or ``[OUTRO MUSIC]`` are removed so they
+    are not read aloud, and always end a segment. Between markers, paragraphs
+    are packed together up to ``max_chars``; a longer paragraph is split at
+    sentence boundaries.
+    
+    Args:
+        script: The podcast script text
+        max_chars: Longest allowed segment
+    
+    Returns:
+        list: Segment strings in script order
+    """
+    segments = []
+    for section in MARKER_RE.split(script):
+        segments.extend(pack_paragraphs(section, max_chars))
+    return segments
+
+
+def script_offsets(script, segments):
+    """
+    Find where each segment from ``split_script`` starts in the script.
+
+    A segment's first sentence is copied verbatim from the script, so it is
+    searched for after the previous segment's start; a segment that cannot
+    be found is placed where the previous one ended.
+
+    Returns:
+        list: Character offset of each segment in ``script``
+    """
+    offsets = []
+    cursor = 0
+    for text in segments:
+        head = SENTENCE_RE.split(text.split('\n\n', 1)[0], 1)[0]
+        offset = script.find(head, cursor) if head else -1
+        if offset == -1:
+            offset = cursor
+        offsets.append(offset)
+        cursor = offset + len(head)
+    return offsets
+
+
 def generate_podcast_audio(script, filename):
     """
     Generate audio from a podcast script using OpenAI's Text-to-Speech.
     
+    The endpoint accepts at most ``TTS_MAX_CHARS`` characters per call; use
+    ``split_script`` and synthesize the segments separately for longer text.
+    
     Args:
         script: The podcast script text
         filename: Output filename for the audio file
@@ -99,14 +286,22 @@ def generate_podcast_audio(script, filename):
         str: Path to the generated audio file
     """
     
+    client = get_client()
+    if not client:
+        raise Exception("OpenAI API key not configured. Please set OPENAI_API_KEY in .env file.")
+    
     try:
         # Use OpenAI's text-to-speech API
         speech_file_path = filename
         
-        response = client.audio.speech.create(
-            model="tts-1-hd",
-            voice="nova",
-            input=script
+        # The podcast pipeline retries whole segments, so make one attempt here
+        response = ai_gateway.call(
+            client.audio.speech.create,
+            model=TTS_MODEL,
+            voice=TTS_VOICE,
+            input=script,
+            timeout=TTS_TIMEOUT_SECONDS,
+            attempts=1
         )
         
         response.stream_to_file(speech_file_path)
@@ -115,18 +310,21 @@ def generate_podcast_audio(script, filename):
         raise Exception(f"Error generating audio: {str(e)}")
 
 
-def generate_study_notes(topic, detail_level='intermediate'):
+def generate_study_notes(topic, detail_level='intermediate', source_text='', use_cache=True):
     """
     Generate comprehensive study notes on a topic using OpenAI's GPT.
     
     Args:
         topic: The topic to generate notes about
         detail_level: Level of detail ('basic', 'intermediate', 'advanced')
+        source_text: The student's own material to base the notes on (condensed if long)
+        use_cache: Set False to skip the LLM cache and write fresh notes
     
     Returns:
         str: Generated study notes
     """
     
+    client = get_client()
     if not client:
         raise Exception("OpenAI API key not configured. Please set OPENAI_API_KEY in .env file.")
     
@@ -139,11 +337,18 @@ def generate_study_notes(topic, detail_level='intermediate'):
     
     detail_guidance = detail_map.get(detail_level, detail_map['intermediate'])
     
+    source_section = ''
+    if source_text.strip():
+        source_section = f"""
+Base the notes on this material from the student's own documents, filling gaps where needed:
+{condense_notes(source_text, topic)}
+"""
+    
     prompt = f"""You are an expert educator. Generate comprehensive study notes on the following topic that would be helpful for a student to understand and learn.
 
 Topic: {topic}
 Detail Level: {detail_level}
-
+{source_section}
 Please create study notes that provide {detail_guidance}.
 
 Structure your notes with:
@@ -161,16 +366,16 @@ Make them easy to read and understand.
 Generate comprehensive study notes now:"""
     
     try:
-        response = client.chat.completions.create(
+        return cached_completion(
+            client,
             model="gpt-3.5-turbo",
             messages=[
                 {"role": "system", "content": "You are an expert educator who creates clear, comprehensive study notes."},
                 {"role": "user", "content": prompt}
             ],
             temperature=0.7,
-            max_tokens=2000
+            max_tokens=2000,
+            use_cache=use_cache
         )
-        
-        return response.choices[0].message.content
     except Exception as e:
         raise Exception(f"Error generating study notes: {str(e)}")
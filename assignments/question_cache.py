@@ -0,0 +1,150 @@
+"""
+Near-duplicate question cache for the chatbot.
+
+Students ask the same things in different words ("how do I manage my time
+for finals" / "how should I manage my time for finals?"), which exact-match
+caching misses. Every answered opening question gets a MinHash signature
+over its words and word pairs (stopwords removed), split into LSH bands. A
+new question is compared only with earlier questions that share a band, and
+when the estimated Jaccard similarity reaches ``QUESTION_CACHE_THRESHOLD``
+the earlier answer is served at once.
+
+Answers are only shared within a scope: a hash of the context the answer was
+written for (the student's courses and any excerpts from their own notes),
+so an answer drawing on one student's notes never reaches anyone else.
+Signatures older than ``QUESTION_CACHE_TTL`` are ignored and pruned.
+"""
+import hashlib
+import logging
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import QuestionBand, QuestionSignature
+from .retrieval import features
+
+logger = logging.getLogger(__name__)
+
+CACHE_ENABLED = getattr(settings, 'QUESTION_CACHE_ENABLED', True)
+THRESHOLD = getattr(settings, 'QUESTION_CACHE_THRESHOLD', 0.7)
+CACHE_TTL = getattr(settings, 'QUESTION_CACHE_TTL', timedelta(days=30))
+
+# 16 bands of 4 rows: questions with similarity 0.7 share a band ~99% of the time
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+
+# Most earlier questions compared per lookup
+CANDIDATE_LIMIT = 50
+
+# Prune old signatures after every this many new ones
+PRUNE_EVERY = 100
+
+PRIME = 4294967291  # largest prime below 2**32
+_rng = np.random.default_rng(20240917)
+_A = _rng.integers(1, 2 ** 31, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, 2 ** 31, size=NUM_PERM, dtype=np.uint64)
+
+_remembered = 0
+
+
+def scope_key(context):
+    """Hash the context an answer was written for into a cache scope."""
+    return hashlib.sha256(context.encode()).hexdigest()
+
+
+def signature(text):
+    """
+    MinHash signature of a question's feature set.
+
+    Returns:
+        numpy.ndarray: ``NUM_PERM`` uint32 values, or None for text with no features
+    """
+    shingles = set(features(text))
+    if not shingles:
+        return None
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=4).digest(), 'little') for shingle in shingles],
+        dtype=np.uint64,
+    )
+    # One universal hash per permutation; a, b < 2**31 and x < 2**32 keep a*x + b inside uint64
+    permuted = (hashes[:, None] * _A + _B) % PRIME
+    return permuted.min(axis=0).astype(np.uint32)
+
+
+def band_keys(values):
+    """One 63-bit key per LSH band of a signature."""
+    keys = []
+    for band in range(BANDS):
+        rows = values[band * ROWS:(band + 1) * ROWS].tobytes()
+        digest = hashlib.blake2b(bytes([band]) + rows, digest_size=8).digest()
+        keys.append(int.from_bytes(digest, 'little') >> 1)
+    return keys
+
+
+def similarity(first, second):
+    """Estimated Jaccard similarity of two signatures."""
+    return float(np.mean(first == second))
+
+
+def find_similar(question, scope, threshold=THRESHOLD):
+    """
+    Find an answered question in ``scope`` that is a near-duplicate of ``question``.
+
+    Returns:
+        tuple: ``(ChatMessage, similarity)`` for the closest match, or None
+    """
+    if not CACHE_ENABLED:
+        return None
+    values = signature(question)
+    if values is None:
+        return None
+
+    candidates = QuestionSignature.objects.filter(
+        pk__in=QuestionBand.objects.filter(scope=scope, key__in=band_keys(values)).values('signature_id'),
+        created_at__gte=timezone.now() - CACHE_TTL,
+    ).select_related('message').order_by('-created_at')[:CANDIDATE_LIMIT]
+
+    best = None
+    for candidate in candidates:
+        score = similarity(values, np.frombuffer(bytes(candidate.signature), dtype=np.uint32))
+        if score >= threshold and (best is None or score > best[1]):
+            best = (candidate.message, score)
+    if best:
+        logger.info('Reusing answer to chat message %s (similarity %.2f)', best[0].pk, best[1])
+    return best
+
+
+def remember(message, scope):
+    """Index an answered question so later near-duplicates in ``scope`` can reuse it."""
+    global _remembered
+    if not CACHE_ENABLED:
+        return
+    values = signature(message.question)
+    if values is None:
+        return
+
+    with transaction.atomic():
+        entry = QuestionSignature.objects.create(message=message, scope=scope, signature=values.tobytes())
+        QuestionBand.objects.bulk_create([
+            QuestionBand(signature=entry, scope=scope, key=key) for key in band_keys(values)
+        ])
+
+    _remembered += 1
+    if _remembered % PRUNE_EVERY == 0:
+        prune()
+
+
+def prune(ttl=None):
+    """
+    Delete signatures older than the TTL (their bands go with them).
+
+    Returns:
+        int: Number of signatures deleted
+    """
+    ttl = CACHE_TTL if ttl is None else ttl
+    _, deleted = QuestionSignature.objects.filter(created_at__lt=timezone.now() - ttl).delete()
+    return deleted.get(QuestionSignature._meta.label, 0)
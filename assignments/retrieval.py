@@ -0,0 +1,242 @@
+"""
+Local retrieval index over each user's own material.
+
+Study notes, podcast notes and scripts, and assignment descriptions are
+split into chunks, and each chunk is stored as a ``RetrievalChunk`` with a
+hashed-feature vector: words and word pairs hashed into
+``RETRIEVAL_DIMENSIONS`` signed buckets, log-scaled and L2-normalized, kept
+as float32 bytes. Nothing leaves the server and no embedding service is
+needed.
+
+Chunks are rebuilt from signals whenever a source's text changes. Searches
+stack a user's vectors into one NumPy matrix, cached per process until the
+user's chunks change, and score every chunk with a single matrix-vector
+product, so thousands of chunks are searched in a few milliseconds. Query
+terms are weighted by how rare they are in the user's chunks (IDF).
+
+Changing ``RETRIEVAL_DIMENSIONS`` needs ``manage.py rebuild_retrieval_index``.
+"""
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max
+
+from .models import Assignment, Podcast, RetrievalChunk, StudyNotes
+from .podcast_service import pack_paragraphs
+
+DIMENSIONS = getattr(settings, 'RETRIEVAL_DIMENSIONS', 1024)
+CHUNK_CHARS = getattr(settings, 'RETRIEVAL_CHUNK_CHARS', 800)
+TOP_K = getattr(settings, 'RETRIEVAL_TOP_K', 4)
+MIN_SCORE = getattr(settings, 'RETRIEVAL_MIN_SCORE', 0.1)
+
+# Users whose matrices are kept in memory per process
+CACHED_USERS = getattr(settings, 'RETRIEVAL_CACHED_USERS', 200)
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+STOPWORDS = frozenset('''
+a an and are as at be but by can do does for from has have how i if in into is it its
+me my of on or so than that the their then there these this to was we what when where
+which who why will with you your
+'''.split())
+
+# Each entry: model, title field, text field
+SOURCES = {
+    'study_notes': (StudyNotes, 'topic', 'content'),
+    'podcast_notes': (Podcast, 'title', 'notes_text'),
+    'podcast_script': (Podcast, 'title', 'script'),
+    'assignment': (Assignment, 'title', 'description'),
+}
+
+
+def features(text):
+    """Words (minus stopwords) and adjacent word pairs of ``text``."""
+    words = [word for word in TOKEN_RE.findall(text.lower()) if word not in STOPWORDS]
+    return words + [f'{first} {second}' for first, second in zip(words, words[1:])]
+
+
+@lru_cache(maxsize=65536)
+def bucket(feature):
+    """Stable (index, sign) for a feature; Python's hash() changes between processes."""
+    value = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), 'little')
+    return value % DIMENSIONS, 1.0 if value >> 63 else -1.0
+
+
+def vectorize(text):
+    """
+    Turn text into an L2-normalized float32 hashed-feature vector.
+
+    Returns:
+        numpy.ndarray: Vector of ``DIMENSIONS`` values (all zero for text with no features)
+    """
+    vector = np.zeros(DIMENSIONS, dtype=np.float32)
+    for feature in features(text):
+        index, sign = bucket(feature)
+        vector[index] += sign
+    # Sublinear term frequency, so one repeated word does not dominate
+    vector = np.sign(vector) * np.log1p(np.abs(vector))
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def source_hash(title, text):
+    return hashlib.sha256(f'{title}\n{text}'.encode()).hexdigest()
+
+
+def index_source(user_id, source_type, source_id, title, text):
+    """
+    Replace the chunks of one source, unless its text is unchanged.
+
+    Returns:
+        bool: Whether the chunks were rebuilt
+    """
+    digest = source_hash(title, text)
+    existing = RetrievalChunk.objects.filter(source_type=source_type, source_id=source_id)
+    if existing.values_list('source_hash', flat=True).first() == digest:
+        return False
+
+    chunks = [
+        RetrievalChunk(
+            user_id=user_id,
+            source_type=source_type,
+            source_id=source_id,
+            position=position,
+            title=title[:300],
+            text=chunk,
+            source_hash=digest,
+            vector=vectorize(f'{title}\n{chunk}').tobytes(),
+        )
+        for position, chunk in enumerate(pack_paragraphs(text or '', CHUNK_CHARS))
+    ]
+    with transaction.atomic():
+        existing.delete()
+        RetrievalChunk.objects.bulk_create(chunks)
+    return True
+
+
+def source_types(instance):
+    """Source types stored for a model instance."""
+    return [name for name, (model, _, _) in SOURCES.items() if isinstance(instance, model)]
+
+
+def index_object(instance, update_fields=None):
+    """
+    Re-index every source on a saved instance whose fields may have changed.
+
+    Saves limited by ``update_fields`` to other fields (status updates and
+    the like) are skipped without a query.
+    """
+    for source_type in source_types(instance):
+        _, title_field, text_field = SOURCES[source_type]
+        if update_fields is not None and not {title_field, text_field} & set(update_fields):
+            continue
+        index_source(
+            instance.user_id, source_type, instance.pk,
+            getattr(instance, title_field) or '', getattr(instance, text_field) or '',
+        )
+
+
+def remove_object(instance):
+    """Delete the chunks of a deleted instance."""
+    RetrievalChunk.objects.filter(source_type__in=source_types(instance), source_id=instance.pk).delete()
+
+
+def rebuild(user=None):
+    """
+    Index every source, e.g. after changing ``RETRIEVAL_DIMENSIONS``.
+
+    Returns:
+        int: Number of sources whose chunks were rebuilt
+    """
+    chunks = RetrievalChunk.objects.all()
+    if user is not None:
+        chunks = chunks.filter(user=user)
+    # Drop the stored hashes so every source is re-vectorized
+    chunks.update(source_hash='')
+
+    rebuilt = 0
+    for source_type, (model, title_field, text_field) in SOURCES.items():
+        objects = model.objects.all() if user is None else model.objects.filter(user=user)
+        for instance in objects.iterator():
+            rebuilt += index_source(
+                instance.user_id, source_type, instance.pk,
+                getattr(instance, title_field) or '', getattr(instance, text_field) or '',
+            )
+    return rebuilt
+
+
+_matrices = OrderedDict()
+_matrices_lock = threading.Lock()
+
+
+def user_matrix(user_id):
+    """
+    Return ``(chunk ids, matrix, idf)`` for a user's chunks.
+
+    The matrix is built once and reused until the user's chunks change,
+    which one aggregate query detects.
+    """
+    stamp = RetrievalChunk.objects.filter(user_id=user_id).aggregate(count=Count('pk'), latest=Max('pk'))
+    stamp = (stamp['count'], stamp['latest'])
+    with _matrices_lock:
+        cached = _matrices.get(user_id)
+        if cached and cached[0] == stamp:
+            _matrices.move_to_end(user_id)
+            return cached[1:]
+
+    rows = RetrievalChunk.objects.filter(user_id=user_id).values_list('pk', 'vector')
+    ids = []
+    vectors = []
+    for pk, vector in rows.iterator():
+        if len(vector) == DIMENSIONS * 4:
+            ids.append(pk)
+            vectors.append(bytes(vector))
+    ids = np.array(ids, dtype=np.int64)
+    matrix = np.frombuffer(b''.join(vectors), dtype=np.float32).reshape(len(ids), DIMENSIONS)
+    document_frequency = np.count_nonzero(matrix, axis=0)
+    idf = (np.log((len(ids) + 1) / (document_frequency + 1)) + 1).astype(np.float32)
+
+    with _matrices_lock:
+        _matrices[user_id] = (stamp, ids, matrix, idf)
+        _matrices.move_to_end(user_id)
+        while len(_matrices) > CACHED_USERS:
+            _matrices.popitem(last=False)
+    return ids, matrix, idf
+
+
+def search(user_id, query, k=TOP_K, min_score=MIN_SCORE):
+    """
+    Find the chunks of a user's material most similar to ``query``.
+
+    Args:
+        user_id: Whose material to search
+        query: Question or search text
+        k: Most chunks to return
+        min_score: Lowest cosine similarity worth returning
+
+    Returns:
+        list: ``(RetrievalChunk, score)`` pairs, best first
+    """
+    ids, matrix, idf = user_matrix(user_id)
+    if not ids.size:
+        return []
+
+    query_vector = vectorize(query) * idf
+    norm = np.linalg.norm(query_vector)
+    if not norm:
+        return []
+    scores = matrix @ (query_vector / norm)
+
+    k = min(k, len(ids))
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    top = [index for index in top if scores[index] >= min_score]
+
+    chunks = RetrievalChunk.objects.in_bulk([int(ids[index]) for index in top])
+    return [(chunks[int(ids[index])], float(scores[index])) for index in top if int(ids[index]) in chunks]
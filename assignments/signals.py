@@ -0,0 +1,99 @@
+"""
+Signal handlers for the assignments app.
+"""
+from django.contrib.auth import get_user_model
+from django.core.signals import request_finished
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from . import ai_budget, audio_store, retrieval
+from .models import Assignment, Course, Event, Podcast, PodcastSegment, Reminder, StudyNotes
+from .notifications import publish
+from .sync import record_tombstone
+
+
+@receiver(post_save, sender=Reminder)
+def notify_reminder_saved(sender, instance, created, **kwargs):
+    """Push new and changed reminders to the owner's open tabs."""
+    publish(
+        instance.user_id,
+        'reminder.created' if created else 'reminder.updated',
+        id=instance.pk,
+        title=instance.title,
+        reminder_type=instance.reminder_type,
+        reminder_date=instance.reminder_date,
+        is_completed=instance.is_completed,
+        updated_at=instance.updated_at,
+    )
+
+
+@receiver(post_save, sender=Assignment)
+def notify_assignment_saved(sender, instance, created, **kwargs):
+    """Push new and changed assignments to the owner's open tabs."""
+    publish(
+        instance.user_id,
+        'assignment.created' if created else 'assignment.updated',
+        id=instance.pk,
+        title=instance.title,
+        due_date=instance.due_date,
+        status=instance.status,
+        updated_at=instance.updated_at,
+    )
+
+
+@receiver(post_delete, sender=Assignment)
+def notify_assignment_deleted(sender, instance, **kwargs):
+    """Tell the owner's open tabs an assignment is gone."""
+    publish(instance.user_id, 'assignment.deleted', id=instance.pk)
+
+
+@receiver(post_delete, sender=Reminder)
+def notify_reminder_deleted(sender, instance, **kwargs):
+    """Tell the owner's open tabs a reminder is gone."""
+    publish(instance.user_id, 'reminder.deleted', id=instance.pk)
+
+
+@receiver(post_delete, sender=Course)
+@receiver(post_delete, sender=Assignment)
+@receiver(post_delete, sender=Event)
+@receiver(post_delete, sender=Reminder)
+def record_sync_tombstone(sender, instance, origin=None, **kwargs):
+    """Keep a tombstone so offline clients learn about the deletion."""
+    user_model = get_user_model()
+    if isinstance(origin, user_model) or getattr(origin, 'model', None) is user_model:
+        # The whole account is going; there is no client left to tell
+        return
+    record_tombstone(instance)
+
+
+@receiver(post_delete, sender=PodcastSegment)
+def release_segment_audio(sender, instance, **kwargs):
+    """Drop a deleted segment's claim on its stored audio."""
+    audio_store.release(instance.blob_id)
+
+
+@receiver(post_delete, sender=Podcast)
+def release_podcast_audio(sender, instance, **kwargs):
+    """Drop a deleted podcast's claim on its joined audio."""
+    audio_store.release(instance.audio_blob_id)
+
+
+@receiver(post_save, sender=StudyNotes)
+@receiver(post_save, sender=Podcast)
+@receiver(post_save, sender=Assignment)
+def update_retrieval_index(sender, instance, update_fields=None, **kwargs):
+    """Re-index the user's material for the chatbot when its text changes."""
+    retrieval.index_object(instance, update_fields)
+
+
+@receiver(post_delete, sender=StudyNotes)
+@receiver(post_delete, sender=Podcast)
+@receiver(post_delete, sender=Assignment)
+def remove_from_retrieval_index(sender, instance, **kwargs):
+    """Drop a deleted source from the chatbot's retrieval index."""
+    retrieval.remove_object(instance)
+
+
+@receiver(request_finished)
+def save_ai_usage(sender, **kwargs):
+    """Write the AI usage ledger once enough calls have built up."""
+    ai_budget.flush_usage(due_only=True)
@@ -0,0 +1,326 @@
+"""
+Durable background task queue that uses the application database as its broker.
+
+Tasks are plain functions registered with the :func:`task` decorator and
+queued with ``some_task.enqueue(user=..., **payload)``. Workers started by the
+``run_workers`` management command claim rows from the ``Task`` table with
+leases (SELECT ... FOR UPDATE SKIP LOCKED where supported), retry failures
+with exponential backoff, and pick work in priority order and then in
+weighted fair-queuing order across users, so one user with a long queue
+cannot starve everyone else.
+
+Fair queuing uses start-time virtual clocks: each new task is stamped with
+``max(queue head, user's last stamp) + cost / weight``. A user's tasks
+therefore interleave with other users' instead of running as one block.
+
+``settings.TASK_BACKEND`` selects where tasks go: ``'database'`` (default),
+``'immediate'`` (run inline, for tests and development) or ``'celery'``
+(hand off to a configured Celery app under the same task names).
+
+AI calls made by a task are charged to its user's token budget (see
+ai_budget.py). A task stopped by an empty budget is put back to run when the
+budget has refilled, without using up one of its attempts.
+"""
+import logging
+import random
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from . import ai_budget, leases
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+# Registered tasks by name
+REGISTRY = {}
+
+# Backoff between retries: base * 2 ** (attempt - 1), capped, plus jitter
+RETRY_BASE_SECONDS = 10
+RETRY_MAX_SECONDS = 600
+
+DEFAULT_LEASE_SECONDS = 300
+
+
+class TaskFunction:
+    """A function registered as a background task."""
+
+    def __init__(self, fn, name, priority=0, max_attempts=3, cost=1.0, on_failure=None):
+        self.fn = fn
+        self.name = name
+        self.priority = priority
+        self.max_attempts = max_attempts
+        self.cost = cost
+        self.on_failure = on_failure
+        self.__doc__ = fn.__doc__
+
+    def __call__(self, **payload):
+        return self.fn(**payload)
+
+    def enqueue(self, user=None, priority=None, weight=1.0, delay=0, **payload):
+        """
+        Queue this task to run in the background.
+
+        Args:
+            user: User the work is for; tasks are shared fairly between users
+            priority: Overrides the task's default priority (higher runs first)
+            weight: User's share of the workers relative to other users
+            delay: Seconds to wait before the task may run
+            **payload: JSON-serializable keyword arguments for the task
+        """
+        return get_backend().enqueue(
+            self,
+            user=user,
+            priority=self.priority if priority is None else priority,
+            weight=weight,
+            delay=delay,
+            payload=payload,
+        )
+
+
+def task(name, priority=0, max_attempts=3, cost=1.0, on_failure=None):
+    """
+    Register a function as a background task.
+
+    Args:
+        name: Stable task name stored in the queue
+        priority: Default priority (higher runs first)
+        max_attempts: Runs before the task is marked failed
+        cost: Relative size of one run, used by fair queuing
+        on_failure: Called as ``on_failure(error, **payload)`` once retries are exhausted
+    """
+    def decorator(fn):
+        task_function = TaskFunction(fn, name, priority, max_attempts, cost, on_failure)
+        REGISTRY[name] = task_function
+        return task_function
+    return decorator
+
+
+class DatabaseBackend:
+    """Store tasks in the Task table for run_workers to pick up."""
+
+    def enqueue(self, task_function, user, priority, weight, delay, payload):
+        user_id = user.pk if user else None
+        pending = Task.objects.filter(status__in=['pending', 'running'])
+        head = pending.aggregate(head=Min('virtual_time'))['head'] or 0
+        last = pending.filter(user_id=user_id).aggregate(last=Max('virtual_time'))['last'] or 0
+        virtual_time = max(head, last) + task_function.cost / max(weight, 0.01)
+
+        return Task.objects.create(
+            name=task_function.name,
+            payload=payload,
+            user_id=user_id,
+            priority=priority,
+            virtual_time=virtual_time,
+            run_after=timezone.now() + timedelta(seconds=delay),
+            max_attempts=task_function.max_attempts,
+        )
+
+
+class ImmediateBackend:
+    """Run tasks inline as soon as they are queued."""
+
+    def enqueue(self, task_function, user, payload, **_scheduling):
+        with ai_budget.charged_to(user.pk if user else None, task_function.name):
+            return task_function(**payload)
+
+
+class CeleryBackend:
+    """Hand tasks to Celery, which must register the same task names."""
+
+    def enqueue(self, task_function, priority, delay, payload, **_fairness):
+        from celery import current_app
+        return current_app.send_task(
+            task_function.name,
+            kwargs=payload,
+            countdown=delay or None,
+            priority=priority,
+        )
+
+
+BACKENDS = {
+    'database': DatabaseBackend,
+    'immediate': ImmediateBackend,
+    'celery': CeleryBackend,
+}
+
+
+def get_backend():
+    """Return the backend selected by ``settings.TASK_BACKEND``."""
+    return BACKENDS[getattr(settings, 'TASK_BACKEND', 'database')]()
+
+
+def retry_delay(attempt):
+    """Seconds to wait before retry number ``attempt``, with jitter."""
+    delay = min(RETRY_BASE_SECONDS * 2 ** (attempt - 1), RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def claim_next(owner, lease_seconds=DEFAULT_LEASE_SECONDS):
+    """
+    Claim the next runnable task for ``owner``.
+
+    Pending tasks are runnable once ``run_after`` has passed; running tasks
+    become runnable again when their worker's lease expires.
+    """
+    ready = Task.objects.filter(status__in=['pending', 'running'], run_after__lte=timezone.now())
+    claimed = leases.claim(
+        ready, owner, lease_seconds, limit=1,
+        order_by=('-priority', 'virtual_time', 'id'),
+    )
+    if not claimed:
+        return None
+    claimed_task = claimed[0]
+    Task.objects.filter(pk=claimed_task.pk).update(status='running', attempts=claimed_task.attempts + 1)
+    claimed_task.status = 'running'
+    claimed_task.attempts += 1
+    return claimed_task
+
+
+def execute(claimed_task):
+    """Run a claimed task and record success, a scheduled retry or failure."""
+    task_function = REGISTRY.get(claimed_task.name)
+    try:
+        if task_function is None:
+            raise LookupError(f'Unknown task: {claimed_task.name}')
+        with ai_budget.charged_to(claimed_task.user_id, claimed_task.name):
+            task_function(**claimed_task.payload)
+    except Exception as e:
+        error = f'{type(e).__name__}: {str(e)}'
+        # None unless the task was stopped by an empty AI budget
+        budget_wait = getattr(ai_budget.budget_error(e), 'retry_after', None)
+        if task_function and budget_wait is not None:
+            logger.info('Task %s is over its AI budget, deferring %.0fs', claimed_task.pk, budget_wait)
+            leases.release(
+                claimed_task,
+                status='pending',
+                attempts=claimed_task.attempts - 1,
+                last_error=error,
+                run_after=timezone.now() + timedelta(seconds=budget_wait),
+            )
+            return False
+        if task_function and claimed_task.attempts < claimed_task.max_attempts:
+            logger.warning('Task %s failed (attempt %s), retrying: %s', claimed_task.pk, claimed_task.attempts, error)
+            leases.release(
+                claimed_task,
+                status='pending',
+                last_error=error,
+                run_after=timezone.now() + timedelta(seconds=retry_delay(claimed_task.attempts)),
+            )
+            return False
+        logger.exception('Task %s failed permanently', claimed_task.pk)
+        leases.release(claimed_task, status='failed', last_error=error, finished_at=timezone.now())
+        if task_function and task_function.on_failure:
+            task_function.on_failure(e, **claimed_task.payload)
+        return False
+
+    leases.release(claimed_task, status='succeeded', last_error='', finished_at=timezone.now())
+    return True
+
+
+class Worker:
+    """Loop that claims and runs tasks until told to stop."""
+
+    def __init__(self, owner=None, lease_seconds=DEFAULT_LEASE_SECONDS, poll_interval=1.0, stop_event=None):
+        self.owner = owner or leases.make_owner_id()
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.stop_event = stop_event or threading.Event()
+
+    def run_once(self):
+        """Claim and run one task. Returns False if the queue was empty."""
+        claimed_task = claim_next(self.owner, self.lease_seconds)
+        if claimed_task is None:
+            return False
+        execute(claimed_task)
+        ai_budget.flush_usage(due_only=True)
+        return True
+
+    def run(self, burst=False, manage_connections=False):
+        """
+        Run tasks until stopped.
+
+        Args:
+            burst: Return as soon as the queue is empty instead of polling
+            manage_connections: Recycle stale database connections between
+                tasks and close them on exit, as a dedicated worker thread must
+        """
+        try:
+            while not self.stop_event.is_set():
+                if manage_connections:
+                    close_old_connections()
+                if not self.run_once():
+                    if burst:
+                        return
+                    self.stop_event.wait(self.poll_interval)
+        finally:
+            if manage_connections:
+                ai_budget.flush_usage()
+                connections.close_all()
+
+    def heartbeat(self):
+        """Extend the leases on this worker's running tasks."""
+        Task.objects.filter(lease_owner=self.owner, status='running').update(
+            lease_expires_at=timezone.now() + timedelta(seconds=self.lease_seconds)
+        )
+
+
+def run_heartbeat(workers, stop_event, interval):
+    """Keep the leases of ``workers``' long-running tasks alive until ``stop_event`` is set."""
+    while not stop_event.wait(interval):
+        try:
+            for worker in workers:
+                worker.heartbeat()
+        except Exception:
+            logger.exception('Task lease heartbeat failed')
+    connections.close_all()
+
+
+def run_worker_threads(threads, lease_seconds=DEFAULT_LEASE_SECONDS, poll_interval=1.0, burst=False, stop_event=None):
+    """
+    Run ``threads`` workers in this process, each with its own lease owner id
+    so a thread only ever renews or releases its own claims.
+
+    Tasks are registered when Django loads the app (see apps.py).
+    """
+    stop_event = stop_event or threading.Event()
+    workers = [Worker(None, lease_seconds, poll_interval, stop_event) for _ in range(threads)]
+
+    heartbeat_stop = threading.Event()
+    heartbeat = threading.Thread(
+        target=run_heartbeat,
+        args=(workers, heartbeat_stop, lease_seconds / 3),
+        daemon=True,
+    )
+    heartbeat.start()
+
+    pool = [
+        threading.Thread(
+            target=worker.run, kwargs={'burst': burst, 'manage_connections': True}, name=f'task-worker-{index}'
+        )
+        for index, worker in enumerate(workers)
+    ]
+    for thread in pool:
+        thread.start()
+    try:
+        while any(thread.is_alive() for thread in pool):
+            for thread in pool:
+                thread.join(timeout=0.5)
+    finally:
+        stop_event.set()
+        heartbeat_stop.set()
+        for thread in pool:
+            thread.join()
+
+
+def run_worker_process(threads, lease_seconds, poll_interval, burst):
+    """Entry point for a worker process started by run_workers."""
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+    run_worker_threads(threads, lease_seconds, poll_interval, burst)
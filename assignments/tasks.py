@@ -0,0 +1,64 @@
+"""
+Background tasks run by the task queue (see task_queue.py).
+"""
+import logging
+
+from . import leases
+from .models import Podcast, StudyNotes
+from .podcast_pipeline import GENERATION_LEASE_SECONDS, queue_generation, run_pipeline
+from .podcast_service import generate_study_notes
+from .task_queue import task
+
+logger = logging.getLogger(__name__)
+
+
+@task('podcast.generate', cost=5.0)
+def generate_podcast_task(podcast_id):
+    """Run a podcast through the generation pipeline from its last checkpoint."""
+    podcast = Podcast.objects.get(pk=podcast_id)
+    if podcast.generation_status == 'done':
+        return
+    with leases.single_flight(podcast, GENERATION_LEASE_SECONDS) as acquired:
+        if not acquired:
+            # The run already in flight produces the audio for every request
+            logger.info('Podcast %s is already being generated', podcast.pk)
+            return
+        if podcast.generation_status == 'failed' and not queue_generation(podcast):
+            # Someone else already resumed it
+            return
+        try:
+            finished = run_pipeline(podcast.pk)
+        except leases.LeaseLost:
+            # Not a failure: the run that took over finishes the podcast
+            return
+        if not finished:
+            podcast.refresh_from_db()
+            # Raise so the queue retries later; the retry resumes at the failed stage
+            raise RuntimeError(podcast.generation_error)
+
+
+def study_notes_failed(error, study_notes_id):
+    """Show the final error on study notes whose generation gave up."""
+    StudyNotes.objects.filter(pk=study_notes_id).update(
+        generation_error=f'Error generating study notes: {str(error)}'
+    )
+
+
+@task('study_notes.generate', on_failure=study_notes_failed)
+def generate_study_notes_task(study_notes_id):
+    """Generate the content of a StudyNotes row with the LLM."""
+    study_note = StudyNotes.objects.get(pk=study_notes_id)
+    if study_note.is_generated:
+        return
+    with leases.single_flight(study_note, GENERATION_LEASE_SECONDS) as acquired:
+        if not acquired:
+            logger.info('Study notes %s are already being generated', study_note.pk)
+            return
+        study_note.content = generate_study_notes(
+            topic=study_note.topic,
+            detail_level=study_note.detail_level,
+            source_text=study_note.source_text
+        )
+        study_note.is_generated = True
+        study_note.generation_error = ''
+        study_note.save()
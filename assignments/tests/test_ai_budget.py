@@ -0,0 +1,214 @@
+"""
+Test cases for per-user and global AI token budgets and the usage ledger.
+"""
+import pytest
+from datetime import timedelta
+from unittest import mock
+from django.contrib.auth.models import User
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+from assignments import ai_budget, ai_gateway
+from assignments.ai_budget import BudgetExceeded, LocalStore, TokenBucket
+from assignments.models import AIUsage, LLMCacheEntry, QuestionSignature, Task
+from assignments.task_queue import claim_next, execute, task
+
+charged = []
+
+
+@task('tests.over_budget')
+def over_budget_task():
+    """Fail the way a service does when the budget is empty."""
+    try:
+        raise BudgetExceeded(30)
+    except BudgetExceeded as e:
+        raise Exception(f'Error generating study notes: {str(e)}')
+
+
+@task('tests.ask_model')
+def ask_model_task():
+    """Make one AI call."""
+    ai_gateway.call(completion(10, 20), model='gpt-test', messages=[{'role': 'user', 'content': 'Hi'}], max_tokens=50)
+
+
+def completion(prompt_tokens=None, completion_tokens=None):
+    """Build a client method stand-in that reports the given usage."""
+    def create(**kwargs):
+        charged.append(kwargs)
+        if prompt_tokens is None:
+            return object()
+        return mock.Mock(usage=mock.Mock(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens))
+    return create
+
+
+@pytest.mark.django_db
+class TestAIBudget:
+    """Test cases for token buckets, charging, deferral and the ledger."""
+
+    @pytest.fixture(autouse=True)
+    def small_budgets(self, monkeypatch):
+        """Give each user 1000 tokens refilled at one per second."""
+        monkeypatch.setattr(ai_budget, 'USER_BURST_TOKENS', 1000)
+        monkeypatch.setattr(ai_budget, 'USER_TOKENS_PER_MINUTE', 60)
+        monkeypatch.setattr(ai_budget, 'GLOBAL_BURST_TOKENS', 5000)
+        monkeypatch.setattr(ai_budget, 'GLOBAL_TOKENS_PER_MINUTE', 600)
+        AIUsage.objects.all().delete()
+        Task.objects.all().delete()
+        charged.clear()
+
+    @pytest.fixture
+    def user(self):
+        """Create a test user."""
+        return User.objects.create_user(username='testuser', password='testpass123')
+
+    def ask(self, user, max_tokens=500, **usage):
+        """Make one chat call through the gateway, charged to ``user``."""
+        with ai_budget.charged_to(user.pk, 'chat'):
+            return ai_gateway.call(
+                completion(**usage),
+                model='gpt-test',
+                messages=[{'role': 'user', 'content': 'x' * 396}],
+                max_tokens=max_tokens,
+            )
+
+    def test_bucket_refills_up_to_capacity(self):
+        """Test that a bucket refuses what it lacks and refills over time."""
+        now = [0.0]
+        bucket = TokenBucket('test', capacity=100, per_minute=600, store=LocalStore(), clock=lambda: now[0])
+
+        assert bucket.take(80) == 0
+        assert bucket.take(40) == pytest.approx(2.0)
+        now[0] += 2
+        assert bucket.take(40) == 0
+        now[0] += 60
+        assert bucket.take(100, spend=False) == 0
+        assert bucket.take(500) == 0  # larger than the bucket: charged its capacity
+
+    def test_unused_reservation_is_refunded(self, user):
+        """Test that a call is charged its reported usage, not its max_tokens."""
+        self.ask(user, prompt_tokens=100, completion_tokens=50)
+
+        assert ai_budget.retry_after(user.pk, 1000) == pytest.approx(150, abs=2)
+
+    def test_empty_budget_rejects_call(self, user):
+        """Test that a call over the user's budget never reaches the model."""
+        self.ask(user, max_tokens=800)
+
+        with pytest.raises(BudgetExceeded) as error:
+            self.ask(user, max_tokens=800)
+
+        assert len(charged) == 1
+        assert error.value.retry_after > 800
+        # The rejected call took nothing from the global bucket either
+        assert ai_budget.retry_after(None, 5000) == pytest.approx(90.4, abs=1)
+
+    def test_failed_call_is_refunded(self, user):
+        """Test that a call that raises gives back its reservation."""
+        def fail(**kwargs):
+            raise ValueError('bad request')
+
+        with ai_budget.charged_to(user.pk, 'chat'), pytest.raises(ValueError):
+            ai_gateway.call(fail, model='gpt-test', messages=[], max_tokens=900)
+
+        assert ai_budget.retry_after(user.pk, 1000) == 0
+
+    def test_usage_is_written_in_batches(self, user):
+        """Test that calls are summed in memory and written as one ledger row."""
+        self.ask(user, prompt_tokens=100, completion_tokens=50)
+        self.ask(user, prompt_tokens=10, completion_tokens=5)
+
+        assert ai_budget.flush_usage(due_only=True) == 0
+        assert not AIUsage.objects.exists()
+        assert ai_budget.flush_usage() == 1
+
+        self.ask(user, prompt_tokens=1, completion_tokens=1)
+        ai_budget.flush_usage()
+        usage = AIUsage.objects.get()
+        assert (usage.user, usage.feature, usage.model) == (user, 'chat', 'gpt-test')
+        assert (usage.requests, usage.prompt_tokens, usage.completion_tokens) == (3, 111, 56)
+        assert usage.day == timezone.localdate()
+
+    def test_task_calls_are_charged_to_its_user(self, user):
+        """Test that AI calls in a background task count against the task's user."""
+        ask_model_task.enqueue(user=user)
+
+        execute(claim_next('worker'))
+        ai_budget.flush_usage()
+
+        usage = AIUsage.objects.get()
+        assert (usage.user, usage.feature, usage.total_tokens) == (user, 'tests.ask_model', 30)
+
+    def test_over_budget_task_is_deferred(self, user):
+        """Test that a task stopped by the budget waits without using an attempt."""
+        over_budget_task.enqueue(user=user)
+
+        execute(claim_next('worker'))
+
+        queued = Task.objects.get()
+        assert queued.status == 'pending'
+        assert queued.attempts == 0
+        assert queued.run_after > timezone.now() + timedelta(seconds=20)
+
+
+@pytest.mark.django_db
+class TestAIBudgetViews:
+    """Test cases for turning away and delaying work over budget, and the admin report."""
+
+    @pytest.fixture(autouse=True)
+    def empty_caches(self):
+        """Start each test with empty answer caches."""
+        LLMCacheEntry.objects.all().delete()
+        QuestionSignature.objects.all().delete()
+        Task.objects.all().delete()
+
+    @pytest.fixture
+    def user(self):
+        """Create a test user who has used up their budget."""
+        user = User.objects.create_user(username='testuser', password='testpass123')
+        ai_budget.buckets(user.pk)[0].take(ai_budget.USER_BURST_TOKENS)
+        return user
+
+    @pytest.fixture
+    def client(self, user):
+        """Log the test user in."""
+        client = Client()
+        client.login(username='testuser', password='testpass123')
+        return client
+
+    def test_chatbot_rejects_over_budget(self, client):
+        """Test that a question over budget is turned away without a model call."""
+        openai = mock.Mock()
+
+        with mock.patch('assignments.views_chat.get_async_client', return_value=openai):
+            response = client.post(reverse('chatbot_ask'), {'question': 'How do I revise?'}, follow=True)
+
+        assert not openai.chat.completions.create.called
+        assert 'reached your AI usage limit' in response.content.decode()
+
+    def test_chatbot_stream_returns_429(self, client):
+        """Test that the stream endpoint says when to come back."""
+        response = client.post(reverse('chatbot_stream'), {'question': 'How do I revise?'})
+
+        assert response.status_code == 429
+        assert int(response['Retry-After']) > 0
+
+    def test_study_notes_are_queued_for_later(self, client, user):
+        """Test that study notes over budget are delayed rather than refused."""
+        response = client.post(reverse('study_notes_create'), {'topic': 'Photosynthesis', 'detail_level': 'basic'})
+
+        assert response.status_code == 302
+        queued = Task.objects.get(name='study_notes.generate', user=user)
+        assert queued.run_after > timezone.now() + timedelta(seconds=5)
+
+    def test_admin_usage_report(self, user):
+        """Test that admins see totals per user for the listed usage."""
+        User.objects.create_superuser(username='admin', password='testpass123')
+        ai_budget.record_usage(user.pk, 'chat', 'gpt-test', 120, 30)
+        client = Client()
+        client.login(username='admin', password='testpass123')
+
+        response = client.get(reverse('admin:assignments_aiusage_changelist'))
+
+        assert response.status_code == 200
+        assert response.context['usage_totals'] == {'requests': 1, 'prompt_tokens': 120, 'completion_tokens': 30}
+        assert list(response.context['usage_by_user'])[0]['total'] == 150
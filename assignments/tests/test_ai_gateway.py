@@ -0,0 +1,152 @@
+"""
+Test cases for the AI gateway against the local stub server.
+"""
+import asyncio
+import openai
+import pytest
+from assignments import ai_gateway
+from assignments.ai_gateway import CircuitBreaker, CircuitOpenError
+from assignments.ai_stub import start_in_thread
+
+
+class TestAIGateway:
+    """Test cases for pooled clients, retries, timeouts and the circuit breaker."""
+
+    @pytest.fixture(autouse=True)
+    def gateway(self, monkeypatch):
+        """Use a fresh breaker, no retry waits and new clients for each test."""
+        monkeypatch.setattr(ai_gateway, 'breaker', CircuitBreaker(threshold=2, reset_seconds=60))
+        monkeypatch.setattr(ai_gateway, 'RETRY_BASE_SECONDS', 0)
+        ai_gateway.reset_clients()
+        yield
+        ai_gateway.reset_clients()
+
+    def use_stub(self, monkeypatch, **options):
+        """Start a stub server and point the gateway at it."""
+        server = start_in_thread(**options)
+        monkeypatch.setenv('OPENAI_API_KEY', 'stub')
+        monkeypatch.setenv('OPENAI_BASE_URL', f'http://127.0.0.1:{server.server_address[1]}/v1')
+        return server
+
+    def ask(self, **kwargs):
+        """Make one chat completion through the gateway."""
+        client = ai_gateway.get_client()
+        response = ai_gateway.call(
+            client.chat.completions.create,
+            model='gpt-3.5-turbo',
+            messages=[{'role': 'user', 'content': 'What is osmosis?'}],
+            **kwargs
+        )
+        return response.choices[0].message.content
+
+    def test_client_is_shared(self, monkeypatch):
+        """Test that every caller gets the same pooled client."""
+        self.use_stub(monkeypatch)
+
+        assert ai_gateway.get_client() is ai_gateway.get_client()
+        assert self.ask() == 'Stub answer to: What is osmosis?'
+
+    def test_async_client_per_event_loop(self, monkeypatch):
+        """Test that each event loop gets its own async client, as async views under WSGI need."""
+        self.use_stub(monkeypatch)
+
+        async def run():
+            client = ai_gateway.get_async_client()
+            assert ai_gateway.get_async_client() is client
+            response = await ai_gateway.acall(
+                client.chat.completions.create,
+                model='gpt-3.5-turbo',
+                messages=[{'role': 'user', 'content': 'Hi'}],
+                attempts=1,
+            )
+            return client, response.choices[0].message.content
+
+        first, first_answer = asyncio.run(run())
+        second, second_answer = asyncio.run(run())
+
+        assert first is not second
+        assert first_answer == second_answer == 'Stub answer to: Hi'
+
+    def test_no_client_without_key(self, monkeypatch):
+        """Test that no client is built when no API key is set."""
+        monkeypatch.delenv('OPENAI_API_KEY', raising=False)
+
+        assert ai_gateway.get_client() is None
+
+    def test_slow_call_times_out(self, monkeypatch):
+        """Test that a per-call timeout stops a hung request."""
+        self.use_stub(monkeypatch, latency=1)
+
+        with pytest.raises(openai.APITimeoutError):
+            self.ask(timeout=0.2, attempts=1)
+
+    def test_failures_are_retried_then_circuit_opens(self, monkeypatch):
+        """Test that server errors are retried and then fail fast."""
+        server = self.use_stub(monkeypatch, error_rate=1.0)
+
+        with pytest.raises(openai.InternalServerError):
+            self.ask(attempts=2)
+        assert server.request_count == 2
+        assert ai_gateway.breaker.state == 'open'
+
+        with pytest.raises(CircuitOpenError):
+            self.ask()
+        assert server.request_count == 2
+
+    def test_breaker_lets_one_trial_through_after_reset(self):
+        """Test that a half-open breaker allows one trial and closes on success."""
+        now = [0]
+        breaker = CircuitBreaker(threshold=1, reset_seconds=10, clock=lambda: now[0])
+        breaker.record_failure()
+        assert breaker.state == 'open'
+
+        now[0] = 11
+        breaker.before_call()
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+        breaker.record_success()
+        assert breaker.state == 'closed'
+
+    def test_cancelled_trial_frees_the_breaker(self, monkeypatch):
+        """Test that a half-open trial cancelled mid-call does not keep the breaker shut."""
+        now = [0]
+        breaker = CircuitBreaker(threshold=1, reset_seconds=10, clock=lambda: now[0])
+        monkeypatch.setattr(ai_gateway, 'breaker', breaker)
+        breaker.record_failure()
+        now[0] = 11
+
+        async def hang(**kwargs):
+            await asyncio.sleep(60)
+
+        async def run():
+            trial = asyncio.ensure_future(ai_gateway.acall(hang, attempts=1))
+            await asyncio.sleep(0)
+            trial.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await trial
+
+        asyncio.run(run())
+
+        breaker.before_call()
+        assert breaker.trial_running
+
+    def test_async_stream(self, monkeypatch):
+        """Test that the async client streams the stub's answer in pieces."""
+        self.use_stub(monkeypatch)
+
+        async def run():
+            client = ai_gateway.get_async_client()
+            stream = await ai_gateway.acall(
+                client.chat.completions.create,
+                model='gpt-3.5-turbo',
+                messages=[{'role': 'user', 'content': 'Hi'}],
+                stream=True,
+            )
+            pieces = [chunk.choices[0].delta.content async for chunk in stream]
+            await client.close()
+            return pieces
+
+        pieces = asyncio.run(run())
+
+        assert len(pieces) > 1
+        assert ''.join(pieces) == 'Stub answer to: Hi'
@@ -0,0 +1,74 @@
+"""
+Test cases for conditional responses on the JSON APIs.
+"""
+import pytest
+from django.contrib.auth.models import User
+from django.test import Client
+from django.urls import reverse
+from assignments.models import Event
+from django.utils import timezone
+from datetime import timedelta
+
+
+@pytest.mark.django_db
+class TestAPICaching:
+    """Test cases for ETag handling on the upcoming-items APIs."""
+
+    @pytest.fixture
+    def user(self):
+        """Create a test user."""
+        return User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+
+    @pytest.fixture
+    def authenticated_client(self, user):
+        """Create an authenticated test client."""
+        client = Client()
+        client.login(username='testuser', password='testpass123')
+        return client
+
+    def create_event(self, user, title, days):
+        """Create an event starting ``days`` from now."""
+        return Event.objects.create(
+            title=title,
+            start_date=timezone.now() + timedelta(days=days),
+            user=user
+        )
+
+    def test_unchanged_data_returns_304(self, authenticated_client, user):
+        """Test that revalidating unchanged data returns 304 with no body."""
+        self.create_event(user, 'Quiz', 2)
+        url = reverse('api_upcoming_events')
+
+        first = authenticated_client.get(url)
+        second = authenticated_client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+
+        assert first.status_code == 200
+        assert 'private' in first['Cache-Control']
+        assert second.status_code == 304
+        assert second.content == b''
+
+    def test_new_row_changes_etag(self, authenticated_client, user):
+        """Test that adding an event invalidates the old ETag."""
+        url = reverse('api_upcoming_events')
+        first = authenticated_client.get(url)
+
+        self.create_event(user, 'Exam', 3)
+        second = authenticated_client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+
+        assert second.status_code == 200
+        assert [event['title'] for event in second.json()['events']] == ['Exam']
+
+    def test_days_and_limit_are_capped(self, authenticated_client, user):
+        """Test that the days and limit parameters are honoured and clamped."""
+        self.create_event(user, 'Soon', 1)
+        self.create_event(user, 'Later', 20)
+        url = reverse('api_upcoming_events')
+
+        assert len(authenticated_client.get(url).json()['events']) == 1
+        assert len(authenticated_client.get(url, {'days': 30}).json()['events']) == 2
+        assert len(authenticated_client.get(url, {'days': 30, 'limit': 1}).json()['events']) == 1
+        assert len(authenticated_client.get(url, {'days': 'x', 'limit': 0}).json()['events']) == 1
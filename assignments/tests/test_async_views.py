@@ -0,0 +1,100 @@
+"""
+Test cases for the async AI views.
+"""
+import pytest
+from unittest import mock
+from django.contrib.auth.models import User
+from django.test import Client
+from django.urls import reverse
+from assignments.llm_cache import reset_stats
+from assignments.models import ChatMessage, Course, LLMCacheEntry, Podcast, StudyNotes, Task
+
+
+def fake_async_client(content):
+    """Build an AsyncOpenAI stand-in that answers with ``content``."""
+    async def create(**kwargs):
+        return mock.Mock(choices=[mock.Mock(message=mock.Mock(content=content))])
+
+    client = mock.Mock()
+    client.chat.completions.create = mock.Mock(side_effect=create)
+    return client
+
+
+@pytest.mark.django_db
+class TestAsyncViews:
+    """Test cases for chatbot_ask, study_notes_create and podcast_generate."""
+
+    @pytest.fixture(autouse=True)
+    def empty_cache(self):
+        """Start each test with an empty LLM cache."""
+        LLMCacheEntry.objects.all().delete()
+        reset_stats()
+
+    @pytest.fixture
+    def user(self):
+        """Create a test user."""
+        return User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+
+    @pytest.fixture
+    def authenticated_client(self, user):
+        """Create an authenticated test client."""
+        client = Client()
+        client.login(username='testuser', password='testpass123')
+        return client
+
+    def test_chatbot_ask_saves_answer(self, authenticated_client, user):
+        """Test that a question is answered with the async client and saved."""
+        Course.objects.create(course_code='BIO1', course_name='Biology', user=user)
+        openai = fake_async_client('Use flashcards.')
+
+        with mock.patch('assignments.views_chat.get_async_client', return_value=openai):
+            response = authenticated_client.post(reverse('chatbot_ask'), {'question': 'How to memorize?'})
+
+        assert response.status_code == 302
+        assert ChatMessage.objects.get(user=user).response == 'Use flashcards.'
+        system_prompt = openai.chat.completions.create.call_args.kwargs['messages'][0]['content']
+        assert 'Biology' in system_prompt
+
+    def test_failed_answer_is_not_saved_or_reused(self, authenticated_client, user):
+        """Test that a model error is shown once, not saved as an answer to similar questions."""
+        openai = mock.Mock()
+        openai.chat.completions.create = mock.Mock(side_effect=RuntimeError('upstream down'))
+
+        with mock.patch('assignments.views_chat.get_async_client', return_value=openai):
+            response = authenticated_client.post(reverse('chatbot_ask'), {'question': 'How to memorize?'}, follow=True)
+
+        assert 'upstream down' in response.content.decode()
+        assert not ChatMessage.objects.exists()
+
+    def test_chatbot_ask_renders_form(self, authenticated_client, user):
+        """Test that the ask page renders with the user's history."""
+        ChatMessage.objects.create(user=user, question='Earlier?', response='Yes')
+
+        response = authenticated_client.get(reverse('chatbot_ask'))
+
+        assert response.status_code == 200
+        assert [chat.question for chat in response.context['chat_history']] == ['Earlier?']
+
+    def test_study_notes_create_queues_generation(self, authenticated_client, user):
+        """Test that creating study notes saves them and queues a task."""
+        response = authenticated_client.post(reverse('study_notes_create'), {
+            'topic': 'Photosynthesis',
+            'detail_level': 'basic',
+        })
+
+        note = StudyNotes.objects.get(user=user)
+        assert response.status_code == 302
+        assert Task.objects.filter(name='study_notes.generate', payload={'study_notes_id': note.pk}).exists()
+
+    def test_podcast_generate_is_scoped_to_owner(self, authenticated_client, user):
+        """Test that the generate page renders for the owner and 404s for others."""
+        podcast = Podcast.objects.create(title='Cells', topic='Cells', notes_text='Notes', user=user)
+        other = User.objects.create_user(username='other', password='testpass123')
+        foreign = Podcast.objects.create(title='Theirs', topic='X', notes_text='Y', user=other)
+
+        assert authenticated_client.get(reverse('podcast_generate', args=[podcast.pk])).status_code == 200
+        assert authenticated_client.get(reverse('podcast_generate', args=[foreign.pk])).status_code == 404
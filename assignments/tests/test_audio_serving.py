@@ -0,0 +1,138 @@
+"""
+Test cases for serving podcast audio with ranges, validators and nginx offload.
+"""
+import os
+import stat
+import pytest
+from django.contrib.auth.models import User
+from django.test import Client
+from django.urls import reverse
+from assignments import audio_store, file_serving
+from assignments.file_serving import RangeNotSatisfiable, parse_range
+from assignments.models import Podcast
+
+AUDIO = bytes(range(256)) * 40
+
+
+@pytest.mark.django_db
+class TestAudioServing:
+    """Test cases for the podcast audio and download endpoints."""
+
+    @pytest.fixture(autouse=True)
+    def media_root(self, settings, tmp_path):
+        """Store media in a temporary directory."""
+        settings.MEDIA_ROOT = tmp_path
+        return tmp_path
+
+    @pytest.fixture
+    def user(self):
+        """Create a test user."""
+        return User.objects.create_user(username='testuser', password='testpass123')
+
+    @pytest.fixture
+    def client(self, user):
+        """Log the test user in."""
+        client = Client()
+        client.login(username='testuser', password='testpass123')
+        return client
+
+    @pytest.fixture
+    def podcast(self, user, media_root):
+        """Create a podcast with generated audio."""
+        (media_root / 'podcasts' / 'audio').mkdir(parents=True)
+        (media_root / 'podcasts' / 'audio' / 'cells.mp3').write_bytes(AUDIO)
+        return Podcast.objects.create(
+            title='Cells', topic='Cell biology', user=user,
+            audio_file='podcasts/audio/cells.mp3', is_audio_generated=True,
+        )
+
+    def audio_url(self, podcast):
+        return reverse('podcast_audio', args=[podcast.pk])
+
+    def test_parse_range(self):
+        """Test single ranges, suffixes, open ends and ranges past the end."""
+        assert parse_range('bytes=0-99', 1000) == (0, 99)
+        assert parse_range('bytes=900-', 1000) == (900, 999)
+        assert parse_range('bytes=-100', 1000) == (900, 999)
+        assert parse_range('bytes=500-5000', 1000) == (500, 999)
+        assert parse_range('bytes=0-1,5-9', 1000) is None
+        assert parse_range('items=0-1', 1000) is None
+        with pytest.raises(RangeNotSatisfiable):
+            parse_range('bytes=1000-', 1000)
+
+    def test_full_file_advertises_ranges(self, client, podcast):
+        """Test that the player gets the whole file with validators and range support."""
+        response = client.get(self.audio_url(podcast))
+
+        assert response.status_code == 200
+        assert b''.join(response.streaming_content) == AUDIO
+        assert response['Content-Type'] == 'audio/mpeg'
+        assert response['Accept-Ranges'] == 'bytes'
+        assert response['ETag'] and response['Last-Modified']
+        assert 'Content-Disposition' not in response
+
+    def test_range_returns_partial_content(self, client, podcast):
+        """Test that a seek asks for, and gets, only the bytes it needs."""
+        response = client.get(self.audio_url(podcast), HTTP_RANGE='bytes=1000-1999')
+
+        assert response.status_code == 206
+        assert response['Content-Range'] == f'bytes 1000-1999/{len(AUDIO)}'
+        assert response['Content-Length'] == '1000'
+        assert b''.join(response.streaming_content) == AUDIO[1000:2000]
+
+    def test_unsatisfiable_range(self, client, podcast):
+        """Test that a range past the end gets a 416 naming the real size."""
+        response = client.get(self.audio_url(podcast), HTTP_RANGE=f'bytes={len(AUDIO)}-')
+
+        assert response.status_code == 416
+        assert response['Content-Range'] == f'bytes */{len(AUDIO)}'
+
+    def test_conditional_requests(self, client, podcast):
+        """Test If-None-Match revalidation and If-Range against a changed file."""
+        etag = client.get(self.audio_url(podcast))['ETag']
+
+        assert client.get(self.audio_url(podcast), HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+        stale = client.get(self.audio_url(podcast), HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"0-0"')
+        assert stale.status_code == 200
+        fresh = client.get(self.audio_url(podcast), HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag)
+        assert fresh.status_code == 206
+
+    def test_download_is_an_attachment(self, client, podcast):
+        """Test that the download endpoint supports ranges and names the file."""
+        response = client.get(reverse('podcast_download', args=[podcast.pk]), HTTP_RANGE='bytes=-10')
+
+        assert response.status_code == 206
+        assert response['Content-Disposition'] == 'attachment; filename="Cells.mp3"'
+        assert b''.join(response.streaming_content) == AUDIO[-10:]
+
+    def test_accel_redirect_hands_off_to_nginx(self, client, podcast, monkeypatch):
+        """Test that with offload on, Django sends only headers and nginx the bytes."""
+        monkeypatch.setattr(file_serving, 'ACCEL_REDIRECT', True)
+
+        response = client.get(self.audio_url(podcast), HTTP_RANGE='bytes=0-9')
+
+        assert response.status_code == 200
+        assert response.content == b''
+        assert response['X-Accel-Redirect'] == '/protected-media/podcasts/audio/cells.mp3'
+        assert response['Content-Type'] == 'audio/mpeg'
+
+    def test_stored_audio_is_readable_by_nginx(self, settings, media_root):
+        """Test that stored blobs get the upload permissions, not mkstemp's private mode."""
+        settings.FILE_UPLOAD_PERMISSIONS = 0o644
+
+        def write(tmp_path):
+            with open(tmp_path, 'wb') as audio:
+                audio.write(AUDIO)
+
+        path = audio_store.write_blob('ab' * 32, write)
+
+        assert stat.S_IMODE(os.stat(media_root / path).st_mode) == 0o644
+
+    def test_other_users_audio_is_not_found(self, podcast):
+        """Test that audio is only served to the podcast's owner."""
+        User.objects.create_user(username='other', password='testpass123')
+        other = Client()
+        other.login(username='other', password='testpass123')
+
+        assert other.get(self.audio_url(podcast)).status_code == 404
@@ -0,0 +1,139 @@
+"""
+Test cases for chatbot conversation threads and token-budgeted memory.
+"""
+import pytest
+from unittest import mock
+from django.contrib.auth.models import User
+from django.test import Client
+from django.urls import reverse
+from assignments import chat_memory
+from assignments.chat_memory import build_history, turn_tokens
+from assignments.llm_cache import reset_stats
+from assignments.models import ChatMessage, ChatThread, LLMCacheEntry
+from assignments.podcast_service import estimate_tokens
+from assignments.views_chat import build_chat_messages
+
+
+def fake_async_client(content):
+    """Build an AsyncOpenAI stand-in that answers with ``content``."""
+    async def create(**kwargs):
+        return mock.Mock(choices=[mock.Mock(message=mock.Mock(content=content))])
+
+    client = mock.Mock()
+    client.chat.completions.create = mock.Mock(side_effect=create)
+    return client
+
+
+@pytest.mark.django_db
+class TestChatMemory:
+    """Test cases for recent turns, rolling summaries and thread views."""
+
+    @pytest.fixture(autouse=True)
+    def empty_cache(self):
+        """Start each test with an empty LLM cache."""
+        LLMCacheEntry.objects.all().delete()
+        reset_stats()
+
+    @pytest.fixture
+    def user(self):
+        """Create a test user."""
+        return User.objects.create_user(username='testuser', password='testpass123')
+
+    @pytest.fixture
+    def thread(self, user):
+        """Create a thread with ten turns of about 60 tokens each."""
+        thread = ChatThread.objects.create(user=user, title='Finals')
+        for n in range(10):
+            ChatMessage.objects.create(
+                user=user, thread=thread, question=f'Question {n} ' + 'x' * 100, response=f'Answer {n} ' + 'y' * 100
+            )
+        return thread
+
+    @pytest.fixture
+    def summarizer(self):
+        """Replace the LLM summarizer with one that lists the turns it saw."""
+        def summarize(summary, turns):
+            return ' '.join([summary] + [turn.question.split()[1] for turn in turns]).strip()
+
+        with mock.patch.object(chat_memory, 'summarize_turns', side_effect=summarize) as summarizer:
+            yield summarizer
+
+    def test_new_question_has_no_history(self):
+        """Test that a question outside a thread is sent on its own."""
+        messages = build_chat_messages('Hi?', 'User is taking courses: Biology')
+
+        assert [message['role'] for message in messages] == ['system', 'user']
+
+    def test_recent_turns_verbatim_and_older_summarized(self, thread, summarizer):
+        """Test that turns past the budget are folded into the summary, oldest first."""
+        budget = chat_memory.SUMMARY_MAX_TOKENS + 3 * turn_tokens(thread.messages.first())
+
+        summary, turns = build_history(thread, budget=budget)
+
+        assert [turn.question.split()[1] for turn in turns] == ['7', '8', '9']
+        assert summary == '0 1 2 3 4 5 6'
+        thread.refresh_from_db()
+        assert thread.summarized_through == thread.messages.get(question__startswith='Question 6 ').pk
+
+    def test_summary_is_updated_incrementally(self, thread, user, summarizer):
+        """Test that each turn is summarized once as it leaves the window."""
+        budget = chat_memory.SUMMARY_MAX_TOKENS + 3 * turn_tokens(thread.messages.first())
+        build_history(thread, budget=budget)
+        ChatMessage.objects.create(user=user, thread=thread, question='Question 10 ' + 'x' * 100, response='y' * 100)
+
+        summary, turns = build_history(thread, budget=budget)
+
+        assert summary == '0 1 2 3 4 5 6 7'
+        assert [call.args[1][0].question.split()[1] for call in summarizer.call_args_list] == ['0', '7']
+
+    def test_prompt_stays_bounded(self, user, summarizer):
+        """Test that the prompt size does not grow with the thread."""
+        thread = ChatThread.objects.create(user=user, title='Long')
+        sizes = []
+        for n in range(40):
+            summary, turns = build_history(thread)
+            messages = build_chat_messages('Next?', '', summary, turns)
+            sizes.append(sum(estimate_tokens(message['content']) for message in messages))
+            ChatMessage.objects.create(user=user, thread=thread, question=f'Question {n} ' + 'q' * 600, response='a' * 1200)
+
+        assert max(sizes) <= chat_memory.HISTORY_TOKENS + 200
+
+    def test_failed_summary_keeps_old_summary(self, thread):
+        """Test that a model failure leaves the summary for the next try."""
+        thread.summary = 'Earlier.'
+        thread.save()
+        with mock.patch.object(chat_memory, 'summarize_turns', side_effect=Exception('down')):
+            summary, turns = build_history(thread, budget=chat_memory.SUMMARY_MAX_TOKENS + 100)
+
+        assert summary == 'Earlier.'
+        thread.refresh_from_db()
+        assert thread.summarized_through == 0
+
+    def test_follow_up_sees_earlier_turn(self, user):
+        """Test that a follow-up question in a thread is sent with the earlier turn."""
+        client = Client()
+        client.login(username='testuser', password='testpass123')
+        openai = fake_async_client('Start with past papers.')
+
+        with mock.patch('assignments.views_chat.get_async_client', return_value=openai):
+            response = client.post(reverse('chatbot_ask'), {'question': 'How do I revise for finals?'})
+            thread = ChatThread.objects.get(user=user)
+            assert response.url == f"{reverse('chatbot_ask')}?thread={thread.pk}"
+            client.post(reverse('chatbot_ask'), {'question': 'Which ones?', 'thread': thread.pk})
+
+        messages = openai.chat.completions.create.call_args.kwargs['messages']
+        assert [message['content'] for message in messages[1:]] == [
+            'How do I revise for finals?', 'Start with past papers.', 'Which ones?'
+        ]
+        assert thread.messages.count() == 2
+        assert client.get(f"{reverse('chatbot_ask')}?thread={thread.pk}").context['thread'] == thread
+
+    def test_other_users_thread_is_not_found(self, thread):
+        """Test that a thread cannot be continued by another user."""
+        User.objects.create_user(username='other', password='testpass123')
+        client = Client()
+        client.login(username='other', password='testpass123')
+
+        response = client.post(reverse('chatbot_ask'), {'question': 'Hi', 'thread': thread.pk})
+
+        assert response.status_code == 404
@@ -0,0 +1,114 @@
+"""
+Test cases for the streaming chatbot endpoint.
+"""
+import pytest
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.test import Client
+from django.urls import reverse
+from assignments.llm_cache import reset_stats
+from assignments.models import ChatMessage, LLMCacheEntry
+
+
+def delta(text):
+    """Build a streamed completion chunk stand-in."""
+    return mock.Mock(choices=[mock.Mock(delta=mock.Mock(content=text))])
+
+
+def fake_async_client(*pieces):
+    """Build an AsyncOpenAI stand-in that streams ``pieces``."""
+    async def stream():
+        for piece in pieces:
+            yield delta(piece)
+
+    async def create(**kwargs):
+        assert kwargs['stream'] is True
+        return stream()
+
+    client = mock.Mock()
+    client.chat.completions.create = mock.Mock(side_effect=create)
+    return client
+
+
+@pytest.mark.django_db
+class TestChatbotStream:
+    """Test cases for token streaming and history saving."""
+
+    @pytest.fixture(autouse=True)
+    def empty_cache(self):
+        """Start each test with an empty LLM cache."""
+        LLMCacheEntry.objects.all().delete()
+        reset_stats()
+
+    @pytest.fixture
+    def user(self):
+        """Create a test user."""
+        return User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+
+    @pytest.fixture
+    def authenticated_client(self, user):
+        """Create an authenticated test client."""
+        client = Client()
+        client.login(username='testuser', password='testpass123')
+        return client
+
+    def ask(self, client, question):
+        """Post a question and read the whole stream."""
+        response = client.post(reverse('chatbot_stream'), {'question': question})
+        assert response['Content-Type'] == 'text/event-stream'
+
+        async def read():
+            return b''.join([chunk async for chunk in response.streaming_content])
+
+        # Consume the async stream the way an ASGI server would
+        return async_to_sync(read)().decode()
+
+    def test_tokens_stream_then_message_is_saved(self, authenticated_client, user):
+        """Test that each piece is sent as it arrives and the answer is saved at the end."""
+        openai = fake_async_client('Plan ', 'ahead', '.')
+        with mock.patch('assignments.views_chat.get_async_client', return_value=openai):
+            body = self.ask(authenticated_client, 'How do I manage time?')
+
+        assert body.count('event: token') == 3
+        assert body.index('event: token') < body.index('event: done')
+        chat = ChatMessage.objects.get(user=user)
+        assert chat.response == 'Plan ahead.'
+        assert f'"id": {chat.pk}' in body
+
+    def test_repeat_question_is_answered_from_cache(self, authenticated_client, user):
+        """Test that a cached answer is sent without calling the model."""
+        openai = fake_async_client('Sleep well.')
+        with mock.patch('assignments.views_chat.get_async_client', return_value=openai):
+            self.ask(authenticated_client, 'Exam tips?')
+            body = self.ask(authenticated_client, 'Exam tips?')
+
+        assert openai.chat.completions.create.call_count == 1
+        assert 'Sleep well.' in body
+        assert ChatMessage.objects.filter(user=user).count() == 2
+
+    def test_stream_error_is_reported(self, authenticated_client, user):
+        """Test that a model failure ends the stream with an error frame and saves nothing."""
+        with mock.patch('assignments.views_chat.get_async_client', return_value=None):
+            body = self.ask(authenticated_client, 'Anything?')
+
+        assert 'event: error' in body
+        assert not ChatMessage.objects.exists()
+
+    def test_empty_answer_is_not_saved(self, authenticated_client, user):
+        """Test that a stream that produced no text reports an error and caches nothing."""
+        with mock.patch('assignments.views_chat.get_async_client', return_value=fake_async_client()):
+            body = self.ask(authenticated_client, 'Anything?')
+
+        assert 'event: error' in body
+        assert not ChatMessage.objects.exists()
+        assert not LLMCacheEntry.objects.exists()
+
+    def test_stream_requires_login_and_post(self, authenticated_client):
+        """Test that anonymous users are redirected and GET is rejected."""
+        assert Client().post(reverse('chatbot_stream'), {'question': 'Hi'}).status_code == 302
+        assert authenticated_client.get(reverse('chatbot_stream')).status_code == 405
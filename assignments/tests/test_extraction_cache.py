@@ -0,0 +1,90 @@
+"""
+Test cases for the extracted document text cache.
+"""
+import hashlib
+import pytest
+from unittest import mock
+from django.contrib.auth.models import User
+from django.db import IntegrityError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client
+from django.urls import reverse
+from assignments import extraction_cache, file_utils
+from assignments.extraction_cache import cache_size, cached_extract_text, evict
+from assignments.file_utils import ExtractionReport
+from assignments.models import ExtractedTextCache, Podcast
+
+
+@pytest.mark.django_db
+class TestExtractionCache:
+    """Test cases for reusing extracted text across identical uploads."""
+
+    @pytest.fixture
+    def extractor(self):
+        """Count calls to the real extractor."""
+        with mock.patch.object(
+            extraction_cache, 'extract_text_from_file', wraps=file_utils.extract_text_from_file
+        ) as extractor:
+            yield extractor
+
+    def test_repeat_upload_skips_extraction(self, extractor):
+        """Test that the same bytes under another name come from the cache."""
+        first = cached_extract_text(SimpleUploadedFile('syllabus.txt', b'Week 1: cells'))
+        report = ExtractionReport('copy.txt')
+        second = cached_extract_text(SimpleUploadedFile('copy.txt', b'Week 1: cells'), report)
+
+        assert first == second == 'Week 1: cells'
+        assert extractor.call_count == 1
+        assert report.cached
+        assert ExtractedTextCache.objects.get().hits == 1
+
+    def test_concurrent_store_does_not_fail_the_upload(self, extractor):
+        """Test that losing the race to cache identical text still returns it."""
+        upload = SimpleUploadedFile('syllabus.txt', b'Week 1: cells')
+
+        with mock.patch.object(ExtractedTextCache.objects, 'update_or_create', side_effect=IntegrityError):
+            assert cached_extract_text(upload) == 'Week 1: cells'
+
+    def test_new_extractor_version_extracts_again(self, extractor, monkeypatch):
+        """Test that cached text from an older extractor is not reused."""
+        cached_extract_text(SimpleUploadedFile('notes.txt', b'Osmosis'))
+        monkeypatch.setattr(file_utils, 'EXTRACTOR_VERSION', file_utils.EXTRACTOR_VERSION + 1)
+        cached_extract_text(SimpleUploadedFile('notes.txt', b'Osmosis'))
+
+        assert extractor.call_count == 2
+        assert ExtractedTextCache.objects.count() == 2
+
+    def test_evict_keeps_recently_used_within_limit(self):
+        """Test that least recently used text is evicted first."""
+        for name in ['old', 'middle', 'new']:
+            cached_extract_text(SimpleUploadedFile(f'{name}.txt', name.encode() * 10))
+        cached_extract_text(SimpleUploadedFile('old.txt', b'old' * 10))
+
+        evict(max_bytes=65)
+
+        remaining = set(ExtractedTextCache.objects.values_list('text', flat=True))
+        assert remaining == {'old' * 10, 'new' * 10}
+        assert cache_size() == (2, 60)
+
+    def test_upload_handler_hashes_while_streaming(self, settings, tmp_path, extractor):
+        """Test that uploads through a view carry their hash and reuse the cache."""
+        settings.MEDIA_ROOT = tmp_path
+        User.objects.create_user(username='testuser', password='testpass123')
+        client = Client()
+        client.login(username='testuser', password='testpass123')
+        content = b'Photosynthesis converts light to energy.'
+
+        for title in ['First', 'Second']:
+            client.post(reverse('podcast_create'), {
+                'title': title,
+                'topic': 'Plants',
+                'notes_text': 'Chapter 4',
+                'tone': 'educational',
+                'length': 'short',
+                'notes_files': SimpleUploadedFile('notes.txt', content),
+            })
+
+        assert extractor.call_count == 1
+        assert ExtractedTextCache.objects.get().content_hash == hashlib.sha256(content).hexdigest()
+        for notes_text in Podcast.objects.values_list('notes_text', flat=True):
+            assert notes_text.endswith(content.decode())
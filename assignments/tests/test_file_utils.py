@@ -0,0 +1,128 @@
+"""
+Test cases for streaming text extraction from uploads.
+"""
+import io
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from assignments import file_utils
+from assignments.file_utils import ExtractionError, ExtractionReport, extract_text_from_file, iter_text
+
+PyPDF2 = pytest.importorskip('PyPDF2')
+docx = pytest.importorskip('docx')
+
+
+def make_pdf(pages):
+    """Build a PDF with one line of text, 'Page N', on each page."""
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        None,
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+    ]
+    kids = []
+    for number in range(1, pages + 1):
+        stream = f'BT /F1 12 Tf 72 720 Td (Page {number}) Tj ET'.encode()
+        objects.append(b'<< /Length %d >>\nstream\n%s\nendstream' % (len(stream), stream))
+        objects.append(
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+            b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>' % len(objects)
+        )
+        kids.append(b'%d 0 R' % len(objects))
+    objects[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (b' '.join(kids), pages)
+
+    output = io.BytesIO()
+    output.write(b'%PDF-1.4\n')
+    offsets = []
+    for index, body in enumerate(objects, start=1):
+        offsets.append(output.tell())
+        output.write(b'%d 0 obj\n%s\nendobj\n' % (index, body))
+    xref = output.tell()
+    output.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1))
+    for offset in offsets:
+        output.write(b'%010d 00000 n \n' % offset)
+    output.write(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref))
+    return output.getvalue()
+
+
+def make_docx():
+    """Build a DOCX with a paragraph, a table, and another paragraph."""
+    document = docx.Document()
+    document.add_paragraph('Cell biology')
+    table = document.add_table(rows=2, cols=2)
+    table.cell(0, 0).text = 'Organelle'
+    table.cell(0, 1).text = 'Role'
+    table.cell(1, 0).text = 'Mitochondria'
+    table.cell(1, 1).text = 'Energy'
+    document.add_paragraph('End of notes')
+    output = io.BytesIO()
+    document.save(output)
+    return output.getvalue()
+
+
+class TestFileUtils:
+    """Test cases for extracting text from PDF, DOCX and TXT uploads."""
+
+    def test_txt_is_decoded_across_chunks(self):
+        """Test that multi-byte characters split between chunks decode correctly."""
+        upload = SimpleUploadedFile('notes.txt', 'café '.encode() * 1000)
+        upload.DEFAULT_CHUNK_SIZE = 7
+
+        assert extract_text_from_file(upload) == 'café ' * 1000
+
+    def test_pdf_pages_are_timed(self):
+        """Test that each PDF page is extracted in order with a timing."""
+        upload = SimpleUploadedFile('notes.pdf', make_pdf(3))
+        report = ExtractionReport(upload.name)
+
+        text = extract_text_from_file(upload, report)
+
+        assert [line.strip() for line in text.splitlines()] == ['Page 1', 'Page 2', 'Page 3']
+        assert [page[0] for page in report.pages] == [0, 1, 2]
+        assert all(seconds >= 0 for _, _, seconds in report.pages)
+        assert not report.truncated
+
+    def test_large_pdf_is_extracted_in_parallel_in_order(self, monkeypatch):
+        """Test that page ranges from the process pool come back in page order."""
+        monkeypatch.setattr(file_utils, 'PARALLEL_MIN_PAGES', 5)
+        monkeypatch.setattr(file_utils, 'PAGES_PER_TASK', 3)
+        monkeypatch.setattr(file_utils, 'WORKERS', 2)
+        upload = SimpleUploadedFile('textbook.pdf', make_pdf(10))
+        report = ExtractionReport(upload.name)
+
+        text = extract_text_from_file(upload, report)
+
+        assert [line.strip() for line in text.splitlines()] == [f'Page {n}' for n in range(1, 11)]
+        assert [page[0] for page in report.pages] == list(range(10))
+
+    def test_page_and_character_caps(self):
+        """Test that extraction stops at the page cap and at the character cap."""
+        report = ExtractionReport('notes.pdf')
+        pages = list(iter_text(SimpleUploadedFile('notes.pdf', make_pdf(5)), report, max_pages=2))
+        assert len(pages) == 2
+        assert report.truncated
+
+        report = ExtractionReport('notes.txt')
+        text = ''.join(iter_text(SimpleUploadedFile('notes.txt', b'x' * 500), report, max_chars=100))
+        assert text == 'x' * 100
+        assert report.truncated
+
+    def test_oversized_upload_is_rejected(self):
+        """Test that files over the byte cap are not parsed."""
+        upload = SimpleUploadedFile('notes.txt', b'x' * 2048)
+
+        with pytest.raises(ExtractionError):
+            list(iter_text(upload, max_bytes=1024))
+
+    def test_docx_tables_are_extracted_in_place(self):
+        """Test that DOCX tables are extracted between the paragraphs around them."""
+        upload = SimpleUploadedFile('notes.docx', make_docx())
+
+        text = extract_text_from_file(upload)
+
+        assert text.splitlines() == [
+            'Cell biology', 'Organelle | Role', 'Mitochondria | Energy', 'End of notes'
+        ]
+
+    def test_unsupported_format(self):
+        """Test that unsupported files raise instead of becoming notes text."""
+        with pytest.raises(ExtractionError):
+            extract_text_from_file(SimpleUploadedFile('slides.pptx', b'data'))
@@ -0,0 +1,119 @@
+"""
+Test cases for the LLM response cache.
+"""
+import pytest
+from unittest import mock
+from datetime import timedelta
+from django.db import IntegrityError
+from django.utils import timezone
+from assignments.llm_cache import cached_completion, evict, get_stats, reset_stats
+from assignments.models import LLMCacheEntry
+
+
+def fake_client(*answers):
+    """Build an OpenAI client stand-in returning ``answers`` in turn."""
+    client = mock.Mock()
+    client.chat.completions.create.side_effect = [
+        mock.Mock(choices=[mock.Mock(message=mock.Mock(content=answer))])
+        for answer in answers
+    ]
+    return client
+
+
+@pytest.mark.django_db
+class TestLLMCache:
+    """Test cases for cache hits, bypassing and eviction."""
+
+    @pytest.fixture(autouse=True)
+    def empty_cache(self):
+        """Start each test with an empty cache and zeroed counters."""
+        LLMCacheEntry.objects.all().delete()
+        reset_stats()
+
+    def ask(self, client, prompt='Explain osmosis', temperature=0.7, use_cache=True):
+        """Run one cached completion."""
+        return cached_completion(
+            client,
+            model='gpt-3.5-turbo',
+            messages=[{'role': 'user', 'content': prompt}],
+            temperature=temperature,
+            max_tokens=100,
+            use_cache=use_cache,
+        )
+
+    def test_identical_request_is_served_from_cache(self):
+        """Test that a repeated request does not call the model again."""
+        client = fake_client('Water moves.', 'Unused')
+
+        assert self.ask(client) == 'Water moves.'
+        assert self.ask(client) == 'Water moves.'
+
+        assert client.chat.completions.create.call_count == 1
+        assert LLMCacheEntry.objects.get().hits == 1
+        assert get_stats()['hits'] == 1
+        assert get_stats()['misses'] == 1
+
+    def test_concurrent_store_does_not_fail_the_call(self):
+        """Test that losing the race to store a key still returns the model's answer."""
+        client = fake_client('Water moves.')
+
+        with mock.patch.object(LLMCacheEntry.objects, 'update_or_create', side_effect=IntegrityError):
+            assert self.ask(client) == 'Water moves.'
+
+        assert get_stats()['stores'] == 0
+
+    def test_any_parameter_changes_the_key(self):
+        """Test that prompts and sampling options are part of the key."""
+        client = fake_client('A', 'B', 'C')
+
+        self.ask(client)
+        self.ask(client, prompt='Explain diffusion')
+        self.ask(client, temperature=0.2)
+
+        assert client.chat.completions.create.call_count == 3
+
+    def test_bypass_refreshes_the_entry(self):
+        """Test that use_cache=False calls the model and stores the new answer."""
+        client = fake_client('Old', 'New')
+
+        self.ask(client)
+        assert self.ask(client, use_cache=False) == 'New'
+        assert self.ask(client) == 'New'
+        assert get_stats()['bypassed'] == 1
+
+    def test_expired_entries_are_missed(self):
+        """Test that entries past their TTL are not returned."""
+        client = fake_client('Old', 'New')
+
+        self.ask(client)
+        LLMCacheEntry.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        assert self.ask(client) == 'New'
+
+    def test_evict_keeps_most_recently_used(self):
+        """Test that eviction removes the least recently used entries first."""
+        now = timezone.now()
+        for index in range(5):
+            LLMCacheEntry.objects.create(
+                key=f'key-{index}', model='m', response='x' * 10, size=10,
+                last_used_at=now - timedelta(minutes=index),
+            )
+
+        assert evict(max_entries=3) == 2
+        assert set(LLMCacheEntry.objects.values_list('key', flat=True)) == {'key-0', 'key-1', 'key-2'}
+
+        assert evict(max_bytes=15) == 2
+        assert list(LLMCacheEntry.objects.values_list('key', flat=True)) == ['key-0']
+
+    def test_study_notes_use_cache(self, monkeypatch):
+        """Test that generate_study_notes answers repeat topics from the cache."""
+        from assignments import podcast_service
+        client = fake_client('Notes on cells')
+        monkeypatch.setattr(podcast_service, 'get_client', lambda: client)
+
+        first = podcast_service.generate_study_notes('Cells', 'basic')
+        second = podcast_service.generate_study_notes('Cells', 'basic')
+
+        assert first == second == 'Notes on cells'
+        assert client.chat.completions.create.call_count == 1
+        assert get_stats()['hit_rate'] == 0.5
@@ -0,0 +1,88 @@
+"""
+Test cases for map-reduce summarization of long podcast notes.
+"""
+import pytest
+from unittest import mock
+from assignments import podcast_service
+from assignments.llm_cache import reset_stats
+from assignments.models import LLMCacheEntry
+
+
+def answer(content):
+    """Build a chat completion response stand-in."""
+    return mock.Mock(choices=[mock.Mock(message=mock.Mock(content=content))])
+
+
+@pytest.mark.django_db
+class TestNoteSummarization:
+    """Test cases for condensing notes before writing a script."""
+
+    @pytest.fixture(autouse=True)
+    def empty_cache(self):
+        """Start each test with an empty LLM cache."""
+        LLMCacheEntry.objects.all().delete()
+        reset_stats()
+
+    @pytest.fixture
+    def client(self, monkeypatch):
+        """Replace the OpenAI client with one that labels each request."""
+        client = mock.Mock()
+
+        def create(model, messages, temperature, max_tokens):
+            prompt = messages[-1]['content']
+            if 'outline' in prompt:
+                return answer('OUTLINE')
+            if 'Merge' in prompt:
+                return answer('merged summary')
+            if 'Notes/Content to Convert' in prompt:
+                return answer(prompt)
+            return answer(f'summary of part {prompt.split("Section ")[1][:2].strip()}')
+
+        client.chat.completions.create.side_effect = create
+        monkeypatch.setattr(podcast_service, 'get_client', lambda: client)
+        return client
+
+    def long_notes(self, sections=8):
+        """Notes of about 1,200 tokens per section."""
+        return '\n\n'.join(f'Section {index}. ' + 'Cells divide. ' * 350 for index in range(sections))
+
+    def test_short_notes_are_used_as_is(self, client):
+        """Test that notes within budget skip summarization."""
+        assert podcast_service.condense_notes('Mitochondria make ATP.', 'Cells') == 'Mitochondria make ATP.'
+        assert client.chat.completions.create.call_count == 0
+
+    def test_long_notes_are_mapped_then_reduced(self, client):
+        """Test that every chunk is summarized and the summaries become an outline."""
+        notes = self.long_notes()
+
+        assert podcast_service.condense_notes(notes, 'Cells') == 'OUTLINE'
+
+        chunks = podcast_service.chunk_text(notes)
+        assert len(chunks) == 8
+        # One call per chunk, then the outline
+        assert client.chat.completions.create.call_count == len(chunks) + 1
+
+    def test_outline_may_use_the_whole_budget(self, client):
+        """Test that the outline is limited by the notes budget, not a chunk summary's size."""
+        podcast_service.condense_notes(self.long_notes(), 'Cells', budget=1800)
+
+        outline_call = client.chat.completions.create.call_args_list[-1]
+        assert 'outline' in outline_call.kwargs['messages'][-1]['content']
+        assert outline_call.kwargs['max_tokens'] == 1800
+
+    def test_chunk_summaries_are_cached(self, client):
+        """Test that overlapping notes only summarize the new chunks."""
+        podcast_service.condense_notes(self.long_notes(8), 'Cells')
+        calls = client.chat.completions.create.call_count
+
+        podcast_service.condense_notes(self.long_notes(9), 'Cells')
+
+        # The new section and a new outline
+        assert client.chat.completions.create.call_count == calls + 2
+
+    def test_script_prompt_uses_the_outline(self, client):
+        """Test that the script is written from the outline, not truncated notes."""
+        script = podcast_service.generate_podcast_script('Cells', self.long_notes())
+
+        assert 'OUTLINE' in script
+        assert 'truncated' not in script
@@ -0,0 +1,118 @@
+"""
+Test cases for uploading several note documents at once.
+"""
+import pytest
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client
+from django.urls import reverse
+from assignments import extraction_cache, podcast_service
+from assignments.extraction_cache import cached_extract_texts
+from assignments.forms import PodcastForm
+from assignments.models import Podcast, StudyNotes
+
+
+@pytest.mark.django_db
+class TestNotesUpload:
+    """Test cases for multi-file notes upload with concurrent extraction."""
+
+    @pytest.fixture
+    def user(self):
+        """Create a test user."""
+        return User.objects.create_user(username='testuser', password='testpass123')
+
+    @pytest.fixture
+    def authenticated_client(self, user, settings, tmp_path):
+        """Create an authenticated test client that stores uploads in a temp dir."""
+        settings.MEDIA_ROOT = tmp_path
+        client = Client()
+        client.login(username='testuser', password='testpass123')
+        return client
+
+    def podcast_data(self, **data):
+        """Form data for a podcast, plus ``data``."""
+        return {'title': 'Unit 3', 'topic': 'Genetics', 'tone': 'educational', 'length': 'short', **data}
+
+    def test_files_are_merged_in_upload_order(self, authenticated_client, user):
+        """Test that every file's text is added, in the order it was uploaded."""
+        files = [SimpleUploadedFile(f'lecture{n}.txt', f'Lecture {n} notes'.encode()) for n in range(1, 4)]
+
+        response = authenticated_client.post(reverse('podcast_create'), self.podcast_data(notes_files=files))
+
+        assert response.status_code == 302
+        notes = Podcast.objects.get(user=user).notes_text
+        assert notes.index('lecture1.txt') < notes.index('lecture2.txt') < notes.index('lecture3.txt')
+        assert 'Lecture 2 notes' in notes
+
+    def test_unreadable_file_is_reported_and_skipped(self, authenticated_client, user):
+        """Test that one broken file is reported without losing the others."""
+        files = [
+            SimpleUploadedFile('slides.pdf', b'not really a pdf'),
+            SimpleUploadedFile('summary.txt', b'Mendel and peas'),
+        ]
+
+        response = authenticated_client.post(
+            reverse('podcast_create'), self.podcast_data(notes_files=files), follow=True
+        )
+
+        notes = Podcast.objects.get(user=user).notes_text
+        assert 'Mendel and peas' in notes
+        assert 'slides.pdf' not in notes
+        assert any('slides.pdf' in str(message) for message in response.context['messages'])
+
+    def test_notes_or_files_are_required(self, user):
+        """Test that a podcast needs pasted notes or at least one document."""
+        form = PodcastForm(self.podcast_data(), user=user)
+
+        assert not form.is_valid()
+        assert form.non_field_errors()
+
+    def test_unsupported_files_and_too_many_files_are_rejected(self, user):
+        """Test that file type and count are checked before extraction."""
+        form = PodcastForm(
+            self.podcast_data(), {'notes_files': [SimpleUploadedFile('slides.pptx', b'x')]}, user=user
+        )
+        assert 'notes_files' in form.errors
+
+        files = [SimpleUploadedFile(f'{n}.txt', b'x') for n in range(11)]
+        form = PodcastForm(self.podcast_data(), {'notes_files': files}, user=user)
+        assert 'notes_files' in form.errors
+
+    def test_only_uncached_files_are_extracted_concurrently(self, monkeypatch):
+        """Test that cache hits skip the pool and results keep their order."""
+        cached_extract_texts([SimpleUploadedFile('a.txt', b'alpha')])
+        extracted = []
+        real_extract = extraction_cache.extract_text_from_file
+
+        def extract(file_obj, report):
+            extracted.append(file_obj.name)
+            return real_extract(file_obj, report)
+
+        monkeypatch.setattr(extraction_cache, 'extract_text_from_file', extract)
+        results = cached_extract_texts([
+            SimpleUploadedFile('a.txt', b'alpha'),
+            SimpleUploadedFile('b.txt', b'beta'),
+            SimpleUploadedFile('c.txt', b'gamma'),
+        ], max_workers=2)
+
+        assert sorted(extracted) == ['b.txt', 'c.txt']
+        assert [text for _, text in results] == ['alpha', 'beta', 'gamma']
+        assert [report.cached for report, _ in results] == [True, False, False]
+
+    def test_study_notes_use_uploaded_material(self, authenticated_client, user, monkeypatch):
+        """Test that study notes keep the uploaded text and send it to the model."""
+        response = authenticated_client.post(reverse('study_notes_create'), {
+            'topic': 'Genetics',
+            'detail_level': 'basic',
+            'notes_files': [SimpleUploadedFile('reading.txt', b'Alleles come in pairs.')],
+        })
+
+        note = StudyNotes.objects.get(user=user)
+        assert response.status_code == 302
+        assert 'Alleles come in pairs.' in note.source_text
+
+        monkeypatch.setattr(podcast_service, 'get_client', lambda: mock.Mock())
+        with mock.patch.object(podcast_service, 'cached_completion', return_value='Notes') as completion:
+            podcast_service.generate_study_notes(note.topic, note.detail_level, source_text=note.source_text)
+        assert 'Alleles come in pairs.' in completion.call_args.kwargs['messages'][1]['content']
@@ -0,0 +1,100 @@
+"""
+Test cases for in-app notifications.
+"""
+import asyncio
+import json
+import pytest
+from django.contrib.auth.models import User
+from django.test import Client
+from django.urls import reverse
+from assignments.models import Course, Assignment, Reminder
+from assignments.notifications import broker, event_stream, poll_changes
+from django.utils import timezone
+from datetime import timedelta
+
+
+@pytest.mark.django_db
+class TestNotifications:
+    """Test cases for the notification broker, poller and stream."""
+
+    @pytest.fixture
+    def user(self):
+        """Create a test user."""
+        return User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+
+    @pytest.fixture
+    def course(self, user):
+        """Create a test course."""
+        return Course.objects.create(
+            course_code='CS101',
+            course_name='Intro to CS',
+            user=user
+        )
+
+    def test_stream_requires_login(self):
+        """Test that the stream redirects anonymous users."""
+        response = Client().get(reverse('api_notification_stream'))
+        assert response.status_code == 302
+
+    def test_stream_is_off_without_asgi(self, user):
+        """Test that with live notifications off the stream ends at once and pages do not open it."""
+        client = Client()
+        client.login(username='testuser', password='testpass123')
+
+        assert client.get(reverse('api_notification_stream')).status_code == 204
+        assert 'EventSource' not in client.get(reverse('dashboard')).content.decode()
+
+    def test_stream_follows_the_setting(self, user, settings):
+        """Test that turning live notifications on takes effect without a restart."""
+        settings.LIVE_NOTIFICATIONS = True
+        client = Client()
+        client.login(username='testuser', password='testpass123')
+
+        response = client.get(reverse('api_notification_stream'))
+
+        assert response.status_code == 200
+        assert response['Content-Type'] == 'text/event-stream'
+
+    def test_published_event_reaches_open_stream(self, user, course):
+        """Test that a published event reaches the owner's open stream."""
+        async def run():
+            stream = event_stream(user.pk, poll_seconds=3600, heartbeat_seconds=5)
+            assert await stream.__anext__() == 'retry: 5000\n\n'
+            assert broker.subscriber_count(user.pk) == 1
+
+            pending = asyncio.ensure_future(stream.__anext__())
+            await asyncio.sleep(0)
+            broker.publish(user.pk, 'assignment.created', {'id': 7, 'title': 'Essay'})
+            frame = await asyncio.wait_for(pending, timeout=5)
+            await stream.aclose()
+            return frame
+
+        frame = asyncio.run(run())
+
+        assert 'event: assignment.created' in frame
+        payload = json.loads(frame.split('data: ', 1)[1])
+        assert payload == {'id': 7, 'title': 'Essay'}
+        assert broker.subscriber_count(user.pk) == 0
+
+    def test_poll_reports_due_and_changed_rows(self, user, course):
+        """Test that the database poll finds due reminders and changed assignments."""
+        since = timezone.now() - timedelta(minutes=1)
+        Reminder.objects.create(
+            title='Study for midterm',
+            reminder_date=timezone.now() - timedelta(seconds=30),
+            user=user
+        )
+        Assignment.objects.create(
+            title='Lab report',
+            course=course,
+            due_date=timezone.now() + timedelta(days=2),
+            user=user
+        )
+
+        events = [message['event'] for message in poll_changes(user.pk, since, timezone.now())]
+
+        assert events == ['reminder.created', 'reminder.due', 'assignment.created']
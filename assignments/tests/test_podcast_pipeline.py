@@ -0,0 +1,228 @@
+"""
+Test cases for the background podcast generation pipeline.
+"""
+import os
+import pytest
+from datetime import timedelta
+from unittest import mock
+from django.contrib.auth.models import User
+from django.test import Client
+from django.urls import reverse
+from assignments import leases
+from assignments.audio_store import collect_garbage
+from assignments.models import AudioBlob, Podcast, Task
+from assignments.podcast_pipeline import attach_blob, queue_generation, run_pipeline
+from assignments.podcast_service import split_script
+from assignments.task_queue import Worker
+
+
+def fake_audio(script, filename):
+    """Stand-in for TTS that writes the segment text as the audio bytes."""
+    with open(filename, 'wb') as audio:
+        audio.write(script.encode())
+    return filename
+
+
+@pytest.mark.django_db
+class TestPodcastPipeline:
+    """Test cases for podcast generation stages and resumption."""
+
+    @pytest.fixture(autouse=True)
+    def media_root(self, settings, tmp_path):
+        """Write generated audio to a temporary directory."""
+        settings.MEDIA_ROOT = tmp_path
+        return tmp_path
+
+    @pytest.fixture(autouse=True)
+    def no_retry_wait(self, monkeypatch):
+        """Retry failed TTS calls without sleeping."""
+        monkeypatch.setattr('assignments.podcast_pipeline.TTS_RETRY_SECONDS', 0)
+
+    @pytest.fixture
+    def user(self):
+        """Create a test user."""
+        return User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+
+    @pytest.fixture
+    def podcast(self, user):
+        """Create a test podcast."""
+        return Podcast.objects.create(
+            title='Cells',
+            topic='Cell biology',
+            notes_text='Mitochondria are the powerhouse of the cell.',
+            user=user
+        )
+
+    def test_pipeline_runs_every_stage(self, podcast):
+        """Test that a queued podcast ends with a script, segments and audio."""
+        script = 'A' * 3000 + '\n\n' + 'B' * 3000
+        with mock.patch('assignments.podcast_pipeline.generate_podcast_script', return_value=script), \
+                mock.patch('assignments.podcast_pipeline.generate_podcast_audio', side_effect=fake_audio):
+            assert queue_generation(podcast)
+            assert run_pipeline(podcast.pk)
+
+        podcast.refresh_from_db()
+        assert podcast.generation_status == 'done'
+        assert podcast.is_audio_generated
+        assert podcast.segments.count() == 2
+        with open(podcast.audio_file.path, 'rb') as audio:
+            assert audio.read() == b'A' * 3000 + b'B' * 3000
+
+    def test_run_that_lost_its_lease_stops(self, podcast):
+        """Test that a run whose lease another run has taken writes nothing more."""
+        def slow_script(**kwargs):
+            # The run stalls past its lease and another worker claims the podcast
+            Podcast.objects.filter(pk=podcast.pk).update(lease_owner='worker-b')
+            return 'A' * 100
+
+        assert queue_generation(podcast)
+        with leases.single_flight(podcast, 600, owner='worker-a'), \
+                mock.patch('assignments.podcast_pipeline.generate_podcast_script', side_effect=slow_script), \
+                mock.patch('assignments.podcast_pipeline.generate_podcast_audio', side_effect=fake_audio) as audio:
+            with pytest.raises(leases.LeaseLost):
+                run_pipeline(podcast.pk)
+
+        podcast.refresh_from_db()
+        assert podcast.lease_owner == 'worker-b'
+        assert podcast.script != 'A' * 100
+        assert podcast.resume_stage == 'script'
+        assert podcast.generation_status == 'script'
+        assert not podcast.segments.exists()
+        assert not audio.called
+
+        podcast.lease_owner = 'worker-a'
+        with pytest.raises(leases.LeaseLost):
+            attach_blob(podcast, [], None)
+
+    def test_failed_run_resumes_without_rewriting_script(self, podcast):
+        """Test that a TTS failure keeps the script and resumes at synthesis."""
+        script = mock.Mock(return_value='Intro\n\nOutro')
+        with mock.patch('assignments.podcast_pipeline.generate_podcast_script', script), \
+                mock.patch('assignments.podcast_pipeline.generate_podcast_audio', side_effect=Exception('TTS down')):
+            queue_generation(podcast)
+            assert not run_pipeline(podcast.pk)
+
+        podcast.refresh_from_db()
+        assert podcast.generation_status == 'failed'
+        assert podcast.resume_stage == 'synthesizing'
+        assert podcast.script == 'Intro\n\nOutro'
+        assert 'TTS down' in podcast.generation_error
+
+        with mock.patch('assignments.podcast_pipeline.generate_podcast_script', script), \
+                mock.patch('assignments.podcast_pipeline.generate_podcast_audio', side_effect=fake_audio):
+            assert queue_generation(podcast)
+            assert run_pipeline(podcast.pk)
+
+        assert script.call_count == 1
+        podcast.refresh_from_db()
+        assert podcast.generation_status == 'done'
+
+    def test_generate_view_queues_once(self, user, podcast):
+        """Test that the generate view returns at once and ignores duplicate requests."""
+        client = Client()
+        client.login(username='testuser', password='testpass123')
+
+        client.post(reverse('podcast_generate', args=[podcast.pk]))
+        client.post(reverse('podcast_generate', args=[podcast.pk]))
+
+        assert Task.objects.filter(name='podcast.generate', payload={'podcast_id': podcast.pk}).count() == 1
+        status = client.get(reverse('podcast_status', args=[podcast.pk])).json()
+        assert status['status'] == 'queued'
+
+    def test_split_script_on_markers_and_sentences(self):
+        """Test that markers end segments and long paragraphs split at sentences."""
+        script = '[INTRO MUSIC]\nWelcome.\n\nToday: cells.\n[PAUSE]\n' + 'One sentence here. ' * 10 + '\n[OUTRO MUSIC]'
+
+        segments = split_script(script, max_chars=60)
+
+        assert segments[0] == 'Welcome.\n\nToday: cells.'
+        assert all('[' not in segment for segment in segments)
+        assert all(len(segment) <= 60 for segment in segments)
+        assert all(segment.endswith('.') for segment in segments)
+        assert ' '.join(segments[1:]) == ('One sentence here. ' * 10).strip()
+
+    def test_segments_retry_and_synthesize_concurrently(self, podcast, monkeypatch):
+        """Test that a flaky segment is retried without losing the other segments."""
+        monkeypatch.setattr('assignments.podcast_pipeline.TTS_CONCURRENCY', 3)
+        failures = {'B'}
+
+        def flaky_audio(script, filename):
+            if script[0] in failures:
+                failures.discard(script[0])
+                raise Exception('timeout')
+            return fake_audio(script, filename)
+
+        script = '\n[PAUSE]\n'.join(letter * 100 for letter in 'ABC')
+        with mock.patch('assignments.podcast_pipeline.generate_podcast_script', return_value=script), \
+                mock.patch('assignments.podcast_pipeline.generate_podcast_audio', side_effect=flaky_audio):
+            queue_generation(podcast)
+            assert run_pipeline(podcast.pk)
+
+        podcast.refresh_from_db()
+        assert podcast.segments.count() == 3
+        with open(podcast.audio_file.path, 'rb') as audio:
+            assert audio.read() == b'A' * 100 + b'B' * 100 + b'C' * 100
+
+    def test_identical_scripts_share_stored_audio(self, user, podcast):
+        """Test that a second podcast with the same script reuses every audio file."""
+        other = Podcast.objects.create(title='Copy', topic='Cell biology', notes_text='Same', user=user)
+        script = 'Intro\n[PAUSE]\nOutro'
+        audio = mock.Mock(side_effect=fake_audio)
+
+        with mock.patch('assignments.podcast_pipeline.generate_podcast_script', return_value=script), \
+                mock.patch('assignments.podcast_pipeline.generate_podcast_audio', audio):
+            for item in (podcast, other):
+                queue_generation(item)
+                assert run_pipeline(item.pk)
+
+        podcast.refresh_from_db()
+        other.refresh_from_db()
+        assert audio.call_count == 2
+        assert podcast.audio_file.name == other.audio_file.name
+        assert podcast.audio_blob.refcount == 2
+        assert AudioBlob.objects.filter(kind='segment', refcount=2).count() == 2
+
+    def test_unused_audio_is_collected(self, podcast):
+        """Test that deleting a podcast releases its audio for garbage collection."""
+        with mock.patch('assignments.podcast_pipeline.generate_podcast_script', return_value='Only'), \
+                mock.patch('assignments.podcast_pipeline.generate_podcast_audio', side_effect=fake_audio):
+            queue_generation(podcast)
+            run_pipeline(podcast.pk)
+        podcast.refresh_from_db()
+        audio_path = podcast.audio_file.path
+
+        assert collect_garbage(timedelta(0)) == (0, 0)
+        podcast.delete()
+        assert collect_garbage(timedelta(hours=1))[0] == 0
+        assert collect_garbage(timedelta(0))[0] == 2
+        assert not os.path.exists(audio_path)
+        assert not AudioBlob.objects.exists()
+
+    def test_edited_script_resynthesizes_only_changed_segments(self, user, podcast):
+        """Test that editing one part of the script re-records only that part."""
+        script = mock.Mock(return_value='First part.\n[PAUSE]\nSecond part.\n[PAUSE]\nThird part.')
+        audio = mock.Mock(side_effect=fake_audio)
+        client = Client()
+        client.login(username='testuser', password='testpass123')
+
+        with mock.patch('assignments.podcast_pipeline.generate_podcast_script', script), \
+                mock.patch('assignments.podcast_pipeline.generate_podcast_audio', audio):
+            queue_generation(podcast)
+            run_pipeline(podcast.pk)
+
+            response = client.post(reverse('podcast_edit_script', args=[podcast.pk]), {
+                'script': 'First part.\n[PAUSE]\nSecond part, revised.\n[PAUSE]\nThird part.',
+            })
+            assert response.status_code == 302
+            Worker(poll_interval=0).run(burst=True)
+
+        podcast.refresh_from_db()
+        assert podcast.generation_status == 'done'
+        assert script.call_count == 1
+        assert [call.args[0] for call in audio.call_args_list][3:] == ['Second part, revised.']
+        with open(podcast.audio_file.path, 'rb') as audio_file:
+            assert audio_file.read() == b'First part.Second part, revised.Third part.'
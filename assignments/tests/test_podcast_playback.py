@@ -0,0 +1,160 @@
+"""
+Test cases for playing podcast segments while the rest are still synthesizing.
+"""
+import pytest
+from django.contrib.auth.models import User
+from django.test import Client
+from django.urls import reverse
+from assignments import audio_store, podcast_playback
+from assignments.models import Podcast
+from assignments.podcast_pipeline import attach_blob, stage_segmenting
+from assignments.podcast_service import script_offsets, split_script
+
+# One MPEG-1 Layer III frame at 128 kbps / 44.1 kHz: 417 bytes, 1152 samples
+FRAME = b'\xff\xfb\x90\x00' + bytes(413)
+FRAME_SECONDS = 1152 / 44100
+
+SCRIPT = (
+    'Welcome to Cells.\n\n'
+    '[INTRO MUSIC]\n\n'
+    'Mitochondria make ATP for the cell.\n\n'
+    '[PAUSE]\n\n'
+    'Ribosomes build proteins.\n\n'
+    '[OUTRO MUSIC]'
+)
+
+
+@pytest.mark.django_db
+class TestPodcastPlayback:
+    """Test cases for the segment index, the growing playlist and the podcast page."""
+
+    @pytest.fixture(autouse=True)
+    def media_root(self, settings, tmp_path):
+        """Write audio to a temporary directory."""
+        settings.MEDIA_ROOT = tmp_path
+        return tmp_path
+
+    @pytest.fixture
+    def user(self):
+        """Create a test user."""
+        return User.objects.create_user(username='testuser', password='testpass123')
+
+    @pytest.fixture
+    def client(self, user):
+        """Log the test user in."""
+        client = Client()
+        client.login(username='testuser', password='testpass123')
+        return client
+
+    @pytest.fixture
+    def podcast(self, user):
+        """Create a podcast whose three segments are waiting to be synthesized."""
+        podcast = Podcast.objects.create(
+            title='Cells', topic='Cell biology', notes_text='Cells.', user=user, script=SCRIPT,
+            is_generated=True, generation_status='synthesizing', resume_stage='synthesizing',
+        )
+        stage_segmenting(podcast)
+        return podcast
+
+    def synthesize(self, podcast, position, frames):
+        """Give one segment audio ``frames`` mp3 frames long."""
+        segment = podcast.segments.get(position=position)
+
+        def write(tmp_path):
+            with open(tmp_path, 'wb') as audio:
+                audio.write(FRAME * frames)
+
+        path = audio_store.write_blob(segment.text_hash, write)
+        attach_blob(podcast, [segment], audio_store.register(segment.text_hash, path))
+
+    def test_mp3_duration_counts_frames(self, tmp_path):
+        """Test that an mp3's length is read from its frames, after any ID3 tag."""
+        path = tmp_path / 'tagged.mp3'
+        path.write_bytes(b'ID3\x04\x00\x00\x00\x00\x00\x05' + bytes(5) + FRAME * 100)
+
+        assert audio_store.mp3_duration(path) == pytest.approx(100 * FRAME_SECONDS)
+
+    def test_script_offsets_point_at_each_segment(self):
+        """Test that every segment is located where its text starts in the script."""
+        segments = split_script(SCRIPT)
+
+        offsets = script_offsets(SCRIPT, segments)
+
+        assert [SCRIPT[offset:offset + len(text)] for text, offset in zip(segments, offsets)] == segments
+
+    def test_playlist_grows_in_order(self, podcast):
+        """Test that only the finished run of segments from the start is playable."""
+        self.synthesize(podcast, 0, 40)
+        self.synthesize(podcast, 2, 20)
+
+        index = podcast_playback.segment_index(podcast)
+        assert [entry['ready'] for entry in index] == [True, False, True]
+        assert [entry['start'] is not None for entry in index] == [True, False, False]
+        playlist = podcast_playback.render_playlist(index, lambda entry: f"/seg/{entry['position']}")
+        assert '/seg/0' in playlist and '/seg/2' not in playlist
+        assert '#EXT-X-ENDLIST' not in playlist
+
+        self.synthesize(podcast, 1, 30)
+
+        index = podcast_playback.segment_index(podcast)
+        assert index[2]['start'] == pytest.approx(70 * FRAME_SECONDS, abs=0.001)
+        playlist = podcast_playback.render_playlist(index, lambda entry: f"/seg/{entry['position']}")
+        assert playlist.count('#EXTINF:') == 3
+        assert playlist.endswith('#EXT-X-ENDLIST\n')
+
+    def test_segments_are_hidden_while_being_rebuilt(self, podcast):
+        """Test that segments of the old script are not offered while new ones are made."""
+        self.synthesize(podcast, 0, 40)
+        Podcast.objects.filter(pk=podcast.pk).update(generation_status='segmenting', resume_stage='segmenting')
+        podcast.refresh_from_db()
+
+        assert podcast_playback.segment_index(podcast) == []
+
+    def test_playlist_and_segment_endpoints(self, client, podcast):
+        """Test that the playlist links to segment audio the owner can fetch with ranges."""
+        self.synthesize(podcast, 0, 40)
+
+        playlist = client.get(reverse('podcast_playlist', args=[podcast.pk]))
+        segment_url = [line for line in playlist.content.decode().splitlines() if not line.startswith('#')][0]
+        audio = client.get(segment_url, HTTP_RANGE='bytes=0-416')
+        index = client.get(reverse('podcast_segments', args=[podcast.pk])).json()
+
+        assert playlist['Content-Type'] == 'application/vnd.apple.mpegurl'
+        assert 'no-cache' in playlist['Cache-Control']
+        assert audio.status_code == 206
+        assert b''.join(audio.streaming_content) == FRAME
+        assert index['segments'][0]['url'] == segment_url
+        assert index['segments'][1]['url'] is None
+        assert client.get(reverse('podcast_segment_audio', args=[podcast.pk, 1])).status_code == 404
+
+    def test_versioned_segment_urls_are_immutable(self, client, podcast):
+        """Test that a segment URL is cached for good, and stops resolving when the audio changes."""
+        self.synthesize(podcast, 0, 40)
+        url = client.get(reverse('podcast_segments', args=[podcast.pk])).json()['segments'][0]['url']
+
+        current = client.get(url)
+        stale = client.get(reverse('podcast_segment_audio', args=[podcast.pk, 0]), {'v': 'old'})
+
+        assert 'immutable' in current['Cache-Control']
+        assert stale.status_code == 404
+
+    def test_page_offers_early_playback_and_script_sections(self, client, podcast):
+        """Test that the podcast page can play the first segment and lists script sections."""
+        self.synthesize(podcast, 0, 40)
+
+        response = client.get(reverse('podcast_detail', args=[podcast.pk]))
+
+        assert response.context['can_play_early']
+        content = response.content.decode()
+        assert '<div class="mb-4" id="earlyPlayback">' in content
+        assert content.count('class="script-section"') == 3
+
+    def test_other_users_segments_are_not_found(self, podcast):
+        """Test that segment audio and the playlist are only served to the owner."""
+        self.synthesize(podcast, 0, 40)
+        User.objects.create_user(username='other', password='testpass123')
+        other = Client()
+        other.login(username='other', password='testpass123')
+
+        assert other.get(reverse('podcast_segment_audio', args=[podcast.pk, 0])).status_code == 404
+        assert other.get(reverse('podcast_playlist', args=[podcast.pk])).status_code == 404
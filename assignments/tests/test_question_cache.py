@@ -0,0 +1,145 @@
+"""
+Test cases for the near-duplicate chatbot question cache.
+"""
+import pytest
+from datetime import timedelta
+from unittest import mock
+from django.contrib.auth.models import User
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+from assignments import question_cache
+from assignments.llm_cache import reset_stats
+from assignments.models import ChatMessage, ChatThread, Course, LLMCacheEntry, QuestionBand, QuestionSignature
+
+
+def fake_async_client(content):
+    """Build an AsyncOpenAI stand-in that answers with ``content``."""
+    async def create(**kwargs):
+        return mock.Mock(choices=[mock.Mock(message=mock.Mock(content=content))])
+
+    client = mock.Mock()
+    client.chat.completions.create = mock.Mock(side_effect=create)
+    return client
+
+
+@pytest.mark.django_db
+class TestQuestionCache:
+    """Test cases for signatures, lookups and reuse in the chatbot."""
+
+    @pytest.fixture(autouse=True)
+    def empty_caches(self):
+        """Start each test with empty answer caches."""
+        LLMCacheEntry.objects.all().delete()
+        QuestionSignature.objects.all().delete()
+        reset_stats()
+
+    @pytest.fixture
+    def user(self):
+        """Create a test user."""
+        return User.objects.create_user(username='testuser', password='testpass123')
+
+    @pytest.fixture
+    def client(self, user):
+        """Log the test user in."""
+        client = Client()
+        client.login(username='testuser', password='testpass123')
+        return client
+
+    def remember(self, user, question, scope='scope', response='Answer.'):
+        """Save an answered question and index it."""
+        thread = ChatThread.objects.create(user=user, title=question)
+        message = ChatMessage.objects.create(user=user, thread=thread, question=question, response=response)
+        question_cache.remember(message, scope)
+        return message
+
+    def test_paraphrase_matches(self, user):
+        """Test that a reworded question finds the earlier one."""
+        message = self.remember(user, 'How do I manage my time for finals week')
+
+        match = question_cache.find_similar('How should I manage my time for finals week?', 'scope')
+
+        assert match[0] == message
+        assert match[1] >= question_cache.THRESHOLD
+        assert QuestionBand.objects.filter(signature__message=message).count() == question_cache.BANDS
+
+    def test_unrelated_question_and_other_scope_miss(self, user):
+        """Test that different questions and different contexts are never matched."""
+        self.remember(user, 'How do I manage my time for finals week')
+
+        assert question_cache.find_similar('What is a good way to memorize chemistry formulas?', 'scope') is None
+        assert question_cache.find_similar('How do I manage my time for finals week', 'other') is None
+
+    def test_signature_similarity_tracks_overlap(self):
+        """Test that identical text has identical signatures and empty text has none."""
+        first = question_cache.signature('study plan for calculus exam')
+
+        assert question_cache.similarity(first, question_cache.signature('Study plan for calculus exam!')) == 1.0
+        assert question_cache.similarity(first, question_cache.signature('essay outline history')) < 0.2
+        assert question_cache.signature('how do I?') is None
+
+    def test_prune_drops_old_signatures(self, user):
+        """Test that signatures past the TTL are ignored and pruned."""
+        old = self.remember(user, 'How do I manage my time for finals week')
+        QuestionSignature.objects.filter(message=old).update(created_at=timezone.now() - timedelta(days=60))
+        self.remember(user, 'Best way to write a lab report')
+
+        assert question_cache.find_similar('How do I manage my time for finals week', 'scope') is None
+        assert question_cache.prune(timedelta(days=30)) == 1
+        assert not QuestionBand.objects.filter(signature__message=old).exists()
+
+    def test_chatbot_reuses_answer_to_similar_question(self, user, client):
+        """Test that a reworded opening question is answered without calling the model."""
+        openai = fake_async_client('Make a revision timetable.')
+
+        with mock.patch('assignments.views_chat.get_async_client', return_value=openai):
+            client.post(reverse('chatbot_ask'), {'question': 'How do I manage my time for finals week'})
+            client.post(reverse('chatbot_ask'), {'question': 'How should I manage my time for finals week?'})
+
+        assert openai.chat.completions.create.call_count == 1
+        first, second = ChatMessage.objects.filter(user=user).order_by('pk')
+        assert second.response == 'Make a revision timetable.'
+        assert second.reused_from == first
+        assert second.thread != first.thread
+
+        response = client.get(f"{reverse('chatbot_ask')}?thread={second.thread_id}")
+        assert 'Reused from an answer to a similar question' in response.content.decode()
+
+    def test_fresh_answer_skips_caches(self, user, client):
+        """Test that asking for a fresh answer always calls the model."""
+        openai = fake_async_client('Make a revision timetable.')
+
+        with mock.patch('assignments.views_chat.get_async_client', return_value=openai):
+            client.post(reverse('chatbot_ask'), {'question': 'How do I manage my time for finals week'})
+            client.post(reverse('chatbot_ask'), {'question': 'How do I manage my time for finals week', 'fresh': 'on'})
+
+        assert openai.chat.completions.create.call_count == 2
+        assert not ChatMessage.objects.filter(user=user, reused_from__isnull=False).exists()
+
+    def test_follow_up_is_not_reused(self, user, client):
+        """Test that a follow-up in a thread is answered in context, not from the cache."""
+        self.remember(user, 'Which ones?', scope=question_cache.scope_key(''))
+        openai = fake_async_client('Start with past papers.')
+
+        with mock.patch('assignments.views_chat.get_async_client', return_value=openai):
+            client.post(reverse('chatbot_ask'), {'question': 'How do I revise for finals?'})
+            thread = ChatThread.objects.filter(user=user).latest('pk')
+            client.post(reverse('chatbot_ask'), {'question': 'Which ones?', 'thread': thread.pk})
+
+        assert openai.chat.completions.create.call_count == 2
+        assert thread.messages.filter(reused_from__isnull=False).count() == 0
+        assert not QuestionSignature.objects.filter(message__thread=thread, message__question='Which ones?').exists()
+
+    def test_other_users_with_different_context_miss(self, user, client):
+        """Test that an answer written with one student's courses is not served to another."""
+        Course.objects.create(user=user, course_code='BIO1', course_name='Biology')
+        User.objects.create_user(username='other', password='testpass123')
+        other = Client()
+        other.login(username='other', password='testpass123')
+        openai = fake_async_client('Make a revision timetable.')
+
+        with mock.patch('assignments.views_chat.get_async_client', return_value=openai):
+            client.post(reverse('chatbot_ask'), {'question': 'How do I manage my time for finals week'})
+            other.post(reverse('chatbot_ask'), {'question': 'How do I manage my time for finals week?'})
+
+        assert openai.chat.completions.create.call_count == 2
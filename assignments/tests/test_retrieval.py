@@ -0,0 +1,135 @@
+"""
+Test cases for the local retrieval index over users' own material.
+"""
+import pytest
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+from assignments import retrieval
+from assignments.llm_cache import reset_stats
+from assignments.models import Assignment, Course, LLMCacheEntry, Podcast, RetrievalChunk, StudyNotes
+
+
+def fake_async_client(content):
+    """Build an AsyncOpenAI stand-in that answers with ``content``."""
+    async def create(**kwargs):
+        return mock.Mock(choices=[mock.Mock(message=mock.Mock(content=content))])
+
+    client = mock.Mock()
+    client.chat.completions.create = mock.Mock(side_effect=create)
+    return client
+
+
+@pytest.mark.django_db
+class TestRetrieval:
+    """Test cases for chunking, incremental updates and search."""
+
+    @pytest.fixture
+    def user(self):
+        """Create a test user."""
+        return User.objects.create_user(username='testuser', password='testpass123')
+
+    @pytest.fixture
+    def notes(self, user):
+        """Create study notes on two different topics."""
+        return [
+            StudyNotes.objects.create(
+                user=user, topic='Photosynthesis',
+                content='Chlorophyll absorbs light in the chloroplast.\n\nThe Calvin cycle fixes carbon dioxide into sugar.',
+            ),
+            StudyNotes.objects.create(
+                user=user, topic='French Revolution',
+                content='The storming of the Bastille happened in 1789.\n\nThe Estates-General met at Versailles.',
+            ),
+        ]
+
+    def test_saved_material_is_searchable(self, user, notes, monkeypatch):
+        """Test that saving study notes indexes them and search finds the right chunk."""
+        monkeypatch.setattr(retrieval, 'CHUNK_CHARS', 60)
+        notes[0].content += '\n\nLeaves are green.'
+        notes[0].save()
+
+        results = retrieval.search(user.pk, 'What does the Calvin cycle do with carbon dioxide?')
+
+        assert results[0][0].source_type == 'study_notes'
+        assert results[0][0].source_id == notes[0].pk
+        assert 'Calvin cycle' in results[0][0].text
+        assert all(chunk.source_id != notes[1].pk for chunk, score in results)
+
+    def test_unchanged_and_unrelated_saves_do_not_reindex(self, user, notes):
+        """Test that re-saving the same text or other fields leaves the chunks alone."""
+        chunk_ids = set(RetrievalChunk.objects.values_list('pk', flat=True))
+
+        notes[0].save()
+        notes[0].is_generated = True
+        notes[0].save(update_fields=['is_generated'])
+        assert set(RetrievalChunk.objects.values_list('pk', flat=True)) == chunk_ids
+
+        notes[0].content = 'Stomata let carbon dioxide into the leaf.'
+        notes[0].save()
+        assert retrieval.search(user.pk, 'stomata leaf')[0][0].source_id == notes[0].pk
+
+    def test_podcasts_and_assignments_are_indexed_and_removed(self, user):
+        """Test that every source type is indexed and deleted sources are dropped."""
+        podcast = Podcast.objects.create(
+            user=user, title='Cells', topic='Cells', notes_text='Mitochondria make ATP.', script='Welcome to the ribosome show.'
+        )
+        course = Course.objects.create(user=user, course_code='BIO1', course_name='Biology')
+        assignment = Assignment.objects.create(
+            user=user, course=course, title='Lab report', description='Measure enzyme kinetics.', due_date=timezone.now()
+        )
+
+        types = set(RetrievalChunk.objects.filter(user=user).values_list('source_type', flat=True))
+        assert types == {'podcast_notes', 'podcast_script', 'assignment'}
+
+        podcast.delete()
+        assignment.delete()
+        assert not RetrievalChunk.objects.filter(user=user).exists()
+
+    def test_search_is_scoped_to_user(self, user, notes):
+        """Test that one user's material never answers another's questions."""
+        other = User.objects.create_user(username='other', password='testpass123')
+
+        assert retrieval.search(other.pk, 'Calvin cycle carbon dioxide') == []
+
+    def test_matrix_is_cached_until_chunks_change(self, user, notes):
+        """Test that repeated searches reuse the stacked matrix."""
+        first = retrieval.user_matrix(user.pk)[1]
+        assert retrieval.user_matrix(user.pk)[1] is first
+
+        StudyNotes.objects.create(user=user, topic='Genetics', content='Alleles come in pairs.')
+        assert retrieval.user_matrix(user.pk)[1].shape[0] == first.shape[0] + 1
+
+    def test_vectors_are_compact_and_normalized(self):
+        """Test that vectors are unit-length float32 of the configured size."""
+        vector = retrieval.vectorize('Cells divide by mitosis and meiosis.')
+
+        assert vector.dtype.name == 'float32'
+        assert vector.shape == (retrieval.DIMENSIONS,)
+        assert abs(float((vector ** 2).sum()) - 1) < 1e-5
+
+    def test_rebuild_command(self, user, notes):
+        """Test that the rebuild command re-indexes existing material."""
+        RetrievalChunk.objects.all().delete()
+
+        call_command('rebuild_retrieval_index', stdout=mock.Mock())
+
+        assert RetrievalChunk.objects.filter(source_type='study_notes').count() == 2
+
+    def test_chatbot_prompt_includes_matching_notes(self, user, notes):
+        """Test that the chatbot is given the student's matching notes."""
+        LLMCacheEntry.objects.all().delete()
+        reset_stats()
+        client = Client()
+        client.login(username='testuser', password='testpass123')
+        openai = fake_async_client('It fixes carbon.')
+
+        with mock.patch('assignments.views_chat.get_async_client', return_value=openai):
+            client.post(reverse('chatbot_ask'), {'question': 'Explain the Calvin cycle'})
+
+        system_prompt = openai.chat.completions.create.call_args.kwargs['messages'][0]['content']
+        assert 'The Calvin cycle fixes carbon dioxide into sugar.' in system_prompt
+        assert 'Bastille' not in system_prompt
@@ -0,0 +1,172 @@
+"""
+Test cases for the send_reminders management command.
+"""
+import pytest
+from io import StringIO
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.mail import send_mail
+from django.core.management import call_command
+from assignments.models import Course, Assignment, ReminderDispatch
+from django.utils import timezone
+from datetime import timedelta
+
+
+@pytest.mark.django_db
+class TestSendReminders:
+    """Test cases for reminder dispatching."""
+
+    @pytest.fixture
+    def user(self):
+        """Create a test user."""
+        return User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+
+    @pytest.fixture
+    def course(self, user):
+        """Create a test course."""
+        return Course.objects.create(
+            course_code='CS101',
+            course_name='Intro to CS',
+            user=user
+        )
+
+    def run_command(self, *args):
+        """Run send_reminders and return its output."""
+        out = StringIO()
+        call_command('send_reminders', *args, stdout=out)
+        return out.getvalue()
+
+    def test_sends_one_email_per_window(self, user, course):
+        """Test that each window sends a single grouped email."""
+        for days in (0.5, 0.75, 3):
+            Assignment.objects.create(
+                title=f'Due in {days} days',
+                course=course,
+                due_date=timezone.now() + timedelta(days=days),
+                user=user
+            )
+
+        self.run_command()
+
+        assert len(mail.outbox) == 2
+        assert '2 assignment(s) due tomorrow' in mail.outbox[0].subject
+        assert '1 assignment(s) coming up this week' in mail.outbox[1].subject
+        assert ReminderDispatch.objects.filter(user=user, sent_at__isnull=False).count() == 2
+
+    def test_second_run_does_not_resend(self, user, course):
+        """Test that a reminder already sent today is not sent again."""
+        Assignment.objects.create(
+            title='Homework',
+            course=course,
+            due_date=timezone.now() + timedelta(hours=12),
+            user=user
+        )
+
+        self.run_command()
+        self.run_command()
+
+        assert len(mail.outbox) == 1
+
+    def test_live_lease_is_skipped_and_expired_lease_is_reclaimed(self, user, course):
+        """Test that leases held by other workers are respected until they expire."""
+        Assignment.objects.create(
+            title='Homework',
+            course=course,
+            due_date=timezone.now() + timedelta(hours=12),
+            user=user
+        )
+        dispatch = ReminderDispatch.objects.create(
+            user=user,
+            window='24_hours',
+            send_date=timezone.localdate(),
+            lease_owner='other-worker',
+            lease_expires_at=timezone.now() + timedelta(minutes=5),
+        )
+
+        self.run_command()
+        assert len(mail.outbox) == 0
+
+        dispatch.lease_expires_at = timezone.now() - timedelta(seconds=1)
+        dispatch.save()
+
+        self.run_command()
+        assert len(mail.outbox) == 1
+
+    def test_sharding_falls_back_on_sqlite(self, user, course):
+        """Test that sharding is ignored where SKIP LOCKED is unavailable."""
+        Assignment.objects.create(
+            title='Homework',
+            course=course,
+            due_date=timezone.now() + timedelta(hours=12),
+            user=user
+        )
+        other_shard = (user.pk + 1) % 2
+
+        # SQLite falls back to single-process mode and ignores sharding
+        output = self.run_command('--shard-count', '2', '--shard-index', str(other_shard))
+
+        assert 'single-process mode' in output
+        assert len(mail.outbox) == 1
+
+    def test_dry_run_renders_without_sending(self, user, course):
+        """Test that a dry run renders reminders but sends and records nothing."""
+        Assignment.objects.create(
+            title='Homework',
+            course=course,
+            due_date=timezone.now() + timedelta(hours=12),
+            user=user
+        )
+
+        output = self.run_command('--dry-run', '--benchmark', '--workers', '0')
+
+        assert 'Dry run complete: 1 reminder(s) rendered' in output
+        assert 'emails/s' in output
+        assert len(mail.outbox) == 0
+        assert not ReminderDispatch.objects.exists()
+
+    def test_process_pool_renders_every_user(self, user, course):
+        """Test that emails rendered in worker processes reach every user."""
+        other = User.objects.create_user(username='other', email='other@example.com', password='testpass123')
+        for owner in (user, other):
+            Assignment.objects.create(
+                title=f'Homework for {owner.username}',
+                course=course,
+                due_date=timezone.now() + timedelta(hours=12),
+                user=owner
+            )
+
+        self.run_command('--workers', '2', '--max-pending', '1')
+
+        assert sorted(message.to[0] for message in mail.outbox) == ['other@example.com', 'test@example.com']
+        assert 'Homework for testuser' in mail.outbox[0].alternatives[0][0] + mail.outbox[1].alternatives[0][0]
+
+    def test_reminder_taken_over_mid_batch_is_not_sent_twice(self, user, course):
+        """Test that a reminder whose lease another worker took while the batch ran is left to it."""
+        other = User.objects.create_user(username='other', email='other@example.com', password='testpass123')
+        for owner in (user, other):
+            Assignment.objects.create(
+                title=f'Homework for {owner.username}',
+                course=course,
+                due_date=timezone.now() + timedelta(hours=12),
+                user=owner
+            )
+
+        def slow_send(*args, **kwargs):
+            # While the first email goes out, the second lease expires and another worker claims it
+            ReminderDispatch.objects.filter(user=other).update(
+                lease_owner='other-worker', lease_expires_at=timezone.now() + timedelta(minutes=5)
+            )
+            return send_mail(*args, **kwargs)
+
+        with mock.patch('assignments.management.commands.send_reminders.send_mail', side_effect=slow_send):
+            self.run_command('--workers', '0', '--batch-size', '10')
+
+        assert [message.to[0] for message in mail.outbox] == ['test@example.com']
+        taken = ReminderDispatch.objects.get(user=other)
+        assert taken.sent_at is None
+        assert taken.lease_owner == 'other-worker'
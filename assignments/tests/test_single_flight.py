@@ -0,0 +1,161 @@
+"""
+Test cases for single-flight generation of podcasts and study notes.
+"""
+import pytest
+from datetime import timedelta
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+from assignments import leases
+from assignments.models import Podcast, StudyNotes, Task
+from assignments.podcast_pipeline import queue_generation
+from assignments.tasks import generate_podcast_task, generate_study_notes_task
+
+
+@pytest.mark.django_db
+class TestSingleFlight:
+    """Test cases for generation leases and joining duplicate requests."""
+
+    @pytest.fixture(autouse=True)
+    def clear_queue(self):
+        """Start each test with an empty queue."""
+        Task.objects.all().delete()
+
+    @pytest.fixture
+    def user(self):
+        """Create a test user."""
+        return User.objects.create_user(username='testuser', password='testpass123')
+
+    @pytest.fixture
+    def podcast(self, user):
+        """Create a podcast queued for generation."""
+        return Podcast.objects.create(
+            title='Cells', topic='Cell biology', notes_text='Mitochondria make ATP.', user=user,
+            generation_status='queued', resume_stage='script',
+        )
+
+    def lease_to_other_worker(self, instance, seconds=300):
+        """Make another worker hold the lease on ``instance``."""
+        type(instance).objects.filter(pk=instance.pk).update(
+            lease_owner='other-worker', lease_expires_at=timezone.now() + timedelta(seconds=seconds)
+        )
+
+    def test_only_one_holder_at_a_time(self, podcast):
+        """Test that a held lease is refused until released or expired."""
+        with leases.single_flight(podcast, 60) as first:
+            with leases.single_flight(Podcast.objects.get(pk=podcast.pk), 60) as second:
+                assert (first, second) == (True, False)
+            assert leases.renew(podcast, 120)
+
+        with leases.single_flight(podcast, 60) as again:
+            assert again
+        podcast.refresh_from_db()
+        assert podcast.lease_owner == ''
+
+        self.lease_to_other_worker(podcast, seconds=-1)
+        with leases.single_flight(podcast, 60) as expired:
+            assert expired
+
+    def test_duplicate_podcast_task_does_not_run(self, podcast):
+        """Test that a second task for a podcast being generated leaves it to the first."""
+        self.lease_to_other_worker(podcast)
+
+        with mock.patch('assignments.tasks.run_pipeline') as run_pipeline:
+            generate_podcast_task(podcast_id=podcast.pk)
+
+        assert not run_pipeline.called
+
+    def test_podcast_task_holds_lease_while_running(self, podcast):
+        """Test that the pipeline runs under the task's lease, which is released after."""
+        def run(podcast_id):
+            assert Podcast.objects.get(pk=podcast_id).lease_expires_at > timezone.now()
+            return True
+
+        with mock.patch('assignments.tasks.run_pipeline', side_effect=run) as run_pipeline:
+            generate_podcast_task(podcast_id=podcast.pk)
+
+        assert run_pipeline.called
+        assert Podcast.objects.get(pk=podcast.pk).lease_owner == ''
+
+    def test_podcast_task_that_lost_its_lease_ends_quietly(self, podcast):
+        """Test that losing the lease mid-run is not treated as a failure to retry."""
+        with mock.patch('assignments.tasks.run_pipeline', side_effect=leases.LeaseLost('taken over')):
+            generate_podcast_task(podcast_id=podcast.pk)
+
+    def test_double_click_queues_one_generation(self, user, podcast):
+        """Test that a second Generate click while one is queued does not queue another."""
+        Podcast.objects.filter(pk=podcast.pk).update(generation_status='idle')
+        client = Client()
+        client.login(username='testuser', password='testpass123')
+
+        for _ in range(2):
+            client.post(reverse('podcast_generate', args=[podcast.pk]))
+
+        assert Task.objects.filter(name='podcast.generate').count() == 1
+
+    def test_resubmitted_study_notes_join_pending_run(self, user):
+        """Test that submitting the same study notes twice shares one row and one task."""
+        client = Client()
+        client.login(username='testuser', password='testpass123')
+        data = {'topic': 'Photosynthesis', 'detail_level': 'basic'}
+
+        first = client.post(reverse('study_notes_create'), data)
+        second = client.post(reverse('study_notes_create'), data)
+
+        note = StudyNotes.objects.get(user=user)
+        assert first.url == second.url == reverse('study_notes_detail', args=[note.pk])
+        assert Task.objects.filter(name='study_notes.generate').count() == 1
+
+        note.is_generated = True
+        note.save()
+        client.post(reverse('study_notes_create'), data)
+        assert StudyNotes.objects.filter(user=user).count() == 2
+
+    def test_duplicate_study_notes_task_does_not_run(self, user):
+        """Test that study notes being generated, or already generated, are not generated again."""
+        leased = StudyNotes.objects.create(user=user, topic='Cells')
+        self.lease_to_other_worker(leased)
+        done = StudyNotes.objects.create(user=user, topic='Atoms', content='Done.', is_generated=True)
+
+        with mock.patch('assignments.tasks.generate_study_notes') as generate:
+            generate_study_notes_task(study_notes_id=leased.pk)
+            generate_study_notes_task(study_notes_id=done.pk)
+
+        assert not generate.called
+
+    def test_resume_skips_leased_runs(self, podcast):
+        """Test that a slow run still holding its lease is not resumed a second time."""
+        Podcast.objects.filter(pk=podcast.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+        self.lease_to_other_worker(podcast)
+
+        call_command('resume_podcasts', stdout=mock.Mock())
+
+        podcast.refresh_from_db()
+        assert podcast.generation_status == 'queued'
+        assert not Task.objects.exists()
+
+    def test_resume_skips_queued_runs_with_a_pending_task(self, podcast):
+        """Test that a podcast waiting in the queue (say for its AI budget) is not queued twice."""
+        generate_podcast_task.enqueue(user=podcast.user, podcast_id=podcast.pk)
+        Podcast.objects.filter(pk=podcast.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+
+        call_command('resume_podcasts', stdout=mock.Mock())
+
+        podcast.refresh_from_db()
+        assert podcast.generation_status == 'queued'
+        assert Task.objects.count() == 1
+
+    def test_freshly_queued_run_is_not_stalled(self, podcast):
+        """Test that queueing a run counts as progress for the stall check."""
+        Podcast.objects.filter(pk=podcast.pk).update(
+            generation_status='failed', updated_at=timezone.now() - timedelta(hours=1)
+        )
+        podcast.refresh_from_db()
+
+        assert queue_generation(podcast)
+        call_command('resume_podcasts', stdout=mock.Mock())
+
+        assert not Task.objects.exists()
@@ -0,0 +1,94 @@
+"""
+Test cases for the delta-sync API.
+"""
+import pytest
+from django.contrib.auth.models import User
+from django.test import Client
+from django.urls import reverse
+from assignments.models import Course, Assignment, SyncTombstone
+from django.utils import timezone
+from datetime import timedelta
+
+
+@pytest.mark.django_db
+class TestSyncAPI:
+    """Test cases for api_sync."""
+
+    @pytest.fixture
+    def user(self):
+        """Create a test user."""
+        return User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+
+    @pytest.fixture
+    def course(self, user):
+        """Create a test course."""
+        return Course.objects.create(
+            course_code='CS101',
+            course_name='Intro to CS',
+            user=user
+        )
+
+    @pytest.fixture
+    def authenticated_client(self, user):
+        """Create an authenticated test client."""
+        client = Client()
+        client.login(username='testuser', password='testpass123')
+        return client
+
+    def backdate(self, *objects):
+        """Move rows' updated_at outside the sync overlap window."""
+        for obj in objects:
+            type(obj).objects.filter(pk=obj.pk).update(updated_at=timezone.now() - timedelta(minutes=5))
+
+    def test_full_sync_without_token(self, authenticated_client, course):
+        """Test that the first sync returns every row."""
+        response = authenticated_client.get(reverse('api_sync'))
+        data = response.json()
+
+        assert response.status_code == 200
+        assert data['full'] is True
+        assert [row['course_code'] for row in data['changed']['courses']] == ['CS101']
+        assert data['token']
+
+    def test_delta_returns_only_changes_and_deletions(self, authenticated_client, user, course):
+        """Test that a token sync returns changed rows and tombstones only."""
+        old = Assignment.objects.create(
+            title='Old', course=course, due_date=timezone.now() + timedelta(days=3), user=user
+        )
+        gone = Assignment.objects.create(
+            title='Gone', course=course, due_date=timezone.now() + timedelta(days=3), user=user
+        )
+        self.backdate(course, old, gone)
+        token = authenticated_client.get(reverse('api_sync')).json()['token']
+
+        Assignment.objects.create(
+            title='New', course=course, due_date=timezone.now() + timedelta(days=3), user=user
+        )
+        gone_id = gone.pk
+        gone.delete()
+
+        data = authenticated_client.get(reverse('api_sync'), {'since': token}).json()
+
+        assert data['full'] is False
+        assert data['changed']['courses'] == []
+        assert [row['title'] for row in data['changed']['assignments']] == ['New']
+        assert data['deleted']['assignments'] == [gone_id]
+
+    def test_invalid_token(self, authenticated_client):
+        """Test that a malformed token is rejected."""
+        response = authenticated_client.get(reverse('api_sync'), {'since': 'abc'})
+        assert response.status_code == 400
+
+    def test_out_of_range_token(self, authenticated_client):
+        """Test that a numeric token too large to be a time is rejected, not a server error."""
+        response = authenticated_client.get(reverse('api_sync'), {'since': '99999999999999999999'})
+        assert response.status_code == 400
+
+    def test_deleting_user_leaves_no_tombstones(self, user, course):
+        """Test that account deletion does not record tombstones for its rows."""
+        user.delete()
+        assert not SyncTombstone.objects.exists()
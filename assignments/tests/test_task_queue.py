@@ -0,0 +1,104 @@
+"""
+Test cases for the database-backed task queue.
+"""
+import pytest
+from unittest import mock
+from django.contrib.auth.models import User
+from django.utils import timezone
+from assignments.models import StudyNotes, Task
+from assignments.task_queue import Worker, claim_next, execute, task
+
+calls = []
+
+
+@task('tests.record')
+def record_task(label):
+    """Remember that the task ran."""
+    calls.append(label)
+
+
+@task('tests.flaky', max_attempts=2)
+def flaky_task():
+    """Always fail."""
+    raise ValueError('boom')
+
+
+@pytest.mark.django_db
+class TestTaskQueue:
+    """Test cases for enqueueing, fair ordering and retries."""
+
+    @pytest.fixture(autouse=True)
+    def clear_queue(self):
+        """Start each test with an empty queue."""
+        Task.objects.all().delete()
+        calls.clear()
+
+    @pytest.fixture
+    def users(self):
+        """Create two test users."""
+        return [
+            User.objects.create_user(username=name, password='testpass123')
+            for name in ('heavy', 'light')
+        ]
+
+    def test_users_are_served_fairly(self, users):
+        """Test that a user with a long queue does not block another user's task."""
+        heavy, light = users
+        for index in range(5):
+            record_task.enqueue(user=heavy, label=f'heavy-{index}')
+        record_task.enqueue(user=light, label='light-0')
+
+        Worker(poll_interval=0).run(burst=True)
+
+        assert calls.index('light-0') < calls.index('heavy-2')
+        assert Task.objects.filter(status='succeeded').count() == 6
+
+    def test_priority_runs_first(self, users):
+        """Test that higher priority tasks are claimed before older ones."""
+        record_task.enqueue(user=users[0], label='normal')
+        record_task.enqueue(user=users[0], priority=10, label='urgent')
+
+        Worker(poll_interval=0).run(burst=True)
+
+        assert calls == ['urgent', 'normal']
+
+    def test_failure_is_retried_with_backoff(self, users):
+        """Test that a failing task is rescheduled, then marked failed."""
+        flaky_task.enqueue(user=users[0])
+
+        claimed = claim_next('worker-a')
+        assert execute(claimed) is False
+        queued = Task.objects.get(pk=claimed.pk)
+        assert queued.status == 'pending'
+        assert queued.run_after > timezone.now()
+        assert claim_next('worker-a') is None
+
+        Task.objects.filter(pk=claimed.pk).update(run_after=timezone.now())
+        execute(claim_next('worker-a'))
+        failed = Task.objects.get(pk=claimed.pk)
+        assert failed.status == 'failed'
+        assert failed.attempts == 2
+        assert 'boom' in failed.last_error
+
+    def test_expired_lease_is_reclaimed(self, users):
+        """Test that a task held by a dead worker is picked up again."""
+        record_task.enqueue(user=users[0], label='orphan')
+        claimed = claim_next('worker-a', lease_seconds=60)
+
+        assert claim_next('worker-b') is None
+        Task.objects.filter(pk=claimed.pk).update(lease_expires_at=timezone.now())
+        assert claim_next('worker-b').pk == claimed.pk
+
+    def test_study_notes_failure_is_recorded(self, users):
+        """Test that study notes show an error once generation gives up."""
+        from assignments.tasks import generate_study_notes_task
+        note = StudyNotes.objects.create(user=users[0], topic='Cells', detail_level='intermediate')
+        task_row = generate_study_notes_task.enqueue(user=users[0], study_notes_id=note.pk)
+        Task.objects.filter(pk=task_row.pk).update(max_attempts=1)
+
+        with mock.patch('assignments.tasks.generate_study_notes', side_effect=RuntimeError('LLM down')):
+            Worker(poll_interval=0).run(burst=True)
+
+        note.refresh_from_db()
+        assert not note.is_generated
+        assert 'LLM down' in note.generation_error
@@ -0,0 +1,38 @@
+"""
+Upload handlers that hash files while they stream in.
+
+They replace Django's default memory and temporary-file handlers (see
+``FILE_UPLOAD_HANDLERS``) and set ``content_hash`` (SHA-256 hex) on every
+uploaded file, so the extracted-text cache can be checked without reading
+the file a second time.
+"""
+import hashlib
+
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+
+
+class HashingMixin:
+    """Feed every received chunk into a SHA-256 and attach the digest to the file."""
+
+    def new_file(self, *args, **kwargs):
+        # Set up first: the memory handler raises StopFutureHandlers from new_file
+        self.hasher = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file_obj = super().file_complete(file_size)
+        if file_obj is not None:
+            file_obj.content_hash = self.hasher.hexdigest()
+        return file_obj
+
+
+class HashingMemoryFileUploadHandler(HashingMixin, MemoryFileUploadHandler):
+    """MemoryFileUploadHandler that records the upload's content hash."""
+
+
+class HashingTemporaryFileUploadHandler(HashingMixin, TemporaryFileUploadHandler):
+    """TemporaryFileUploadHandler that records the upload's content hash."""
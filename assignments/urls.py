@@ -5,18 +5,21 @@ from django.urls import path
 from . import views
 from .views_auth import account_view, account_edit
 from .views_learn import (
-    learn_hub, podcast_create, podcast_generate, 
-    podcast_detail, podcast_download, podcast_delete,
+    learn_hub, podcast_create, podcast_generate, podcast_edit_script, podcast_status,
+    podcast_detail, podcast_audio, podcast_download, podcast_delete,
+    podcast_segments, podcast_playlist, podcast_segment_audio,
     study_notes_hub, study_notes_create, study_notes_detail, study_notes_delete
 )
 from .views_chat import (
-    chatbot_hub, chatbot_ask, chatbot_delete_message, chatbot_clear_all
+    chatbot_hub, chatbot_ask, chatbot_stream, chatbot_delete_message, chatbot_clear_all
 )
 from .views_events import (
     events_hub, event_list, event_create, event_detail, event_update, event_delete,
     reminder_list, reminder_create, reminder_detail, reminder_update, reminder_delete,
     reminder_mark_complete, api_upcoming_events, api_upcoming_reminders
 )
+from .views_notifications import notification_stream
+from .views_sync import api_sync
 
 urlpatterns = [
     # Health check
@@ -47,7 +50,13 @@ urlpatterns = [
     path('learn/', learn_hub, name='learn_hub'),
     path('learn/podcast/create/', podcast_create, name='podcast_create'),
     path('learn/podcast/<int:pk>/generate/', podcast_generate, name='podcast_generate'),
+    path('learn/podcast/<int:pk>/script/', podcast_edit_script, name='podcast_edit_script'),
+    path('learn/podcast/<int:pk>/status/', podcast_status, name='podcast_status'),
     path('learn/podcast/<int:pk>/', podcast_detail, name='podcast_detail'),
+    path('learn/podcast/<int:pk>/audio/', podcast_audio, name='podcast_audio'),
+    path('learn/podcast/<int:pk>/segments/', podcast_segments, name='podcast_segments'),
+    path('learn/podcast/<int:pk>/segments/<int:position>/', podcast_segment_audio, name='podcast_segment_audio'),
+    path('learn/podcast/<int:pk>/playlist.m3u8', podcast_playlist, name='podcast_playlist'),
     path('learn/podcast/<int:pk>/download/', podcast_download, name='podcast_download'),
     path('learn/podcast/<int:pk>/delete/', podcast_delete, name='podcast_delete'),
     
@@ -60,6 +69,7 @@ urlpatterns = [
     # Chatbot URLs
     path('chatbot/', chatbot_hub, name='chatbot_hub'),
     path('chatbot/ask/', chatbot_ask, name='chatbot_ask'),
+    path('chatbot/stream/', chatbot_stream, name='chatbot_stream'),
     path('chatbot/<int:pk>/delete/', chatbot_delete_message, name='chatbot_delete'),
     path('chatbot/clear/', chatbot_clear_all, name='chatbot_clear'),
     
@@ -82,5 +92,7 @@ urlpatterns = [
     # API Endpoints
     path('api/upcoming-events/', api_upcoming_events, name='api_upcoming_events'),
     path('api/upcoming-reminders/', api_upcoming_reminders, name='api_upcoming_reminders'),
+    path('api/notifications/stream/', notification_stream, name='api_notification_stream'),
+    path('api/sync/', api_sync, name='api_sync'),
 ]
 
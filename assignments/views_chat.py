@@ -1,24 +1,40 @@
 """
 Views for the chatbot/AI assistant feature.
 """
-from django.shortcuts import render, redirect, get_object_or_404
+import json
+import math
+from asgiref.sync import sync_to_async
+from django.shortcuts import aget_object_or_404, render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.urls import reverse
 from django.utils import timezone
-from openai import OpenAI
-import os
-from .models import ChatMessage, Course, Assignment
+from django.utils.text import Truncator
+from django.views.decorators.http import require_POST
+from . import ai_budget, ai_gateway, llm_cache, question_cache, retrieval
+from .ai_gateway import get_async_client, get_client
+from .chat_memory import build_history
+from .models import ChatMessage, ChatThread, Course, Assignment
 from .forms import ChatForm
+from .llm_cache import acached_completion, cached_completion
 
+CHAT_MODEL = "gpt-3.5-turbo"
+CHAT_MAX_TOKENS = 500
+CHAT_TEMPERATURE = 0.7
 
-def generate_ai_response(question, user_context=""):
-    """Generate AI chatbot response using OpenAI."""
-    api_key = os.getenv('OPENAI_API_KEY')
-    if not api_key:
-        return "Error: OpenAI API key not configured."
-    
-    client = OpenAI(api_key=api_key)
+
+def build_chat_messages(question, user_context="", summary="", history=()):
+    """
+    Build the chat messages sent to the model for a student's question.
     
+    Args:
+        question: The new question
+        user_context: Extra system prompt text about the student
+        summary: Rolling summary of the earlier conversation
+        history: Recent ChatMessage turns to include verbatim, oldest first
+    """
     system_prompt = f"""You are a helpful academic assistant for a student assignment tracker app called Trax. 
 Your role is to help students with:
 - Assignment advice and strategies
@@ -31,20 +47,198 @@ Your role is to help students with:
 Be friendly, supportive, and concise. Keep responses to 2-3 paragraphs max.
 {user_context}"""
     
+    messages = [{"role": "system", "content": system_prompt}]
+    if summary:
+        messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"})
+    for turn in history:
+        messages.append({"role": "user", "content": turn.question})
+        messages.append({"role": "assistant", "content": turn.response})
+    messages.append({"role": "user", "content": question})
+    return messages
+
+
+def course_context(courses):
+    """Describe a user's courses for the system prompt."""
+    names = ", ".join(course.course_name for course in courses)
+    return f"User is taking courses: {names}" if names else ""
+
+
+def notes_context(results):
+    """Quote the parts of the student's own material that match the question."""
+    if not results:
+        return ""
+    excerpts = "\n\n".join(f"[{chunk.title}] {chunk.text}" for chunk, score in results)
+    return f"Relevant excerpts from the student's own notes (use them where they help):\n{excerpts}"
+
+
+async def student_context(user, question):
+    """System prompt context for a question: the user's courses and matching notes."""
+    courses = [course async for course in Course.objects.filter(user=user)[:5]]
+    references = await sync_to_async(retrieval.search)(user.pk, question)
+    return "\n\n".join(part for part in [course_context(courses), notes_context(references)] if part)
+
+
+def generate_ai_response(question, user_context="", use_cache=True, summary="", history=()):
+    """
+    Generate AI chatbot response using OpenAI, reusing cached answers unless ``use_cache`` is False.
+    
+    Returns:
+        tuple: ``(text, ok)``; on failure ``text`` is an error message for the
+        student and ``ok`` is False, so it is not saved or cached as an answer
+    """
+    client = get_client()
+    if not client:
+        return "Error: OpenAI API key not configured.", False
+    
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": question}
-            ],
-            max_tokens=500,
-            temperature=0.7
-        )
-        
-        return response.choices[0].message.content
+        return cached_completion(
+            client,
+            model=CHAT_MODEL,
+            messages=build_chat_messages(question, user_context, summary, history),
+            max_tokens=CHAT_MAX_TOKENS,
+            temperature=CHAT_TEMPERATURE,
+            use_cache=use_cache
+        ), True
     except Exception as e:
-        return f"Sorry, I encountered an error: {str(e)}"
+        return f"Sorry, I encountered an error: {str(e)}", False
+
+
+async def agenerate_ai_response(question, user_context="", use_cache=True, summary="", history=()):
+    """Async version of :func:`generate_ai_response` using the shared AsyncOpenAI client."""
+    client = get_async_client()
+    if not client:
+        return "Error: OpenAI API key not configured.", False
+    
+    try:
+        return await acached_completion(
+            client,
+            model=CHAT_MODEL,
+            messages=build_chat_messages(question, user_context, summary, history),
+            max_tokens=CHAT_MAX_TOKENS,
+            temperature=CHAT_TEMPERATURE,
+            use_cache=use_cache
+        ), True
+    except Exception as e:
+        return f"Sorry, I encountered an error: {str(e)}", False
+
+
+async def get_thread(user, thread_id):
+    """Return the user's thread with ``thread_id`` (404 if not theirs), or None for a new one."""
+    if not thread_id:
+        return None
+    return await aget_object_or_404(ChatThread, pk=thread_id, user=user)
+
+
+async def save_turn(user, thread, question, response_text, reused_from=None):
+    """
+    Save a question and answer to the user's history, starting a thread
+    named after the question if there is none yet.
+    
+    Returns:
+        ChatMessage: The saved turn
+    """
+    if thread is None:
+        thread = await ChatThread.objects.acreate(user=user, title=Truncator(question).chars(80))
+    else:
+        await ChatThread.objects.filter(pk=thread.pk).aupdate(updated_at=timezone.now())
+    return await ChatMessage.objects.acreate(
+        user=user, thread=thread, question=question, response=response_text, reused_from=reused_from
+    )
+
+
+async def reusable_answer(question, scope, thread, fresh=False):
+    """
+    Find an earlier answer to a near-duplicate of an opening question.
+    
+    Follow-ups are never reused: their answer depends on the conversation,
+    which the question cache does not see.
+    
+    Returns:
+        ChatMessage: The earlier turn to reuse, or None
+    """
+    if fresh or thread is not None:
+        return None
+    match = await sync_to_async(question_cache.find_similar)(question, scope)
+    return match[0] if match else None
+
+
+async def remember_turn(chat, scope, thread, reused_from):
+    """Add a newly answered opening question to the question cache."""
+    if thread is None and reused_from is None:
+        await sync_to_async(question_cache.remember)(chat, scope)
+
+
+def format_frame(event, **data):
+    """Encode one Server-Sent Events frame."""
+    return f"event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+
+async def stream_ai_response(messages, user_id=None):
+    """Yield the model's answer in pieces as they are generated, charged to ``user_id``."""
+    client = get_async_client()
+    if client is None:
+        raise Exception("OpenAI API key not configured.")
+    
+    # Charged as the stream opens; the context must not stay set across yields
+    with ai_budget.charged_to(user_id, 'chat'):
+        stream = await ai_gateway.acall(
+            client.chat.completions.create,
+            model=CHAT_MODEL,
+            messages=messages,
+            max_tokens=CHAT_MAX_TOKENS,
+            temperature=CHAT_TEMPERATURE,
+            stream=True
+        )
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+async def chat_event_stream(user, question, thread=None, fresh=False):
+    """
+    Stream an answer to ``question`` as SSE frames and save it to the
+    user's history once complete.
+    
+    Frames are ``token`` (a piece of the answer), then ``done`` with the
+    saved message and thread ids, or ``error``. With ``fresh`` the model is
+    always asked, skipping both caches.
+    """
+    user_context = await student_context(user, question)
+    scope = question_cache.scope_key(user_context)
+    reused_from = await reusable_answer(question, scope, thread, fresh)
+    with ai_budget.charged_to(user.pk, 'chat'):
+        summary, history = await sync_to_async(build_history)(thread)
+    chat_messages = build_chat_messages(question, user_context, summary, history)
+    key = llm_cache.make_key(CHAT_MODEL, chat_messages, CHAT_TEMPERATURE, CHAT_MAX_TOKENS)
+    
+    response_text = None
+    if reused_from is None and not fresh:
+        response_text = await sync_to_async(llm_cache.lookup)(key)
+    if reused_from is not None:
+        response_text = reused_from.response
+        yield format_frame('token', text=response_text)
+    elif response_text is not None:
+        llm_cache.record('hits')
+        yield format_frame('token', text=response_text)
+    else:
+        llm_cache.record('misses')
+        parts = []
+        try:
+            async for text in stream_ai_response(chat_messages, user.pk):
+                parts.append(text)
+                yield format_frame('token', text=text)
+        except Exception as e:
+            yield format_frame('error', message=f"Sorry, I encountered an error: {str(e)}")
+            return
+        response_text = ''.join(parts)
+        if not response_text:
+            yield format_frame('error', message="Sorry, I received an empty answer. Please try again.")
+            return
+        await sync_to_async(llm_cache.store)(key, CHAT_MODEL, response_text)
+    
+    chat = await save_turn(user, thread, question, response_text, reused_from)
+    await remember_turn(chat, scope, thread, reused_from)
+    yield format_frame('done', id=chat.pk, thread=chat.thread_id, reused=reused_from is not None)
 
 
 @login_required
@@ -59,38 +253,95 @@ def chatbot_hub(request):
 
 
 @login_required
-def chatbot_ask(request):
-    """Handle chatbot question."""
+async def chatbot_ask(request):
+    """
+    Handle chatbot question.
+    
+    Async so that, under ASGI, waiting on the model holds no worker thread.
+    """
+    user = await request.auser()
     if request.method == 'POST':
         form = ChatForm(request.POST)
         if form.is_valid():
             question = form.cleaned_data['question']
+            thread = await get_thread(user, form.cleaned_data['thread'])
+            
+            fresh = form.cleaned_data['fresh']
             
-            # Get user's course context for better responses
-            user_courses = Course.objects.filter(user=request.user)
-            course_context = ", ".join([c.course_name for c in user_courses[:5]])
-            context_str = f"User is taking courses: {course_context}" if course_context else ""
+            # Get user's courses, matching notes and the conversation so far for better responses
+            user_context = await student_context(user, question)
+            scope = question_cache.scope_key(user_context)
             
-            # Generate response
-            response_text = generate_ai_response(question, context_str)
+            # Reuse the answer to a near-duplicate question, or generate one
+            reused_from = await reusable_answer(question, scope, thread, fresh)
+            if reused_from is not None:
+                response_text, ok = reused_from.response, True
+            else:
+                wait = ai_budget.retry_after(user.pk, CHAT_MAX_TOKENS)
+                if wait:
+                    messages.error(request, f"You've reached your AI usage limit. Try again in {ai_budget.describe_wait(wait)}.")
+                    return redirect(f"{reverse('chatbot_ask')}?thread={thread.pk}" if thread else 'chatbot_ask')
+                with ai_budget.charged_to(user.pk, 'chat'):
+                    summary, history = await sync_to_async(build_history)(thread)
+                    response_text, ok = await agenerate_ai_response(
+                        question, user_context, use_cache=not fresh, summary=summary, history=history
+                    )
+                if not ok:
+                    # Failed turns are neither saved nor offered as answers to similar questions
+                    messages.error(request, response_text)
+                    return redirect(f"{reverse('chatbot_ask')}?thread={thread.pk}" if thread else 'chatbot_ask')
             
             # Save to history
-            chat = ChatMessage.objects.create(
-                user=request.user,
-                question=question,
-                response=response_text
-            )
+            chat = await save_turn(user, thread, question, response_text, reused_from)
+            await remember_turn(chat, scope, thread, reused_from)
             
             messages.success(request, 'Response generated!')
-            return redirect('chatbot_hub')
+            return redirect(f"{reverse('chatbot_ask')}?thread={chat.thread_id}")
+        thread = await get_thread(user, form.cleaned_data.get('thread'))
     else:
-        form = ChatForm()
+        thread_id = request.GET.get('thread', '')
+        thread = await get_thread(user, int(thread_id) if thread_id.isdigit() else None)
+        form = ChatForm(initial={'thread': thread.pk if thread else None})
     
     context = {
         'form': form,
-        'chat_history': ChatMessage.objects.filter(user=request.user)[:10],
+        'thread': thread,
+        'thread_messages': [chat async for chat in thread.messages.order_by('pk')] if thread else [],
+        'chat_history': [chat async for chat in ChatMessage.objects.filter(user=user)[:10]],
     }
-    return render(request, 'learn/chatbot_ask.html', context)
+    # Templates read request.user lazily, which needs a sync context
+    return await sync_to_async(render)(request, 'learn/chatbot_ask.html', context)
+
+
+@login_required
+@require_POST
+async def chatbot_stream(request):
+    """
+    Answer a chatbot question as a Server-Sent Events stream, token by token.
+    Serve under ASGI so a long answer holds no worker while it streams.
+    """
+    form = ChatForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    
+    user = await request.auser()
+    thread = await get_thread(user, form.cleaned_data['thread'])
+    wait = ai_budget.retry_after(user.pk, CHAT_MAX_TOKENS)
+    if wait:
+        response = JsonResponse(
+            {'error': f"You've reached your AI usage limit. Try again in {ai_budget.describe_wait(wait)}."}, status=429
+        )
+        response['Retry-After'] = str(math.ceil(wait))
+        return response
+    
+    response = StreamingHttpResponse(
+        chat_event_stream(user, form.cleaned_data['question'], thread, form.cleaned_data['fresh']),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Tell nginx not to buffer the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 
 @login_required
@@ -9,6 +9,13 @@ from django.http import JsonResponse
 from datetime import timedelta
 from .models import Event, Reminder
 from .forms import EventForm, ReminderForm, ReminderFilterForm
+from .http_cache import bounded_int, conditional_user_resource
+
+# Limits for the ``days`` and ``limit`` query parameters of the JSON APIs
+API_DEFAULT_DAYS = 7
+API_MAX_DAYS = 60
+API_DEFAULT_LIMIT = 50
+API_MAX_LIMIT = 200
 
 
 @login_required
@@ -282,15 +289,18 @@ def reminder_mark_complete(request, pk):
 
 
 @login_required
+@conditional_user_resource(Event)
 def api_upcoming_events(request):
-    """API endpoint for upcoming events (next 7 days)."""
+    """API endpoint for upcoming events (next 7 days by default)."""
     user = request.user
     now = timezone.now()
+    days = bounded_int(request, 'days', API_DEFAULT_DAYS, API_MAX_DAYS)
+    limit = bounded_int(request, 'limit', API_DEFAULT_LIMIT, API_MAX_LIMIT)
     upcoming = Event.objects.filter(
         user=user,
         start_date__gte=now,
-        start_date__lt=now + timedelta(days=7)
-    ).order_by('start_date').values('id', 'title', 'event_type', 'start_date')
+        start_date__lt=now + timedelta(days=days)
+    ).order_by('start_date').values('id', 'title', 'event_type', 'start_date')[:limit]
     
     return JsonResponse({
         'events': list(upcoming)
@@ -298,16 +308,19 @@ def api_upcoming_events(request):
 
 
 @login_required
+@conditional_user_resource(Reminder)
 def api_upcoming_reminders(request):
-    """API endpoint for pending reminders."""
+    """API endpoint for pending reminders (next 7 days by default)."""
     user = request.user
     now = timezone.now()
+    days = bounded_int(request, 'days', API_DEFAULT_DAYS, API_MAX_DAYS)
+    limit = bounded_int(request, 'limit', API_DEFAULT_LIMIT, API_MAX_LIMIT)
     pending = Reminder.objects.filter(
         user=user,
         is_completed=False,
         reminder_date__gte=now,
-        reminder_date__lt=now + timedelta(days=7)
-    ).order_by('reminder_date').values('id', 'title', 'reminder_type', 'reminder_date')
+        reminder_date__lt=now + timedelta(days=days)
+    ).order_by('reminder_date').values('id', 'title', 'reminder_type', 'reminder_date')[:limit]
     
     return JsonResponse({
         'reminders': list(pending)
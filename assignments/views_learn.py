@@ -1,16 +1,27 @@
 """
 Views for the learn/podcast functionality.
 """
-from django.shortcuts import render, redirect, get_object_or_404
+from asgiref.sync import sync_to_async
+from django.shortcuts import aget_object_or_404, render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import FileResponse
-from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import Http404, HttpResponse, JsonResponse
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import require_safe
 import os
-from .models import Podcast, StudyNotes
-from .forms import PodcastForm, StudyNotesForm
-from .podcast_service import generate_podcast_script, generate_podcast_audio, generate_study_notes
-from .file_utils import extract_text_from_file
+from . import ai_budget, podcast_playback
+from .file_serving import serve_file
+from .models import Podcast, PodcastSegment, StudyNotes
+from .forms import PodcastForm, PodcastScriptForm, StudyNotesForm
+from .podcast_pipeline import delete_segments, queue_generation
+from .tasks import generate_podcast_task, generate_study_notes_task
+from .extraction_cache import cached_extract_texts
+
+# Tokens a generation is expected to use, checked against the user's AI budget before queueing
+STUDY_NOTES_TOKENS = 4000
+PODCAST_TOKENS = 8000
 
 
 @login_required
@@ -24,6 +35,31 @@ def learn_hub(request):
     return render(request, 'learn/learn_hub.html', context)
 
 
+def extract_uploads(request, files):
+    """
+    Extract the text of uploaded note files, merged in upload order.
+    
+    Files that cannot be read are reported to the user and left out.
+    
+    Args:
+        request: The request, for user messages
+        files: Uploaded files from a MultipleFileField
+    
+    Returns:
+        str: The files' text, each under a heading naming the file
+    """
+    sections = []
+    for report, text in cached_extract_texts(files):
+        if report.error:
+            messages.warning(request, f'Could not extract text from {report.filename}: {report.error}')
+            continue
+        if report.truncated:
+            messages.info(request, f'{report.filename} was long, so only its first part was used.')
+        if text.strip():
+            sections.append(f"--- Extracted from {report.filename} ---\n{text.strip()}")
+    return "\n\n".join(sections)
+
+
 @login_required
 def podcast_create(request):
     """Create a new podcast from notes."""
@@ -33,22 +69,16 @@ def podcast_create(request):
             podcast = form.save(commit=False)
             podcast.user = request.user
             
-            # Extract text from uploaded file if provided
-            if request.FILES.get('notes_file'):
-                try:
-                    extracted_text = extract_text_from_file(request.FILES['notes_file'])
-                    # If there's already notes_text, append the extracted text
-                    if podcast.notes_text:
-                        podcast.notes_text += "\n\n--- Extracted from uploaded document ---\n" + extracted_text
-                    else:
-                        podcast.notes_text = extracted_text
-                except Exception as e:
-                    messages.warning(request, f'Note: Could not extract text from file: {str(e)}')
-            
-            podcast.save()
+            # Add the text of any uploaded documents after the pasted notes
+            extracted_text = extract_uploads(request, form.cleaned_data['notes_files'])
+            podcast.notes_text = "\n\n".join(text for text in [podcast.notes_text, extracted_text] if text)
             
-            messages.success(request, 'Podcast created! Now generating script...')
-            return redirect('podcast_generate', pk=podcast.pk)
+            if podcast.notes_text:
+                podcast.save()
+                
+                messages.success(request, 'Podcast created! Now generating script...')
+                return redirect('podcast_generate', pk=podcast.pk)
+            form.add_error(None, 'No text could be extracted from your documents. Paste your notes instead.')
     else:
         form = PodcastForm(user=request.user)
     
@@ -60,82 +90,200 @@ def podcast_create(request):
 
 
 @login_required
-def podcast_generate(request, pk):
-    """Generate podcast script and audio."""
+async def podcast_generate(request, pk):
+    """Queue podcast script and audio generation in the background."""
+    user = await request.auser()
+    podcast = await aget_object_or_404(Podcast, pk=pk, user=user)
+    
+    if request.method == 'POST':
+        restart = podcast.generation_status != 'failed'
+        if await sync_to_async(queue_generation)(podcast, restart=restart):
+            # Over budget, the generation waits in the queue until the budget refills
+            wait = ai_budget.retry_after(user.pk, PODCAST_TOKENS)
+            await sync_to_async(generate_podcast_task.enqueue)(user=user, delay=wait, podcast_id=podcast.pk)
+            if wait:
+                messages.info(
+                    request,
+                    f"You've used a lot of AI time recently, so generation will start in {ai_budget.describe_wait(wait)}."
+                )
+            else:
+                messages.success(request, 'Podcast generation started! You can leave this page while it runs.')
+        else:
+            messages.info(request, 'This podcast is already being generated.')
+        return redirect('podcast_detail', pk=podcast.pk)
+    
+    context = {
+        'podcast': podcast,
+    }
+    # Templates read request.user lazily, which needs a sync context
+    return await sync_to_async(render)(request, 'learn/podcast_generate.html', context)
+
+
+@login_required
+def podcast_edit_script(request, pk):
+    """Edit a podcast's script and re-record only the parts that changed."""
     podcast = get_object_or_404(Podcast, pk=pk, user=request.user)
     
+    if podcast.is_generating():
+        messages.info(request, 'Wait for the current generation to finish before editing the script.')
+        return redirect('podcast_detail', pk=podcast.pk)
+    
     if request.method == 'POST':
-        try:
-            # Generate script
-            script = generate_podcast_script(
-                topic=podcast.topic,
-                notes_text=podcast.notes_text,
-                tone=podcast.tone,
-                length=podcast.length,
-                description=podcast.description
-            )
-            podcast.script = script
-            podcast.is_generated = True
-            
-            # Generate audio with proper media path
-            audio_dir = os.path.join(settings.MEDIA_ROOT, 'podcasts', 'audio')
-            os.makedirs(audio_dir, exist_ok=True)
-            
-            audio_filename = f'podcast_{podcast.pk}.mp3'
-            audio_full_path = os.path.join(audio_dir, audio_filename)
-            
-            generate_podcast_audio(script, audio_full_path)
-            podcast.audio_file = f'podcasts/audio/{audio_filename}'
-            podcast.is_audio_generated = True
+        form = PodcastScriptForm(request.POST, instance=podcast)
+        if form.is_valid():
+            if 'script' not in form.changed_data:
+                messages.info(request, 'The script is unchanged.')
+                return redirect('podcast_detail', pk=podcast.pk)
             
-            podcast.save()
-            messages.success(request, 'Podcast generated successfully!')
-            return redirect('podcast_detail', pk=podcast.pk)
+            podcast = form.save(commit=False)
+            podcast.is_generated = True
+            podcast.save(update_fields=['script', 'is_generated', 'updated_at'])
             
-        except Exception as e:
-            messages.error(request, f'Error generating podcast: {str(e)}')
+            # Skip the LLM: unchanged segments keep their audio, the rest are re-synthesized
+            if queue_generation(podcast, from_stage='segmenting'):
+                generate_podcast_task.enqueue(user=request.user, podcast_id=podcast.pk)
+            messages.success(request, 'Script saved! Updating the audio for the parts you changed.')
             return redirect('podcast_detail', pk=podcast.pk)
+    else:
+        form = PodcastScriptForm(instance=podcast)
     
     context = {
+        'form': form,
         'podcast': podcast,
     }
-    return render(request, 'learn/podcast_generate.html', context)
+    return render(request, 'learn/podcast_script_form.html', context)
+
+
+@login_required
+def podcast_status(request, pk):
+    """API endpoint for podcast generation progress."""
+    podcast = get_object_or_404(Podcast, pk=pk, user=request.user)
+    segments = podcast.segments.all()
+    
+    return JsonResponse({
+        'id': podcast.pk,
+        'status': podcast.generation_status,
+        'status_display': podcast.get_generation_status_display(),
+        'resume_stage': podcast.resume_stage,
+        'error': podcast.generation_error,
+        'is_generated': podcast.is_generated,
+        'is_audio_generated': podcast.is_audio_generated,
+        'segments_total': segments.count(),
+        'segments_done': segments.exclude(audio_file='').count(),
+    })
 
 
 @login_required
 def podcast_detail(request, pk):
     """Display podcast details and script."""
     podcast = get_object_or_404(Podcast, pk=pk, user=request.user)
+    index = podcast_playback.segment_index(podcast)
     
     context = {
         'podcast': podcast,
+        'script_sections': podcast_playback.script_sections(podcast.script, index),
+        'can_play_early': podcast.is_generating() and bool(podcast_playback.playable(index)),
     }
     return render(request, 'learn/podcast_detail.html', context)
 
 
+def segment_url(podcast, entry):
+    """URL of a segment's audio, versioned by its content."""
+    url = reverse('podcast_segment_audio', args=[podcast.pk, entry['position']])
+    return f"{url}?v={entry['version']}"
+
+
+@login_required
+def podcast_segments(request, pk):
+    """API endpoint listing a podcast's segments for progressive playback and seeking."""
+    podcast = get_object_or_404(Podcast, pk=pk, user=request.user)
+    index = podcast_playback.segment_index(podcast)
+    for entry in index:
+        entry['url'] = segment_url(podcast, entry) if entry['ready'] else None
+    
+    return JsonResponse({
+        'id': podcast.pk,
+        'status': podcast.generation_status,
+        'complete': podcast_playback.is_complete(index),
+        'playlist_url': reverse('podcast_playlist', args=[podcast.pk]),
+        'segments': index,
+    })
+
+
+@login_required
+@require_safe
+def podcast_playlist(request, pk):
+    """HLS playlist of the segments that can be played so far."""
+    podcast = get_object_or_404(Podcast, pk=pk, user=request.user)
+    index = podcast_playback.segment_index(podcast)
+    
+    response = HttpResponse(
+        podcast_playback.render_playlist(index, lambda entry: segment_url(podcast, entry)),
+        content_type='application/vnd.apple.mpegurl',
+    )
+    # The playlist grows while segments are synthesized
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@login_required
+@require_safe
+def podcast_segment_audio(request, pk, position):
+    """
+    Stream one segment's audio, with seeking.
+    
+    A URL with ``?v=`` names one version of the segment's audio: it is cached
+    for good, and is not found once the segment has been rebuilt with other audio.
+    """
+    segment = get_object_or_404(
+        PodcastSegment.objects.select_related('blob'), podcast__pk=pk, podcast__user=request.user, position=position
+    )
+    
+    if not segment.audio_file:
+        raise Http404('Segment audio not ready')
+    version = request.GET.get('v')
+    if version is not None and version != podcast_playback.segment_version(segment):
+        raise Http404('Segment audio has changed')
+    return serve_file(request, segment.audio_file, 'audio/mpeg', immutable=version is not None)
+
+
 @login_required
 def podcast_download(request, pk):
     """Download podcast audio file."""
     podcast = get_object_or_404(Podcast, pk=pk, user=request.user)
     
     if podcast.audio_file:
-        file_path = podcast.audio_file.path
-        return FileResponse(open(file_path, 'rb'), as_attachment=True, filename=f'{podcast.title}.mp3')
+        try:
+            return serve_file(request, podcast.audio_file, 'audio/mpeg', filename=f'{podcast.title}.mp3', as_attachment=True)
+        except Http404:
+            pass
     
     messages.error(request, 'Audio file not found.')
     return redirect('podcast_detail', pk=podcast.pk)
 
 
+@login_required
+@require_safe
+def podcast_audio(request, pk):
+    """Stream podcast audio to the player, with seeking."""
+    podcast = get_object_or_404(Podcast, pk=pk, user=request.user)
+    
+    if not podcast.audio_file:
+        raise Http404('Audio file not found')
+    return serve_file(request, podcast.audio_file, 'audio/mpeg')
+
+
 @login_required
 def podcast_delete(request, pk):
     """Delete a podcast."""
     podcast = get_object_or_404(Podcast, pk=pk, user=request.user)
     
     if request.method == 'POST':
-        # Delete audio file if exists
-        if podcast.audio_file:
+        # Stored audio may be shared with other podcasts; deleting only releases it
+        if not podcast.audio_blob_id and podcast.audio_file:
             if os.path.exists(podcast.audio_file.path):
                 os.remove(podcast.audio_file.path)
+        delete_segments(podcast)
         
         podcast.delete()
         messages.success(request, 'Podcast deleted successfully!')
@@ -158,39 +306,65 @@ def study_notes_hub(request):
     return render(request, 'learn/study_notes_hub.html', context)
 
 
+def save_or_join(study_note):
+    """
+    Save new study notes, unless identical notes for the same user are
+    still being generated; a double-submitted form then joins that run.
+    
+    Returns:
+        tuple: ``(StudyNotes, created)``
+    """
+    try:
+        with transaction.atomic():
+            study_note.save()
+        return study_note, True
+    except IntegrityError:
+        pending = StudyNotes.objects.filter(
+            user=study_note.user, request_hash=study_note.request_hash, is_generated=False, generation_error=''
+        ).first()
+        if pending is not None:
+            return pending, False
+        # The other run finished in the meantime
+        study_note.save()
+        return study_note, True
+
+
 @login_required
-def study_notes_create(request):
-    """Create and generate AI study notes from a topic."""
+async def study_notes_create(request):
+    """Create study notes from a topic and queue their generation."""
+    user = await request.auser()
     if request.method == 'POST':
-        form = StudyNotesForm(request.POST, user=request.user)
-        if form.is_valid():
+        form = StudyNotesForm(request.POST, request.FILES, user=user)
+        # Validating the course choice queries the database
+        if await sync_to_async(form.is_valid)():
             study_note = form.save(commit=False)
-            study_note.user = request.user
-            study_note.save()
-            
-            try:
-                # Generate study notes
-                content = generate_study_notes(
-                    topic=study_note.topic,
-                    detail_level=study_note.detail_level
-                )
-                study_note.content = content
-                study_note.is_generated = True
-                study_note.save()
-                
-                messages.success(request, 'Study notes generated successfully!')
+            study_note.user = user
+            study_note.source_text = await sync_to_async(extract_uploads)(request, form.cleaned_data['notes_files'])
+            study_note.request_hash = study_note.make_request_hash()
+            study_note, created = await sync_to_async(save_or_join)(study_note)
+            if not created:
+                messages.info(request, 'These study notes are already being generated.')
                 return redirect('study_notes_detail', pk=study_note.pk)
             
-            except Exception as e:
-                messages.error(request, f'Error generating study notes: {str(e)}')
-                return redirect('study_notes_detail', pk=study_note.pk)
+            # Generate study notes in the background, once the user's AI budget allows
+            wait = ai_budget.retry_after(user.pk, STUDY_NOTES_TOKENS)
+            await sync_to_async(generate_study_notes_task.enqueue)(user=user, delay=wait, study_notes_id=study_note.pk)
+            
+            if wait:
+                messages.info(
+                    request,
+                    f"You've used a lot of AI time recently, so your notes will start generating in {ai_budget.describe_wait(wait)}."
+                )
+            else:
+                messages.success(request, 'Study notes are being generated!')
+            return redirect('study_notes_detail', pk=study_note.pk)
     else:
-        form = StudyNotesForm(user=request.user)
+        form = StudyNotesForm(user=user)
     
     context = {
         'form': form,
     }
-    return render(request, 'learn/study_notes_form.html', context)
+    return await sync_to_async(render)(request, 'learn/study_notes_form.html', context)
 
 
 @login_required
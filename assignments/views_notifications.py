@@ -0,0 +1,32 @@
+"""
+Views for streaming in-app notifications.
+"""
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponse, StreamingHttpResponse
+from .notifications import event_stream, parse_last_event_id
+
+
+@login_required
+async def notification_stream(request):
+    """
+    Server-Sent Events stream of the user's reminders, assignment changes and
+    generation progress. Serve under ASGI so an open tab holds no worker.
+
+    Under WSGI the response would never start, so unless LIVE_NOTIFICATIONS
+    is on this answers 204, which tells EventSource not to reconnect.
+    """
+    if not getattr(settings, 'LIVE_NOTIFICATIONS', False):
+        return HttpResponse(status=204)
+    user = await request.auser()
+    last_event_id = request.headers.get('Last-Event-ID')
+    since = parse_last_event_id(last_event_id) if last_event_id else None
+
+    response = StreamingHttpResponse(
+        event_stream(user.pk, since=since),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Tell nginx not to buffer the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
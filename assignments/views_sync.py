@@ -0,0 +1,23 @@
+"""
+Views for the offline delta-sync API.
+"""
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from .sync import InvalidToken, build_delta, decode_token
+
+
+@login_required
+def api_sync(request):
+    """
+    Return courses, assignments, events and reminders changed since ``?since=``.
+
+    Without a token (or with one too old to serve a delta) every row is sent
+    and ``full`` is true, telling the client to replace its local copy.
+    """
+    token = request.GET.get('since')
+    try:
+        since = decode_token(token) if token else None
+    except InvalidToken as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    return JsonResponse(build_delta(request.user, since))
@@ -76,6 +76,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'assignments.context_processors.quotes_and_tips',
+                'assignments.context_processors.live_notifications',
             ],
         },
     },
@@ -146,10 +147,21 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 STATICFILES_DIRS = [BASE_DIR / 'static']
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
+# Open a live notification stream (Server-Sent Events) on every page. Only turn this on
+# when serving config.asgi: under WSGI the stream never sends its first byte and holds a
+# worker per open tab. When off, pages fall back to polling.
+LIVE_NOTIFICATIONS = os.getenv('LIVE_NOTIFICATIONS', 'False') == 'True'
+
 # Media files (User uploads)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Hash uploads as they stream in so extracted document text can be cached
+FILE_UPLOAD_HANDLERS = [
+    'assignments.upload_handlers.HashingMemoryFileUploadHandler',
+    'assignments.upload_handlers.HashingTemporaryFileUploadHandler',
+]
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -41,6 +41,9 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Let nginx send podcast audio after Django authorizes it (needs nginx.conf's /protected-media/)
+AUDIO_ACCEL_REDIRECT = config('AUDIO_ACCEL_REDIRECT', default=False, cast=bool)
+
 # Whitenoise for static file serving
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
@@ -4,18 +4,20 @@ Pytest configuration file for Django testing.
 import pytest
 
 
-@pytest.fixture(scope='session')
-def django_db_setup():
+@pytest.fixture(autouse=True)
+def enable_db_access_for_all_tests(db):
     """
-    Configure the database for testing.
-    Uses SQLite in-memory database for fast tests.
+    Give all tests access to the database.
     """
     pass
 
 
 @pytest.fixture(autouse=True)
-def enable_db_access_for_all_tests(db):
+def reset_ai_budget():
     """
-    Give all tests access to the database.
+    Start every test with full AI budgets and no unsaved usage.
     """
-    pass
+    from assignments import ai_budget
+    ai_budget.reset()
+    yield
+    ai_budget.reset()